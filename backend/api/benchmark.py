@@ -0,0 +1,537 @@
+import base64
+import io
+import math
+import random
+import statistics
+import time
+from collections import namedtuple
+
+from django.contrib.auth import get_user_model
+from django.contrib.auth.hashers import make_password
+from django.contrib.auth.tokens import default_token_generator
+from django.core.files.base import ContentFile
+from django.core.files.storage import default_storage
+from django.core.management import call_command
+from django.db import connection
+from djoser.utils import encode_uid
+from PIL import Image
+from rest_framework.authtoken.models import Token
+from rest_framework.test import APIClient
+
+from api.middleware import RequestTiming
+from recipes.models import (Ingredient, Recipe, RecipeIngredient, Tag,
+                            UserFavorites, UserShoppingCart)
+from users.models import Subscribe
+
+User = get_user_model()
+
+BENCHMARK_PASSWORD = 'benchmark-Pa55word'
+BENCHMARK_IMAGE = 'recipes/images/benchmark.jpg'
+BENCHMARK_INGREDIENTS = 5
+BENCHMARK_BULK = 10
+
+# Запросы UserShoppingList.lock: SELECT ... FOR UPDATE рецептов
+# и строк списков покупок. Их делает только PostgreSQL, а SQLite,
+# на которой бюджеты замерены, блокировки пропускает.
+LOCK_QUERIES = 2
+
+# Эндпоинт бенчмарка: url и data могут ссылаться на поля контекста
+# (user, author, recipe, recipes, tag, ingredient, created, new_user,
+# token, iteration), auth - None для анонима, 'user' для основного
+# пользователя, 'login' для токена, полученного при входе, или 'new'
+# для пользователя, созданного users-create.
+#
+# Бюджет - наибольшее допустимое число запросов к базе. Число
+# запросов эндпоинта не зависит от объема данных и размера страницы,
+# поэтому бюджет равен замеру на SQLite без запаса: любой новый
+# запрос - это изменение, которое должно попасть в ревью вместе
+# с правкой бюджета. Запас есть только там, где PostgreSQL делает
+# больше запросов, чем SQLite: по LOCK_QUERIES на каждый вызов
+# блокировки списков покупок.
+Endpoint = namedtuple(
+    'Endpoint', 'name method url auth status budget data',
+    defaults=(None,)
+)
+
+ENDPOINTS = (
+    # Теги и ингредиенты отдаются из кэша справочников.
+    Endpoint('tags-list', 'get', '/api/tags/', None, 200, 0),
+    Endpoint('tags-detail', 'get', '/api/tags/{tag_id}/', None, 200, 0),
+    Endpoint('ingredients-list', 'get', '/api/ingredients/', None, 200, 0),
+    Endpoint(
+        'ingredients-search', 'get', '/api/ingredients/?name={ingredient}',
+        None, 200, 0
+    ),
+    Endpoint(
+        'ingredients-detail', 'get', '/api/ingredients/{ingredient_id}/',
+        None, 200, 0
+    ),
+    # Рецепты: подсчет, страница и prefetch тегов и ингредиентов.
+    # Фрагменты рецептов и версии кэшей в замере лежат в памяти.
+    Endpoint('recipes-list', 'get', '/api/recipes/', None, 200, 4),
+    Endpoint(
+        'recipes-list-tags', 'get',
+        '/api/recipes/?tags={tag}&tags={other_tag}', None, 200, 4
+    ),
+    Endpoint(
+        'recipes-list-tags-all', 'get',
+        '/api/recipes/?tags={tag}&tags={other_tag}&tags_mode=all',
+        None, 200, 4
+    ),
+    Endpoint(
+        'recipes-list-author', 'get', '/api/recipes/?author={author}',
+        None, 200, 5
+    ),
+    Endpoint(
+        'recipes-search', 'get', '/api/recipes/?search={word}',
+        None, 200, 4
+    ),
+    Endpoint(
+        'recipes-cursor', 'get', '/api/recipes/?cursor=', None, 200, 3
+    ),
+    Endpoint(
+        'recipes-detail', 'get', '/api/recipes/{recipe}/', None, 200, 3
+    ),
+    Endpoint('users-list', 'get', '/api/users/', None, 200, 2),
+    Endpoint('users-detail', 'get', '/api/users/{author}/', None, 200, 1),
+    # С токеном добавляются пользователь, токен и состояние
+    # пользователя: избранное, корзина и подписки.
+    Endpoint('recipes-list', 'get', '/api/recipes/', 'user', 200, 8),
+    Endpoint(
+        'recipes-favorited', 'get', '/api/recipes/?is_favorited=1',
+        'user', 200, 8
+    ),
+    Endpoint(
+        'recipes-in-cart', 'get', '/api/recipes/?is_in_shopping_cart=1',
+        'user', 200, 8
+    ),
+    Endpoint(
+        'recipes-detail', 'get', '/api/recipes/{recipe}/', 'user', 200, 7
+    ),
+    Endpoint('users-list', 'get', '/api/users/', 'user', 200, 4),
+    Endpoint('users-detail', 'get', '/api/users/{author}/', 'user', 200, 3),
+    Endpoint('users-me', 'get', '/api/users/me/', 'user', 200, 2),
+    Endpoint(
+        'users-subscriptions', 'get', '/api/users/subscriptions/',
+        'user', 200, 4
+    ),
+    Endpoint(
+        'download-shopping-cart', 'get',
+        '/api/recipes/download_shopping_cart/', 'user', 200, 2
+    ),
+    # Изменение списков: вставка или удаление, счетчики и списки
+    # покупок. Корзина вызывает UserShoppingList.lock один раз.
+    Endpoint(
+        'favorite-add', 'post', '/api/recipes/{recipe}/favorite/',
+        'user', 201, 5
+    ),
+    Endpoint(
+        'favorite-remove', 'delete', '/api/recipes/{recipe}/favorite/',
+        'user', 204, 6
+    ),
+    Endpoint(
+        'shopping-cart-add', 'post', '/api/recipes/{recipe}/shopping_cart/',
+        'user', 201, 8 + LOCK_QUERIES
+    ),
+    Endpoint(
+        'shopping-cart-remove', 'delete',
+        '/api/recipes/{recipe}/shopping_cart/', 'user', 204, 8 + LOCK_QUERIES
+    ),
+    Endpoint(
+        'favorite-bulk-add', 'post', '/api/recipes/favorite/',
+        'user', 200, 4, lambda context: {'recipes': context['recipes']}
+    ),
+    Endpoint(
+        'favorite-bulk-remove', 'delete', '/api/recipes/favorite/',
+        'user', 200, 4, lambda context: {'recipes': context['recipes']}
+    ),
+    Endpoint(
+        'shopping-cart-bulk-add', 'post', '/api/recipes/shopping_cart/',
+        'user', 200, 5 + LOCK_QUERIES,
+        lambda context: {'recipes': context['recipes']}
+    ),
+    Endpoint(
+        'shopping-cart-bulk-remove', 'delete', '/api/recipes/shopping_cart/',
+        'user', 200, 6 + LOCK_QUERIES,
+        lambda context: {'recipes': context['recipes']}
+    ),
+    Endpoint(
+        'subscribe', 'post', '/api/users/{author}/subscribe/',
+        'user', 201, 7
+    ),
+    Endpoint(
+        'unsubscribe', 'delete', '/api/users/{author}/subscribe/',
+        'user', 204, 6
+    ),
+    # Запись рецепта: рецепт, теги, ингредиенты, поисковый индекс
+    # и версии кэшей. Правка ингредиентов блокирует списки покупок
+    # трижды: перед чтением ингредиентов, при вычитании и прибавлении.
+    # Удаление убирает рецепт из списков покупок с одной блокировкой.
+    Endpoint(
+        'recipes-create', 'post', '/api/recipes/', 'user', 201, 16,
+        lambda context: context['recipe_data']
+    ),
+    Endpoint(
+        'recipes-update', 'patch', '/api/recipes/{created}/', 'user', 200,
+        21 + 3 * LOCK_QUERIES,
+        lambda context: {
+            'name': f'Рецепт {context["iteration"]}',
+            'ingredients': context['recipe_data']['ingredients'][1:],
+        }
+    ),
+    Endpoint(
+        'recipes-replace', 'put', '/api/recipes/{created}/', 'user', 200,
+        23 + 3 * LOCK_QUERIES,
+        lambda context: {
+            **context['recipe_data'],
+            'ingredients': context['recipe_data']['ingredients'][:-1],
+        }
+    ),
+    Endpoint(
+        'recipes-delete', 'delete', '/api/recipes/{created}/',
+        'user', 204, 22 + LOCK_QUERIES
+    ),
+    # Маршруты djoser. Письма активации отключены, поэтому activation
+    # отвечает 403, а resend-activation - 400. Удаление пользователя
+    # каскадом удаляет строки связанных таблиц, по запросу на таблицу.
+    Endpoint(
+        'users-create', 'post', '/api/users/', None, 201, 4,
+        lambda context: {
+            **new_user_data(context), 'password': BENCHMARK_PASSWORD
+        }
+    ),
+    Endpoint(
+        'users-update', 'put', '/api/users/{new_user}/', 'new', 200, 6,
+        lambda context: new_user_data(context)
+    ),
+    Endpoint(
+        'users-partial-update', 'patch', '/api/users/{new_user}/',
+        'new', 200, 4, lambda context: {'first_name': 'Другое'}
+    ),
+    Endpoint(
+        'users-me-update', 'put', '/api/users/me/', 'new', 200, 5,
+        lambda context: new_user_data(context)
+    ),
+    Endpoint(
+        'users-me-partial-update', 'patch', '/api/users/me/',
+        'new', 200, 3, lambda context: {'last_name': 'Другая'}
+    ),
+    Endpoint(
+        'reset-password', 'post', '/api/users/reset_password/',
+        None, 204, 1, lambda context: {'email': new_email(context, 'new')}
+    ),
+    Endpoint(
+        'reset-password-confirm', 'post',
+        '/api/users/reset_password_confirm/', None, 204, 2,
+        lambda context: confirmation(
+            context, new_password=BENCHMARK_PASSWORD
+        )
+    ),
+    Endpoint(
+        'set-email', 'post', '/api/users/set_email/', 'new', 204, 3,
+        lambda context: {
+            'current_password': BENCHMARK_PASSWORD,
+            'new_email': new_email(context, 'renamed'),
+        }
+    ),
+    Endpoint(
+        'reset-email', 'post', '/api/users/reset_email/', None, 204, 1,
+        lambda context: {'email': new_email(context, 'renamed')}
+    ),
+    Endpoint(
+        'reset-email-confirm', 'post', '/api/users/reset_email_confirm/',
+        None, 204, 3,
+        lambda context: confirmation(
+            context, new_email=new_email(context, 'restored')
+        )
+    ),
+    Endpoint(
+        'activation', 'post', '/api/users/activation/', None, 403, 1,
+        lambda context: confirmation(context)
+    ),
+    Endpoint(
+        'resend-activation', 'post', '/api/users/resend_activation/',
+        None, 400, 1,
+        lambda context: {'email': new_email(context, 'restored')}
+    ),
+    Endpoint(
+        'users-delete', 'delete', '/api/users/{new_user}/', 'new', 204, 16,
+        lambda context: {'current_password': BENCHMARK_PASSWORD}
+    ),
+    Endpoint(
+        'token-login', 'post', '/api/auth/token/login/', None, 200, 5,
+        lambda context: {
+            'email': context['login_email'], 'password': BENCHMARK_PASSWORD
+        }
+    ),
+    Endpoint(
+        'set-password', 'post', '/api/users/set_password/', 'login', 204, 2,
+        lambda context: {
+            'current_password': BENCHMARK_PASSWORD,
+            'new_password': BENCHMARK_PASSWORD,
+        }
+    ),
+    Endpoint(
+        'token-logout', 'post', '/api/auth/token/logout/', 'login', 204, 3
+    ),
+)
+
+
+def new_email(context, prefix):
+    """Почта пользователя, созданного на проходе iteration."""
+    return f'{prefix}{context["iteration"]}@benchmark.ru'
+
+
+def new_user_data(context):
+    return {
+        'email': new_email(context, 'new'),
+        'username': f'new{context["iteration"]}',
+        'first_name': 'Новый',
+        'last_name': 'Пользователь',
+    }
+
+
+def confirmation(context, **data):
+    """uid и token из письма djoser для созданного пользователя."""
+    user = User.objects.get(pk=context['new_user'])
+    return {
+        'uid': encode_uid(user.pk),
+        'token': default_token_generator.make_token(user),
+        **data,
+    }
+
+
+def benchmark_image():
+    """Сохраняет общее для всех рецептов фото и возвращает его имя."""
+    if not default_storage.exists(BENCHMARK_IMAGE):
+        buffer = io.BytesIO()
+        Image.new('RGB', (640, 480), (200, 120, 60)).save(buffer, 'JPEG')
+        default_storage.save(BENCHMARK_IMAGE, ContentFile(buffer.getvalue()))
+    return BENCHMARK_IMAGE
+
+
+def image_data_uri():
+    buffer = io.BytesIO()
+    Image.new('RGB', (64, 64), (60, 120, 200)).save(buffer, 'PNG')
+    return (
+        'data:image/png;base64,'
+        + base64.b64encode(buffer.getvalue()).decode()
+    )
+
+
+def seed(users, recipes, favorites, subscriptions, ingredients=200,
+         tags=6, random_seed=0):
+    """
+    Заполняет пустую базу случайными данными.
+    favorites и subscriptions - число рецептов в избранном и корзине
+    и число подписок на одного пользователя. Для первого пользователя
+    последние BENCHMARK_BULK рецептов и последний автор остаются
+    свободными, чтобы на них можно было подписываться и добавлять
+    их в списки. Возвращает контекст для адресов эндпоинтов.
+    """
+    rng = random.Random(random_seed)
+    password = make_password(BENCHMARK_PASSWORD)
+    User.objects.bulk_create(
+        User(
+            email=f'user{number}@benchmark.ru',
+            username=f'user{number}',
+            first_name='Имя',
+            last_name='Фамилия',
+            password=password,
+        )
+        for number in range(users)
+    )
+    user_ids = list(User.objects.order_by('pk').values_list('pk', flat=True))
+    Tag.objects.bulk_create(
+        Tag(name=f'Тег {number}', slug=f'tag{number}',
+            color=f'#{number:06x}')
+        for number in range(tags)
+    )
+    tag_ids = list(Tag.objects.order_by('pk').values_list('pk', flat=True))
+    Ingredient.objects.bulk_create(
+        Ingredient(name=f'Ингредиент {number}', measurement_unit='г')
+        for number in range(ingredients)
+    )
+    ingredient_ids = list(
+        Ingredient.objects.order_by('pk').values_list('pk', flat=True)
+    )
+    image = benchmark_image()
+    Recipe.objects.bulk_create(
+        Recipe(
+            author_id=rng.choice(user_ids),
+            name=f'Блюдо {number}',
+            text=f'Описание блюда {number}. ' * 5,
+            cooking_time=rng.randint(1, 120),
+            image=image,
+        )
+        for number in range(recipes)
+    )
+    recipe_ids = list(
+        Recipe.objects.order_by('pk').values_list('pk', flat=True)
+    )
+    Recipe.tags.through.objects.bulk_create(
+        Recipe.tags.through(recipe_id=recipe_id, tag_id=tag_id)
+        for recipe_id in recipe_ids
+        for tag_id in rng.sample(tag_ids, rng.randint(1, min(3, tags)))
+    )
+    RecipeIngredient.objects.bulk_create(
+        RecipeIngredient(
+            recipe_id=recipe_id,
+            ingredient_id=ingredient_id,
+            amount=rng.randint(1, 500),
+        )
+        for recipe_id in recipe_ids
+        for ingredient_id in rng.sample(
+            ingredient_ids, rng.randint(3, min(12, ingredients))
+        )
+    )
+    free_recipes = recipe_ids[-BENCHMARK_BULK:]
+    free_author = user_ids[-1]
+    for index, user_id in enumerate(user_ids):
+        choices = recipe_ids if index else recipe_ids[:-BENCHMARK_BULK]
+        authors = [
+            author for author in user_ids
+            if author != user_id and (index or author != free_author)
+        ]
+        for model in (UserFavorites, UserShoppingCart):
+            model.objects.bulk_create(
+                model(user_id=user_id, recipe_id=recipe_id)
+                for recipe_id in rng.sample(
+                    choices, min(favorites, len(choices))
+                )
+            )
+        Subscribe.objects.bulk_create(
+            Subscribe(user_id=user_id, author_id=author)
+            for author in rng.sample(
+                authors, min(subscriptions, len(authors))
+            )
+        )
+    for command in (
+        'reconcile_counters', 'rebuild_shopping_lists',
+        'rebuild_search_index'
+    ):
+        call_command(command, verbosity=0, stdout=io.StringIO())
+    user = User.objects.get(pk=user_ids[0])
+    tag_slugs = list(Tag.objects.order_by('pk').values_list('slug', flat=True))
+    return {
+        'user': user.pk,
+        'token': Token.objects.create(user=user).key,
+        'login_email': User.objects.get(pk=user_ids[1]).email,
+        'author': free_author,
+        'recipe': free_recipes[0],
+        'recipes': free_recipes,
+        'tag': tag_slugs[0],
+        'other_tag': tag_slugs[-1],
+        'tag_id': tag_ids[0],
+        'ingredient': 'Ингредиент 1',
+        'ingredient_id': ingredient_ids[0],
+        'word': 'блюд',
+        'recipe_data': {
+            'ingredients': [
+                {'id': ingredient_id, 'amount': 10}
+                for ingredient_id in ingredient_ids[:BENCHMARK_INGREDIENTS]
+            ],
+            'tags': tag_ids[:2],
+            'image': image_data_uri(),
+            'name': 'Новое блюдо',
+            'text': 'Описание нового блюда.',
+            'cooking_time': 15,
+        },
+    }
+
+
+def percentile(values, percent):
+    """Процентиль по методу ближайшего ранга."""
+    values = sorted(values)
+    return values[max(math.ceil(percent / 100 * len(values)) - 1, 0)]
+
+
+class Benchmark:
+    """
+    Выполняет эндпоинты ENDPOINTS по порядку iterations раз и собирает
+    число запросов к базе, время SQL и время ответа. Первые warmup
+    проходов прогревают кэши и в результаты не попадают.
+    """
+
+    def __init__(self, context, iterations, warmup=1):
+        self.context = context
+        self.iterations = iterations
+        self.warmup = warmup
+        self.results = {}
+
+    def client(self, auth):
+        client = APIClient()
+        if auth == 'user':
+            client.credentials(
+                HTTP_AUTHORIZATION=f'Token {self.context["token"]}'
+            )
+        elif auth in ('login', 'new'):
+            client.credentials(
+                HTTP_AUTHORIZATION=f'Token {self.context[f"{auth}_token"]}'
+            )
+        return client
+
+    def call(self, endpoint):
+        context = self.context
+        url = endpoint.url.format(**context)
+        data = endpoint.data(context) if endpoint.data else None
+        client = self.client(endpoint.auth)
+        timing = RequestTiming()
+        with connection.execute_wrapper(timing.execute):
+            started = time.perf_counter()
+            response = getattr(client, endpoint.method)(
+                url, data, format='json'
+            )
+            if getattr(response, 'streaming', False):
+                b''.join(response.streaming_content)
+            elapsed = time.perf_counter() - started
+        if response.status_code != endpoint.status:
+            raise RuntimeError(
+                f'{endpoint.method.upper()} {url}: ответ '
+                f'{response.status_code} вместо {endpoint.status}'
+            )
+        if endpoint.name == 'recipes-create':
+            context['created'] = response.data['id']
+        elif endpoint.name == 'token-login':
+            context['login_token'] = response.data['auth_token']
+        elif endpoint.name == 'users-create':
+            context['new_user'] = response.data['id']
+            context['new_token'] = Token.objects.create(
+                user_id=response.data['id']
+            ).key
+        return url, timing.queries, timing.sql, elapsed
+
+    def run(self):
+        for iteration in range(self.warmup + self.iterations):
+            self.context['iteration'] = iteration
+            for endpoint in ENDPOINTS:
+                url, queries, sql_time, elapsed = self.call(endpoint)
+                if iteration < self.warmup:
+                    continue
+                result = self.results.setdefault(
+                    (endpoint.name, endpoint.auth), {
+                        'name': endpoint.name,
+                        'method': endpoint.method.upper(),
+                        'url': url,
+                        'auth': endpoint.auth is not None,
+                        'budget': endpoint.budget,
+                        'queries': 0,
+                        'sql': [],
+                        'wall': [],
+                    }
+                )
+                result['queries'] = max(result['queries'], queries)
+                result['sql'].append(sql_time)
+                result['wall'].append(elapsed)
+        return [
+            {
+                **{
+                    key: value for key, value in result.items()
+                    if key not in ('sql', 'wall')
+                },
+                'sql_ms': round(statistics.mean(result['sql']) * 1000, 3),
+                'p50_ms': round(percentile(result['wall'], 50) * 1000, 3),
+                'p95_ms': round(percentile(result['wall'], 95) * 1000, 3),
+            }
+            for result in self.results.values()
+        ]
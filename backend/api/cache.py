@@ -0,0 +1,148 @@
+import threading
+import time
+
+from django.conf import settings
+from django.core.cache import caches
+from django.core.signals import request_finished, request_started
+
+from api.metrics import count_cache
+
+RECIPE_FRAGMENTS_VERSION = 'recipe-fragments-version'
+INGREDIENTS_VERSION = 'ingredients-version'
+TAGS_VERSION = 'tags-version'
+RECIPES_VERSION = 'recipes-version'
+USERS_VERSION = 'users-version'
+RECIPE_VERSION = 'recipe-version:{}'
+USER_VERSION = 'user-version:{}'
+USER_STATE_VERSION = 'user-state-version:{}'
+RECIPE_FRAGMENT = 'recipe-fragment:{}:{}:{}:{}'
+
+# Версии, прочитанные в текущем запросе. ETag, фрагменты рецептов
+# и справочники читают одни и те же версии, и без этого каждый из них
+# ходил бы в кэш версий (по умолчанию таблицу в базе) отдельно.
+request_versions = threading.local()
+
+
+def new_version():
+    """Возвращает новое значение версии."""
+    return time.time_ns()
+
+
+def get_versions(keys):
+    """
+    Возвращает версии по ключам из кэша версий.
+    Отсутствующие версии создаются заново, поэтому после вытеснения
+    ключа старые фрагменты никогда не будут прочитаны.
+    Во время запроса каждая версия читается из кэша один раз.
+    """
+    known = getattr(request_versions, 'versions', None)
+    versions = {
+        key: known[key] for key in keys if known and key in known
+    }
+    needed = [key for key in keys if key not in versions]
+    missing = {}
+    if needed:
+        cache = caches['versions']
+        versions.update(cache.get_many(needed))
+        missing = {key: new_version() for key in needed if key not in versions}
+        if missing:
+            cache.set_many(missing, timeout=None)
+            versions.update(missing)
+        if known is not None:
+            known.update(versions)
+    count_cache('versions', len(keys) - len(missing), len(missing))
+    return versions
+
+
+def bump_versions(keys):
+    """Меняет версии по ключам, делая устаревшими зависящие от них данные."""
+    versions = {key: new_version() for key in keys}
+    caches['versions'].set_many(versions, timeout=None)
+    known = getattr(request_versions, 'versions', None)
+    if known is not None:
+        known.update(versions)
+
+
+def start_request(**kwargs):
+    """Начинает запоминать прочитанные в запросе версии."""
+    request_versions.versions = {}
+
+
+def finish_request(**kwargs):
+    """Забывает версии, прочитанные в закончившемся запросе."""
+    request_versions.versions = None
+
+
+def get_recipe_fragments(recipes, render, read_at=None):
+    """
+    Возвращает не зависящие от пользователя представления рецептов.
+    Недостающие в кэше фрагменты строятся функцией render и сохраняются.
+    read_at - значение new_version(), взятое до чтения рецептов из базы.
+    Рецепт, версии которого новее, мог быть прочитан до изменения,
+    поэтому его фрагмент строится, но не сохраняется. Без read_at
+    новые фрагменты не сохраняются вовсе.
+    """
+    fragments_cache = caches[settings.RECIPE_FRAGMENTS_CACHE]
+    versions = get_versions(
+        [RECIPE_FRAGMENTS_VERSION]
+        + [RECIPE_VERSION.format(recipe.pk) for recipe in recipes]
+        + [USER_VERSION.format(recipe.author_id) for recipe in recipes]
+    )
+    keys = {
+        recipe.pk: RECIPE_FRAGMENT.format(
+            recipe.pk,
+            versions[RECIPE_FRAGMENTS_VERSION],
+            versions[RECIPE_VERSION.format(recipe.pk)],
+            versions[USER_VERSION.format(recipe.author_id)],
+        )
+        for recipe in recipes
+    }
+    cached = fragments_cache.get_many(keys.values())
+    fragments = {}
+    missing = {}
+    stored = {}
+    for recipe in recipes:
+        key = keys[recipe.pk]
+        if key not in cached:
+            cached[key] = missing[key] = render(recipe)
+            if read_at is not None and read_at > max(
+                versions[RECIPE_FRAGMENTS_VERSION],
+                versions[RECIPE_VERSION.format(recipe.pk)],
+                versions[USER_VERSION.format(recipe.author_id)],
+            ):
+                stored[key] = missing[key]
+        fragments[recipe.pk] = cached[key]
+    count_cache('recipe_fragments', len(recipes) - len(missing), len(missing))
+    if stored:
+        fragments_cache.set_many(stored)
+    return fragments
+
+
+def invalidate_recipes(recipe_ids):
+    """Делает устаревшими фрагменты указанных рецептов и списки рецептов."""
+    bump_versions(
+        [RECIPES_VERSION]
+        + [RECIPE_VERSION.format(pk) for pk in recipe_ids]
+    )
+
+
+def invalidate_user(user_id):
+    """Делает устаревшими фрагменты рецептов автора."""
+    bump_versions([USERS_VERSION, USER_VERSION.format(user_id)])
+
+
+def invalidate_user_state(user_id):
+    """
+    Делает устаревшими ответы с избранным, корзиной и подписками
+    пользователя.
+    """
+    bump_versions([USER_STATE_VERSION.format(user_id)])
+
+
+def invalidate_all_recipes():
+    """Делает устаревшими фрагменты всех рецептов."""
+    bump_versions([RECIPE_FRAGMENTS_VERSION])
+
+
+request_started.connect(start_request, dispatch_uid='versions_start')
+request_finished.connect(finish_request, dispatch_uid='versions_finish')
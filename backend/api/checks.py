@@ -0,0 +1,35 @@
+from django.conf import settings
+from django.core.cache import caches
+from django.core.cache.backends.db import DatabaseCache
+from django.core.checks import Error, Tags, register
+from django.db import connections, router
+
+
+@register(Tags.caches, Tags.database)
+def check_cache_tables(app_configs, databases=None, **kwargs):
+    """
+    Проверяет, что таблицы кэшей в базе созданы. Без таблицы кэша
+    версий каждый запрос к рецептам завершается ошибкой 500.
+    Как и другие проверки базы, запускается командами migrate
+    и check --database.
+    """
+    errors = []
+    for alias in settings.CACHES:
+        cache = caches[alias]
+        if not isinstance(cache, DatabaseCache):
+            continue
+        for database in databases or ():
+            if not router.allow_migrate_model(
+                database, cache.cache_model_class
+            ):
+                continue
+            if cache._table not in (
+                connections[database].introspection.table_names()
+            ):
+                errors.append(Error(
+                    f'Таблица {cache._table} кэша {alias} '
+                    f'не создана в базе {database}.',
+                    hint='Выполните python manage.py createcachetable.',
+                    id='api.E001',
+                ))
+    return errors
@@ -0,0 +1,46 @@
+import hashlib
+from functools import wraps
+
+from django.utils.cache import patch_cache_control, patch_vary_headers
+from django.utils.http import parse_etags, quote_etag
+from rest_framework import status
+from rest_framework.response import Response
+
+from api.cache import get_versions
+
+
+def make_etag(request, keys):
+    """Возвращает строгий ETag ответа по версиям keys из общего кэша."""
+    versions = get_versions(keys)
+    parts = [
+        request.get_full_path(),
+        request.META.get('HTTP_ACCEPT', ''),
+        *(f'{key}={versions[key]}' for key in keys),
+    ]
+    return quote_etag(
+        hashlib.sha256('|'.join(parts).encode()).hexdigest()
+    )
+
+
+def conditional(view):
+    """
+    Добавляет к ответу ETag по версиям из view.get_etag_keys().
+    Если клиент прислал совпадающий If-None-Match, возвращается 304
+    без обращения к базе данных и сериализаторам.
+    Заголовок Cache-Control берется из атрибута view.cache_control.
+    """
+    @wraps(view)
+    def wrapper(self, request, *args, **kwargs):
+        etag = make_etag(request, self.get_etag_keys())
+        if etag in parse_etags(request.META.get('HTTP_IF_NONE_MATCH', '')):
+            response = Response(status=status.HTTP_304_NOT_MODIFIED)
+        else:
+            response = view(self, request, *args, **kwargs)
+        if response.status_code in (
+            status.HTTP_200_OK, status.HTTP_304_NOT_MODIFIED
+        ):
+            response['ETag'] = etag
+            patch_cache_control(response, **self.cache_control)
+            patch_vary_headers(response, ('Accept', 'Authorization'))
+        return response
+    return wrapper
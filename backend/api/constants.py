@@ -1,11 +1,36 @@
 PAGE_SIZE = 6
+INVALID_CURSOR = 'Неверный курсор.'
+CURSOR_WITH_SEARCH = {
+    'cursor': 'Курсор нельзя использовать вместе с поиском search.'
+}
 INGRIDIENTS_FIELD = {'ingredients': 'Выберите пожалуйстя хотя бы 1 ингредиент'}
 INGRIDIENTS_UNIQUE = {'ingredients':
                       'Выбранный вами ингредиент не является уникальным'}
 TAG_FIELD = {'tags': 'Выберите пожалуйстя хотя бы 1 тэг для рецепта'}
 TAG_UNIQUE = {'tags': 'Выбранный вами тэг не является уникальным.'}
-RECIPE_EXISTS = {'errors': 'Рецепт уже добавлен в список'},
+INGREDIENTS_NOT_FOUND = 'Ингредиенты не найдены: {}.'
+TAGS_NOT_FOUND = 'Тэги не найдены: {}.'
+TAGS_MODE_ANY = 'any'
+TAGS_MODE_ALL = 'all'
+TAGS_MODES = (
+    (TAGS_MODE_ANY, 'Любой из тегов'),
+    (TAGS_MODE_ALL, 'Все теги'),
+)
+RECIPE_EXISTS = {'errors': 'Рецепт уже добавлен в список'}
 SUBSCRIBE_EXISTS = {'errors': 'Вы подписаны на этого автора'}
 SUBSCRIBE_NO_EXISTS = {'errors': 'Вы не подписаны на данного автора.'}
 ERROR_SUBSCRIBE_HIMSELF = {'message':
                            'Вы не можете подписаться на самого себя'}
+BULK_RECIPES_LIMIT = 100
+BULK_ADDED = 'added'
+BULK_REMOVED = 'removed'
+BULK_EXISTS = 'exists'
+BULK_NOT_FOUND = 'not_found'
+IDEMPOTENCY_HEADER = 'HTTP_IDEMPOTENCY_KEY'
+IDEMPOTENCY_IN_PROGRESS = {'errors': 'Запрос с этим ключом уже выполняется.'}
+SHOPPING_CART_FORMAT_PARAM = 'file_format'
+SHOPPING_CART_FORMAT_ERROR = {'errors': 'Неподдерживаемый формат файла.'}
+BASE64_SEPARATOR = ';base64,'
+BASE64_CHUNK_SIZE = 64 * 1024
+IMAGE_HEADER_MAX_SIZE = 256 * 1024
+IMAGE_TOO_LARGE = 'Размер изображения превышает допустимый.'
@@ -1,8 +1,11 @@
 from django.contrib.auth import get_user_model
+from django.db.models import Exists, OuterRef
 from django_filters import rest_framework as filters
 from rest_framework.filters import SearchFilter
 
-from recipes.models import Recipe, Tag
+from api.constants import TAGS_MODE_ALL, TAGS_MODES
+from api.reference import reference_data
+from recipes.models import Recipe
 
 User = get_user_model()
 
@@ -16,11 +19,16 @@ class RecipeFilter(filters.FilterSet):
     """Фильтр для полученяи рецептов."""
     author = filters.ModelChoiceFilter(
         queryset=User.objects.all())
-    tags = filters.ModelMultipleChoiceFilter(
-        queryset=Tag.objects.all(),
-        to_field_name='slug',
-        field_name='tags__slug'
+    tags = filters.MultipleChoiceFilter(
+        choices=lambda: [
+            (tag.slug, tag.name) for tag in reference_data.get_tags()
+        ],
+        method='filter_tags'
     )
+    tags_mode = filters.ChoiceFilter(
+        choices=TAGS_MODES, empty_label=None, method='filter_tags_mode'
+    )
+    search = filters.CharFilter(method='filter_search')
     is_favorited = filters.BooleanFilter(method='get_check_favorited')
     is_in_shopping_cart = filters.BooleanFilter(
         method='get_check_shopping_cart'
@@ -28,7 +36,45 @@ class RecipeFilter(filters.FilterSet):
 
     class Meta:
         model = Recipe
-        fields = ('author', 'tags', 'is_favorited', 'is_in_shopping_cart')
+        fields = ('author', 'tags', 'tags_mode', 'search', 'is_favorited',
+                  'is_in_shopping_cart')
+
+    def filter_tags(self, queryset, name, value):
+        """
+        Отбор по слагам тегов, id тегов берутся из справочника.
+        Каждое условие - подзапрос EXISTS к таблице связи рецептов
+        с тегами, поэтому рецепты в выдаче не повторяются.
+        При tags_mode=all рецепт должен иметь все выбранные теги,
+        иначе хотя бы один из них.
+        """
+        tag_ids = [
+            tag.pk for tag in map(reference_data.get_tag_by_slug, value)
+            if tag is not None
+        ]
+        if not tag_ids:
+            return queryset.none()
+        recipe_tags = Recipe.tags.through.objects.filter(
+            recipe_id=OuterRef('pk')
+        )
+        if self.form.cleaned_data.get('tags_mode') != TAGS_MODE_ALL:
+            return queryset.filter(
+                Exists(recipe_tags.filter(tag_id__in=tag_ids))
+            )
+        for tag_id in tag_ids:
+            queryset = queryset.filter(
+                Exists(recipe_tags.filter(tag_id=tag_id))
+            )
+        return queryset
+
+    def filter_tags_mode(self, queryset, name, value):
+        """Режим учитывается в filter_tags."""
+        return queryset
+
+    def filter_search(self, queryset, name, value):
+        """Полнотекстовый поиск, самые релевантные рецепты первыми."""
+        return queryset.search(value).order_by(
+            '-search_rank', *Recipe._meta.ordering
+        )
 
     def get_check_favorited(self, queryset, name, value):
         """Проверка наличия рецепта в избранном."""
@@ -0,0 +1,62 @@
+import hashlib
+from functools import wraps
+
+from django.conf import settings
+from django.core.cache import caches
+from rest_framework import status
+from rest_framework.response import Response
+
+from api.constants import IDEMPOTENCY_HEADER, IDEMPOTENCY_IN_PROGRESS
+from api.metrics import count_cache
+
+IDEMPOTENCY_RESPONSE = 'idempotency-response:{}'
+IDEMPOTENCY_LOCK = 'idempotency-lock:{}'
+
+
+def idempotency_key(request, key):
+    """Возвращает ключ кэша для запроса пользователя с заголовком key."""
+    return hashlib.sha256(
+        f'{request.user.pk}:{request.method}:{request.path}:{key}'.encode()
+    ).hexdigest()
+
+
+def idempotent(view):
+    """
+    Позволяет безопасно повторять запрос с заголовком Idempotency-Key.
+    Ответ на первый запрос сохраняется в кэше idempotency и
+    возвращается на повторы с тем же ключом, не выполняя действие
+    снова. Пока первый запрос выполняется, повторы получают 409.
+    Исключения и ответы с ошибкой сервера не сохраняются.
+    """
+    @wraps(view)
+    def wrapper(self, request, *args, **kwargs):
+        cache = caches['idempotency']
+        key = request.META.get(IDEMPOTENCY_HEADER)
+        if not key:
+            return view(self, request, *args, **kwargs)
+        key = idempotency_key(request, key)
+        response_key = IDEMPOTENCY_RESPONSE.format(key)
+        stored = cache.get(response_key)
+        count_cache('idempotency', stored is not None, stored is None)
+        if stored is None:
+            lock_key = IDEMPOTENCY_LOCK.format(key)
+            if not cache.add(lock_key, True,
+                             timeout=settings.IDEMPOTENCY_LOCK_TIMEOUT):
+                return Response(IDEMPOTENCY_IN_PROGRESS,
+                                status=status.HTTP_409_CONFLICT)
+            try:
+                response = view(self, request, *args, **kwargs)
+                if response.status_code < 500:
+                    cache.set(
+                        response_key,
+                        (response.status_code, response.data),
+                        timeout=settings.IDEMPOTENCY_KEY_TIMEOUT
+                    )
+                return response
+            finally:
+                cache.delete(lock_key)
+        status_code, data = stored
+        response = Response(data, status=status_code)
+        response['Idempotent-Replayed'] = 'true'
+        return response
+    return wrapper
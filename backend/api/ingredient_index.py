@@ -0,0 +1,66 @@
+import bisect
+import threading
+
+from api.reference import reference_data
+
+
+def fold(value):
+    """Приводит строку к виду для поиска без учета регистра и буквы ё."""
+    return value.casefold().replace('ё', 'е')
+
+
+class IngredientIndex:
+    """
+    Префиксный индекс ингредиентов в памяти процесса.
+    Отсортированный по нормализованному названию список, поиск бинарный.
+    Индекс перестраивается, когда reference_data заново загружает
+    ингредиенты. Источник, ключи и ингредиенты публикуются одним
+    присваиванием, чтобы поиск в другом потоке не увидел ключи
+    нового индекса вместе с ингредиентами старого.
+    """
+
+    def __init__(self):
+        self.lock = threading.Lock()
+        self._data = (None, [], [])
+
+    def build(self, source):
+        entries = sorted(
+            (
+                fold(ingredient.name),
+                ingredient.name,
+                ingredient.measurement_unit,
+                ingredient.pk,
+            )
+            for ingredient in source.values()
+        )
+        keys = [entry[0] for entry in entries]
+        ingredients = [
+            {'id': pk, 'name': name, 'measurement_unit': measurement_unit}
+            for _, name, measurement_unit, pk in entries
+        ]
+        self._data = (source, keys, ingredients)
+
+    def refresh(self):
+        """Перестраивает индекс, если ингредиенты изменились."""
+        source = reference_data.get_ingredients()
+        if source is not self._data[0]:
+            with self.lock:
+                if source is not self._data[0]:
+                    self.build(source)
+
+    def search(self, prefix, limit=None):
+        """Возвращает ингредиенты, название которых начинается с prefix."""
+        self.refresh()
+        _, keys, ingredients = self._data
+        if not prefix:
+            return ingredients[:limit]
+        key = fold(prefix)
+        start = bisect.bisect_left(keys, key)
+        end = start
+        stop = len(keys) if limit is None else start + limit
+        while end < min(stop, len(keys)) and keys[end].startswith(key):
+            end += 1
+        return ingredients[start:end]
+
+
+ingredient_index = IngredientIndex()
@@ -0,0 +1,144 @@
+import json
+import platform
+import tempfile
+
+import django
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection
+from django.test.utils import (override_settings, setup_test_environment,
+                               teardown_test_environment)
+
+from api.benchmark import Benchmark, seed
+
+BENCHMARK_CACHES = {
+    alias: {
+        'BACKEND': 'django.core.cache.backends.locmem.LocMemCache',
+        'LOCATION': f'benchmark-{alias}',
+    }
+    for alias in ('default', 'recipes', 'versions', 'idempotency')
+}
+
+
+class Command(BaseCommand):
+    help = (
+        'Замер числа запросов к базе и времени ответа эндпоинтов API '
+        'на тестовой базе со сгенерированными данными'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--users', type=int, default=50)
+        parser.add_argument('--recipes', type=int, default=500)
+        parser.add_argument(
+            '--favorites', type=int, default=20,
+            help='Рецептов в избранном и в корзине у пользователя'
+        )
+        parser.add_argument(
+            '--subscriptions', type=int, default=10,
+            help='Подписок у пользователя'
+        )
+        parser.add_argument('--iterations', type=int, default=20)
+        parser.add_argument('--warmup', type=int, default=1)
+        parser.add_argument('--seed', type=int, default=0)
+        parser.add_argument(
+            '--output', help='Файл для результатов в формате JSON'
+        )
+        parser.add_argument(
+            '--compare',
+            help='Файл с результатами предыдущего запуска для сравнения'
+        )
+        parser.add_argument(
+            '--keepdb', action='store_true',
+            help='Не удалять тестовую базу после замера'
+        )
+
+    def handle(self, *args, **options):
+        if options['iterations'] < 1:
+            raise CommandError('Нужна хотя бы одна итерация.')
+        setup_test_environment()
+        old_name = connection.creation.create_test_db(
+            verbosity=0, autoclobber=True, keepdb=options['keepdb']
+        )
+        try:
+            with tempfile.TemporaryDirectory() as media_root:
+                with override_settings(
+                    CACHES=BENCHMARK_CACHES,
+                    MEDIA_ROOT=media_root,
+                    IMAGE_VARIANTS_WORKERS=0,
+                    SERVER_TIMING_SAMPLE_RATE=0,
+                    N_PLUS_ONE_MODE='raise',
+                ):
+                    results = self.benchmark(options)
+        finally:
+            connection.creation.destroy_test_db(
+                old_name, verbosity=0, keepdb=options['keepdb']
+            )
+            teardown_test_environment()
+        report = {
+            'database': connection.vendor,
+            'python': platform.python_version(),
+            'django': django.get_version(),
+            'dataset': {
+                key: options[key] for key in (
+                    'users', 'recipes', 'favorites', 'subscriptions', 'seed'
+                )
+            },
+            'iterations': options['iterations'],
+            'endpoints': results,
+        }
+        if options['output']:
+            with open(options['output'], 'w', encoding='utf-8') as file:
+                json.dump(report, file, ensure_ascii=False, indent=2)
+        previous = {}
+        if options['compare']:
+            with open(options['compare'], encoding='utf-8') as file:
+                previous = {
+                    (result['name'], result['auth']): result
+                    for result in json.load(file)['endpoints']
+                }
+        self.print_results(results, previous)
+        over_budget = [
+            result for result in results
+            if result['queries'] > result['budget']
+        ]
+        if over_budget:
+            raise CommandError(
+                'Превышен бюджет запросов: ' + ', '.join(
+                    f'{result["method"]} {result["url"]} '
+                    f'({result["queries"]} > {result["budget"]})'
+                    for result in over_budget
+                )
+            )
+        self.stdout.write(self.style.SUCCESS('Бюджеты запросов соблюдены.'))
+
+    def benchmark(self, options):
+        context = seed(
+            options['users'], options['recipes'], options['favorites'],
+            options['subscriptions'], random_seed=options['seed']
+        )
+        return Benchmark(
+            context, options['iterations'], options['warmup']
+        ).run()
+
+    def print_results(self, results, previous):
+        self.stdout.write(
+            f'{"Эндпоинт":<40} {"Запросы":>11} {"SQL, мс":>9} '
+            f'{"p50, мс":>9} {"p95, мс":>9}'
+        )
+        for result in results:
+            name = f'{result["method"]} {result["name"]}' + (
+                ' (auth)' if result['auth'] else ''
+            )
+            queries = f'{result["queries"]}/{result["budget"]}'
+            line = (
+                f'{name:<40} {queries:>11} {result["sql_ms"]:>9.2f} '
+                f'{result["p50_ms"]:>9.2f} {result["p95_ms"]:>9.2f}'
+            )
+            before = previous.get((result['name'], result['auth']))
+            if before:
+                line += (
+                    f'  запросы {result["queries"] - before["queries"]:+d}, '
+                    f'p95 {result["p95_ms"] - before["p95_ms"]:+.2f} мс'
+                )
+            if result['queries'] > result['budget']:
+                line = self.style.ERROR(line)
+            self.stdout.write(line)
@@ -0,0 +1,118 @@
+import ipaddress
+import os
+import resource
+import secrets
+import time
+
+from django.conf import settings
+
+from prometheus_client import (CONTENT_TYPE_LATEST, REGISTRY,
+                               CollectorRegistry, Counter, Gauge, Histogram,
+                               generate_latest, multiprocess)
+
+# При заданной PROMETHEUS_MULTIPROC_DIR воркеры gunicorn пишут метрики
+# в файлы этой папки, а /metrics собирает их со всех воркеров.
+MULTIPROCESS = bool(os.getenv('PROMETHEUS_MULTIPROC_DIR'))
+
+REQUEST_LATENCY = Histogram(
+    'foodgram_request_duration_seconds',
+    'Время обработки запроса',
+    ['view', 'method', 'status'],
+)
+REQUEST_BYTES = Counter(
+    'foodgram_request_bytes',
+    'Размер тел запросов',
+    ['view'],
+)
+RESPONSE_BYTES = Counter(
+    'foodgram_response_bytes',
+    'Размер тел ответов',
+    ['view'],
+)
+DB_QUERIES = Histogram(
+    'foodgram_db_queries',
+    'Количество SQL-запросов на запрос',
+    ['view'],
+    buckets=(0, 1, 2, 3, 5, 8, 13, 21, 34, 55, 89, float('inf')),
+)
+CACHE_REQUESTS = Counter(
+    'foodgram_cache_requests',
+    'Обращения к кэшам',
+    ['cache', 'result'],
+)
+WORKER_REQUESTS_IN_PROGRESS = Gauge(
+    'foodgram_worker_requests_in_progress',
+    'Запросы в обработке',
+    multiprocess_mode='livesum',
+)
+WORKER_STARTED = Gauge(
+    'foodgram_worker_start_time_seconds',
+    'Время запуска воркера',
+    multiprocess_mode='liveall',
+)
+WORKER_MAX_RSS = Gauge(
+    'foodgram_worker_max_rss_bytes',
+    'Наибольший объем памяти воркера',
+    multiprocess_mode='liveall',
+)
+WORKER_STARTED.set(time.time())
+
+
+def count_cache(cache, hits, misses):
+    """Учитывает попадания и промахи кэша cache."""
+    if hits:
+        CACHE_REQUESTS.labels(cache, 'hit').inc(hits)
+    if misses:
+        CACHE_REQUESTS.labels(cache, 'miss').inc(misses)
+
+
+def observe_request(request, response, timing, size=None):
+    """
+    Учитывает запрос по замерам ServerTimingMiddleware.
+    size - размер переданного тела потокового ответа.
+    """
+    view = timing.view or 'unknown'
+    REQUEST_LATENCY.labels(
+        view, request.method, response.status_code
+    ).observe(timing.metrics['total'] / 1000)
+    DB_QUERIES.labels(view).observe(timing.queries)
+    REQUEST_BYTES.labels(view).inc(
+        int(request.META.get('CONTENT_LENGTH') or 0)
+    )
+    if size is not None:
+        RESPONSE_BYTES.labels(view).inc(size)
+    elif response.has_header('Content-Length'):
+        RESPONSE_BYTES.labels(view).inc(int(response['Content-Length']))
+    elif not response.streaming:
+        RESPONSE_BYTES.labels(view).inc(len(response.content))
+    max_rss = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    WORKER_MAX_RSS.set(max_rss * 1024)
+
+
+def metrics_allowed(request):
+    """
+    Проверяет доступ к метрикам: адрес клиента входит в одну из
+    подсетей METRICS_ALLOWED_IPS или передан токен METRICS_TOKEN.
+    """
+    token = settings.METRICS_TOKEN
+    if token and secrets.compare_digest(
+        request.META.get('HTTP_AUTHORIZATION', ''), f'Bearer {token}'
+    ):
+        return True
+    try:
+        address = ipaddress.ip_address(request.META.get('REMOTE_ADDR', ''))
+    except ValueError:
+        return False
+    return any(
+        address in ipaddress.ip_network(network.strip(), strict=False)
+        for network in settings.METRICS_ALLOWED_IPS if network.strip()
+    )
+
+
+def export():
+    """Возвращает метрики в текстовом формате и его тип."""
+    registry = REGISTRY
+    if MULTIPROCESS:
+        registry = CollectorRegistry()
+        multiprocess.MultiProcessCollector(registry)
+    return generate_latest(registry), CONTENT_TYPE_LATEST
@@ -0,0 +1,318 @@
+import copy
+import cProfile
+import json
+import logging
+import os
+import random
+import re
+import time
+import traceback
+from contextlib import ExitStack, contextmanager
+
+from django.conf import settings
+from django.db import connections
+
+from api.metrics import WORKER_REQUESTS_IN_PROGRESS, observe_request
+
+logger = logging.getLogger(__name__)
+
+
+def view_name(view_func, method):
+    """
+    Имя представления для логов: класс и действие DRF,
+    например RecipeViewSet.download_shopping_cart.
+    """
+    cls = getattr(view_func, 'cls', None)
+    if cls is None:
+        return f'{view_func.__module__}.{view_func.__qualname__}'
+    actions = getattr(view_func, 'actions', None) or {}
+    return f'{cls.__name__}.{actions.get(method.lower(), method.lower())}'
+
+
+# Списки параметров IN разной длины дают одну форму запроса.
+IN_PARAMS = re.compile(r'\((?:%s, )+%s\)')
+
+
+class NPlusOneError(Exception):
+    """Запрос одной формы повторяется в запросе с разными параметрами."""
+
+
+def query_shape(sql):
+    return IN_PARAMS.sub('(%s, ...)', sql)
+
+
+def call_site(depth):
+    """Последние depth кадров стека из кода проекта вне этого модуля."""
+    base = str(settings.BASE_DIR)
+    frames = [
+        frame for frame in traceback.extract_stack()
+        if frame.filename.startswith(base) and frame.filename != __file__
+    ]
+    return ''.join(traceback.format_list(frames[-depth:]))
+
+
+class QueryPatternTracker:
+    """
+    Считает запросы каждой формы с разными параметрами. Когда их
+    становится threshold, запоминает место вызова или, при raise_error,
+    сразу выбрасывает NPlusOneError.
+    """
+
+    def __init__(self, threshold, raise_error):
+        self.threshold = threshold
+        self.raise_error = raise_error
+        self.params = {}
+        self.counts = {}
+        self.sites = {}
+
+    def execute(self, execute, sql, params, many, context):
+        shape = query_shape(sql)
+        self.counts[shape] = self.counts.get(shape, 0) + 1
+        shape_params = self.params.setdefault(shape, set())
+        if len(shape_params) < self.threshold:
+            shape_params.add(repr(params))
+            if len(shape_params) == self.threshold:
+                site = call_site(settings.N_PLUS_ONE_STACK_DEPTH)
+                if self.raise_error:
+                    raise NPlusOneError(
+                        f'Запрос повторяется {self.threshold} раз '
+                        f'с разными параметрами: {sql}\n{site}'
+                    )
+                self.sites[shape] = site
+        return execute(sql, params, many, context)
+
+    def repeated(self):
+        """Формы повторяющихся запросов, число повторов и место вызова."""
+        return [
+            (shape, self.counts[shape], site)
+            for shape, site in self.sites.items()
+        ]
+
+
+class RequestTiming:
+    """Замеры одного запроса, время в секундах."""
+
+    def __init__(self):
+        self.started = time.perf_counter()
+        self.view = None
+        self.queries = 0
+        self.sql = 0
+        self.view_sql = 0
+        self.view_started = None
+        self.view_finished = None
+        self.finished = None
+
+    def execute(self, execute, sql, params, many, context):
+        started = time.perf_counter()
+        try:
+            return execute(sql, params, many, context)
+        finally:
+            duration = time.perf_counter() - started
+            self.queries += 1
+            self.sql += duration
+            if self.view_started is not None and self.view_finished is None:
+                self.view_sql += duration
+
+    def finish(self):
+        self.finished = time.perf_counter()
+        if self.view_started is not None and self.view_finished is None:
+            self.view_finished = self.finished
+
+    @property
+    def metrics(self):
+        """
+        Метрики в миллисекундах. serializer - время кода представления
+        без SQL, большую часть которого занимает сериализация,
+        render - время отрисовки ответа после представления.
+        """
+        view = render = 0
+        if self.view_started is not None:
+            view = self.view_finished - self.view_started - self.view_sql
+            render = self.finished - self.view_finished
+        return {
+            'db': self.sql * 1000,
+            'serializer': view * 1000,
+            'render': render * 1000,
+            'total': (self.finished - self.started) * 1000,
+        }
+
+    def header(self):
+        metrics = self.metrics
+        return ', '.join(
+            f'{name};dur={duration:.1f}' + (
+                f';desc="{self.queries} queries"' if name == 'db' else ''
+            )
+            for name, duration in metrics.items()
+        )
+
+
+class ServerTimingMiddleware:
+    """
+    Замеряет число и время SQL-запросов, время сериализации
+    и отрисовки ответа. Для сотрудников или при SERVER_TIMING
+    замеры отдаются в заголовке Server-Timing. Доля запросов
+    SERVER_TIMING_SAMPLE_RATE пишется в лог одной строкой JSON,
+    а при заданном SERVER_TIMING_PROFILE_DIR для них же сохраняется
+    профиль cProfile. Замеры всех запросов попадают в метрики Prometheus.
+    Потоковый ответ замеряется до конца передачи тела, а заголовок
+    для него содержит замеры до начала передачи.
+    """
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+
+    def __call__(self, request):
+        timing = RequestTiming()
+        request.server_timing = timing
+        sampled = random.random() < settings.SERVER_TIMING_SAMPLE_RATE
+        profiler = None
+        if sampled and settings.SERVER_TIMING_PROFILE_DIR:
+            profiler = cProfile.Profile()
+        with self.measure(timing, profiler):
+            response = self.get_response(request)
+        user = getattr(request, 'user', None)
+        header = settings.SERVER_TIMING or getattr(user, 'is_staff', False)
+        if response.streaming:
+            if header:
+                started = copy.copy(timing)
+                started.finish()
+                response['Server-Timing'] = started.header()
+            response.streaming_content = self.stream(
+                response.streaming_content,
+                request, response, timing, sampled, profiler
+            )
+            return response
+        self.finish(request, response, timing, sampled, profiler)
+        if header:
+            response['Server-Timing'] = timing.header()
+        return response
+
+    @contextmanager
+    def measure(self, timing, profiler):
+        """Учитывает запросы к базе и профилирует код внутри блока."""
+        with ExitStack() as stack:
+            stack.enter_context(WORKER_REQUESTS_IN_PROGRESS.track_inprogress())
+            for connection in connections.all():
+                stack.enter_context(
+                    connection.execute_wrapper(timing.execute)
+                )
+            if profiler is not None:
+                profiler.enable()
+            try:
+                yield
+            finally:
+                if profiler is not None:
+                    profiler.disable()
+
+    def stream(self, content, request, response, timing, sampled,
+               profiler):
+        """
+        Отдает тело потокового ответа, продолжая замеры,
+        и завершает их, когда тело передано или передача прервана.
+        """
+        size = 0
+        try:
+            with self.measure(timing, profiler):
+                for chunk in content:
+                    size += len(chunk)
+                    yield chunk
+        finally:
+            self.finish(request, response, timing, sampled, profiler, size)
+
+    def finish(self, request, response, timing, sampled, profiler,
+               size=None):
+        timing.finish()
+        observe_request(request, response, timing, size)
+        if sampled:
+            self.log(request, response, timing, profiler)
+
+    def process_view(self, request, view_func, view_args, view_kwargs):
+        request.server_timing.view = view_name(
+            view_func, request.method
+        )
+        request.server_timing.view_started = time.perf_counter()
+
+    def process_template_response(self, request, response):
+        request.server_timing.view_finished = time.perf_counter()
+        return response
+
+    def log(self, request, response, timing, profiler):
+        record = {
+            'view': timing.view,
+            'method': request.method,
+            'path': request.path,
+            'status': response.status_code,
+            'queries': timing.queries,
+            **{
+                f'{name}_ms': round(duration, 1)
+                for name, duration in timing.metrics.items()
+            },
+        }
+        if profiler is not None:
+            os.makedirs(settings.SERVER_TIMING_PROFILE_DIR, exist_ok=True)
+            record['profile'] = os.path.join(
+                settings.SERVER_TIMING_PROFILE_DIR,
+                f'{timing.view or "unknown"}-{time.time_ns()}-'
+                f'{os.getpid()}.prof'
+            )
+            profiler.dump_stats(record['profile'])
+        logger.info(json.dumps(record, ensure_ascii=False))
+
+
+class QueryPatternMiddleware:
+    """
+    Находит N+1: запрос одной формы, выполненный в одном запросе
+    N_PLUS_ONE_THRESHOLD и более раз с разными параметрами.
+    При N_PLUS_ONE_MODE=raise (тесты, benchmark_api) запрос падает
+    с NPlusOneError и местом вызова, при log доля запросов
+    N_PLUS_ONE_SAMPLE_RATE проверяется и находки пишутся в лог.
+    """
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+
+    def __call__(self, request):
+        mode = settings.N_PLUS_ONE_MODE
+        if mode != 'raise' and (
+            mode != 'log'
+            or random.random() >= settings.N_PLUS_ONE_SAMPLE_RATE
+        ):
+            return self.get_response(request)
+        tracker = QueryPatternTracker(
+            settings.N_PLUS_ONE_THRESHOLD, raise_error=mode == 'raise'
+        )
+        with self.track(tracker):
+            response = self.get_response(request)
+        if response.streaming:
+            response.streaming_content = self.stream(
+                response.streaming_content, request, tracker
+            )
+        else:
+            self.report(request, tracker)
+        return response
+
+    @contextmanager
+    def track(self, tracker):
+        with ExitStack() as stack:
+            for connection in connections.all():
+                stack.enter_context(
+                    connection.execute_wrapper(tracker.execute)
+                )
+            yield
+
+    def stream(self, content, request, tracker):
+        """Отдает тело потокового ответа, продолжая поиск N+1."""
+        with self.track(tracker):
+            yield from content
+        self.report(request, tracker)
+
+    def report(self, request, tracker):
+        view = getattr(
+            getattr(request, 'server_timing', None), 'view', None
+        ) or 'unknown'
+        for shape, count, site in tracker.repeated():
+            logger.warning(
+                'N+1 в %s %s (%s): запрос выполнен %s раз: %s\n%s',
+                request.method, request.path,
+                view, count, shape, site
+            )
@@ -1,8 +1,88 @@
+import base64
+import binascii
+
+from django.utils.dateparse import parse_datetime
+from rest_framework.exceptions import NotFound, ValidationError
 from rest_framework.pagination import PageNumberPagination
+from rest_framework.response import Response
+from rest_framework.utils.urls import replace_query_param
 
-from api.constants import PAGE_SIZE
+from api.constants import CURSOR_WITH_SEARCH, INVALID_CURSOR, PAGE_SIZE
 
 
 class LimitPageNumberPagination(PageNumberPagination):
     page_size = PAGE_SIZE
     page_size_query_param = 'limit'
+
+
+class RecipePagination(LimitPageNumberPagination):
+    """
+    Пагинация рецептов.
+    При наличии параметра cursor выдача идет по ключу (pub_date, id)
+    без OFFSET и подсчета общего количества рецептов.
+    Поиск search упорядочивает выдачу по релевантности, которой нет
+    в ключе курсора, поэтому вместе с ним курсор отклоняется.
+    """
+    cursor_query_param = 'cursor'
+    cursor_ordering = ('-pub_date', '-id')
+    search_query_param = 'search'
+
+    def paginate_queryset(self, queryset, request, view=None):
+        self.cursor_mode = self.cursor_query_param in request.query_params
+        if not self.cursor_mode:
+            return super().paginate_queryset(queryset, request, view)
+        if request.query_params.get(self.search_query_param):
+            raise ValidationError(CURSOR_WITH_SEARCH)
+        self.request = request
+        page_size = self.get_page_size(request)
+        queryset = queryset.order_by(*self.cursor_ordering)
+        position = self.decode_cursor(
+            request.query_params[self.cursor_query_param]
+        )
+        if position:
+            pub_date, pk = position
+            queryset = queryset.filter(pub_date__lte=pub_date).exclude(
+                pub_date=pub_date, id__gte=pk
+            )
+        page = list(queryset[:page_size + 1])
+        self.has_next = len(page) > page_size
+        page = page[:page_size]
+        self.last = page[-1] if page else None
+        return page
+
+    def get_paginated_response(self, data):
+        if not self.cursor_mode:
+            return super().get_paginated_response(data)
+        return Response({
+            'next': self.get_next_cursor_link(),
+            'results': data,
+        })
+
+    def get_next_cursor_link(self):
+        if not self.has_next:
+            return None
+        return replace_query_param(
+            self.request.build_absolute_uri(),
+            self.cursor_query_param,
+            self.encode_cursor(self.last),
+        )
+
+    def encode_cursor(self, recipe):
+        position = f'{recipe.pub_date.isoformat()}|{recipe.id}'
+        return base64.urlsafe_b64encode(position.encode()).decode()
+
+    def decode_cursor(self, cursor):
+        """Возвращает позицию (pub_date, id) или None для первой страницы."""
+        if not cursor:
+            return None
+        try:
+            pub_date, pk = base64.urlsafe_b64decode(
+                cursor.encode()
+            ).decode().split('|')
+            pub_date = parse_datetime(pub_date)
+            pk = int(pk)
+        except (binascii.Error, UnicodeError, ValueError):
+            raise NotFound(INVALID_CURSOR)
+        if pub_date is None:
+            raise NotFound(INVALID_CURSOR)
+        return pub_date, pk
@@ -0,0 +1,109 @@
+import threading
+import time
+
+from django.conf import settings
+from django.core.signals import request_finished, request_started
+from django.db import DatabaseError
+
+from api.cache import INGREDIENTS_VERSION, TAGS_VERSION, get_versions
+from api.metrics import count_cache
+from recipes.models import Ingredient, Tag
+
+
+class ReferenceData:
+    """
+    Теги и ингредиенты в памяти процесса.
+    Версии таблиц в общем кэше сверяются не чаще одного раза за запрос,
+    изменившаяся таблица загружается заново. Без смены версии данные
+    перечитываются по истечении REFERENCE_DATA_TTL секунд.
+    """
+
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.local = threading.local()
+        self.versions = {}
+        self.loaded_at = 0
+        self.tags = {}
+        self.tags_by_slug = {}
+        self.ingredients = {}
+
+    def load_tags(self):
+        tags = list(Tag.objects.all())
+        self.tags = {tag.pk: tag for tag in tags}
+        self.tags_by_slug = {tag.slug: tag for tag in tags}
+
+    def load_ingredients(self):
+        self.ingredients = Ingredient.objects.in_bulk()
+
+    def refresh(self):
+        """Перечитывает таблицы, версии которых изменились."""
+        if getattr(self.local, 'checked', False):
+            return
+        versions = get_versions([TAGS_VERSION, INGREDIENTS_VERSION])
+        expired = (
+            time.monotonic() - self.loaded_at > settings.REFERENCE_DATA_TTL
+        )
+        stale = versions != self.versions or expired
+        count_cache('reference_data', not stale, stale)
+        if stale:
+            with self.lock:
+                if expired or versions[TAGS_VERSION] != self.versions.get(
+                    TAGS_VERSION
+                ):
+                    self.load_tags()
+                if expired or versions[INGREDIENTS_VERSION] != (
+                    self.versions.get(INGREDIENTS_VERSION)
+                ):
+                    self.load_ingredients()
+                if expired:
+                    self.loaded_at = time.monotonic()
+                self.versions = versions
+        self.local.checked = getattr(self.local, 'in_request', False)
+
+    def warm_up(self):
+        """Загружает данные при старте процесса, если база доступна."""
+        try:
+            self.refresh()
+        except DatabaseError:
+            pass
+
+    def get_tags(self):
+        """Возвращает все теги в порядке модели."""
+        self.refresh()
+        return sorted(
+            self.tags.values(), key=lambda tag: (tag.name, tag.pk)
+        )
+
+    def get_tag(self, pk):
+        self.refresh()
+        return self.tags.get(pk)
+
+    def get_tag_by_slug(self, slug):
+        self.refresh()
+        return self.tags_by_slug.get(slug)
+
+    def get_ingredient(self, pk):
+        self.refresh()
+        return self.ingredients.get(pk)
+
+    def get_ingredients(self):
+        """Возвращает словарь всех ингредиентов по id."""
+        self.refresh()
+        return self.ingredients
+
+    def start_request(self, **kwargs):
+        self.local.in_request = True
+        self.local.checked = False
+
+    def finish_request(self, **kwargs):
+        self.local.in_request = False
+        self.local.checked = False
+
+
+reference_data = ReferenceData()
+request_started.connect(
+    reference_data.start_request, dispatch_uid='reference_data_start'
+)
+request_finished.connect(
+    reference_data.finish_request, dispatch_uid='reference_data_finish'
+)
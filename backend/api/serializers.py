@@ -1,20 +1,37 @@
 from django.contrib.auth import get_user_model
-from django.db import transaction
+from django.db import IntegrityError, models, transaction
 from djoser.serializers import UserSerializer
 from rest_framework import serializers
 from rest_framework.serializers import ValidationError
 
 from api.constants import (INGRIDIENTS_FIELD, INGRIDIENTS_UNIQUE, TAG_FIELD,
                            TAG_UNIQUE, RECIPE_EXISTS, ERROR_SUBSCRIBE_HIMSELF,
-                           SUBSCRIBE_EXISTS)
-from api.utils import Base64ImageField
+                           SUBSCRIBE_EXISTS, INGREDIENTS_NOT_FOUND,
+                           TAGS_NOT_FOUND, BULK_RECIPES_LIMIT)
+from api.cache import get_recipe_fragments
+from api.reference import reference_data
+from api.user_state import get_user_state
+from api.utils import Base64ImageField, ImageVariantsField
 from recipes.models import (Ingredient, Recipe, RecipeIngredient, Tag,
-                            UserFavorites, UserShoppingCart)
+                            UserFavorites, UserShoppingCart, UserShoppingList)
 from users.models import Subscribe
 
 User = get_user_model()
 
 
+class UserProfileListSerializer(serializers.ListSerializer):
+    """Сериализатор списка пользователей с общей загрузкой подписок."""
+
+    def to_representation(self, data):
+        users = list(
+            data.all() if isinstance(data, models.Manager) else data
+        )
+        state = get_user_state(self.context)
+        if state:
+            state.load_authors(user.pk for user in users)
+        return super().to_representation(users)
+
+
 class UserProfileSerializer(UserSerializer):
     """Сериализатор для просмотра страницы пользователя."""
     is_subscribed = serializers.SerializerMethodField()
@@ -23,32 +40,29 @@ class UserProfileSerializer(UserSerializer):
         model = User
         fields = ('id', 'email', 'username', 'first_name',
                   'last_name', 'is_subscribed')
+        list_serializer_class = UserProfileListSerializer
 
     def get_is_subscribed(self, obj):
-        request = self.context.get('request')
-        return (
-            request
-            and request.user.is_authenticated
-            and Subscribe.objects.filter(
-                user=request.user,
-                author=obj
-            ).exists()
-        )
+        if hasattr(obj, 'is_subscribed'):
+            return obj.is_subscribed
+        state = get_user_state(self.context)
+        return bool(state) and state.is_subscribed(obj.pk)
 
 
 class RecipeSubscribesSerializer(serializers.ModelSerializer):
     """Серилизатор для просмотра рецепта в подписках """
     image = Base64ImageField()
+    image_variants = ImageVariantsField()
 
     class Meta:
         model = Recipe
-        fields = ('id', 'name', 'image', 'cooking_time')
+        fields = ('id', 'name', 'image', 'image_variants', 'cooking_time')
 
 
 class SubscribesListSerializer(UserProfileSerializer):
     """Серилизатор для просмотра подписок """
     recipes = serializers.SerializerMethodField(read_only=True)
-    recipes_count = serializers.SerializerMethodField(read_only=True)
+    recipes_count = serializers.ReadOnlyField()
 
     class Meta:
         model = User
@@ -56,30 +70,54 @@ class SubscribesListSerializer(UserProfileSerializer):
                   'is_subscribed', 'recipes', 'recipes_count')
 
     def get_recipes(self, obj):
-        request = self.context.get('request')
-        limit = request.query_params.get('recipes_limit')
-        recipes = Recipe.objects.filter(author=obj).all()
-        if limit:
-            recipes = recipes[: int(limit)]
+        if hasattr(obj, 'limited_recipes'):
+            recipes = obj.limited_recipes
+        else:
+            request = self.context.get('request')
+            limit = request.query_params.get('recipes_limit')
+            recipes = Recipe.objects.filter(author=obj).all()
+            if limit:
+                recipes = recipes[: int(limit)]
         return RecipeSubscribesSerializer(recipes, many=True).data
 
-    def get_recipes_count(self, obj):
-        return Recipe.objects.filter(author=obj).count()
 
+class UniqueCreateMixin:
+    """
+    Создает объект одним INSERT без предварительной проверки.
+    Повтор отлавливается по ограничению уникальности в базе данных:
+    если после ошибки целостности объект с теми же unique_fields
+    уже есть, возвращается ошибка валидации unique_error. Прочие
+    нарушения целостности пробрасываются дальше.
+    """
+    unique_error = None
+    unique_fields = ('user', 'recipe')
+
+    def create(self, validated_data):
+        try:
+            with transaction.atomic():
+                return super().create(validated_data)
+        except IntegrityError:
+            if not self.Meta.model.objects.filter(**{
+                field: validated_data[field] for field in self.unique_fields
+            }).exists():
+                raise
+            raise serializers.ValidationError(self.unique_error)
+
+
+class AddRemoveSubcribeSerializer(UniqueCreateMixin,
+                                  serializers.ModelSerializer):
+    unique_error = SUBSCRIBE_EXISTS
+    unique_fields = ('user', 'author')
 
-class AddRemoveSubcribeSerializer(serializers.ModelSerializer):
     class Meta:
         model = Subscribe
         fields = ('user', 'author')
+        read_only_fields = fields
 
-    def validate(self, data):
-        user = data.get('user')
-        author = data.get('author')
-        if user == author:
+    def create(self, validated_data):
+        if validated_data['user'] == validated_data['author']:
             raise serializers.ValidationError(ERROR_SUBSCRIBE_HIMSELF)
-        if Subscribe.objects.filter(author=author, user=user).exists():
-            raise serializers.ValidationError(SUBSCRIBE_EXISTS)
-        return data
+        return super().create(validated_data)
 
 
 class IngredientsSerializer(serializers.ModelSerializer):
@@ -110,10 +148,11 @@ class RecipeIngredientSerializer(serializers.ModelSerializer):
 
 
 class RecipeIngredientAmountSerializer(serializers.ModelSerializer):
-    """Сериализатор связывающей ингредиенты и их колличество ."""
-    id = serializers.PrimaryKeyRelatedField(
-        queryset=Ingredient.objects.all()
-    )
+    """
+    Сериализатор связывающей ингредиенты и их колличество .
+    Ингредиенты проверяются одним запросом в CreateRecipeSerializer.
+    """
+    id = serializers.IntegerField()
 
     class Meta:
         model = RecipeIngredient
@@ -123,10 +162,7 @@ class RecipeIngredientAmountSerializer(serializers.ModelSerializer):
 class CreateRecipeSerializer(serializers.ModelSerializer):
     """Сериализатор для создания рецепта."""
     ingredients = RecipeIngredientAmountSerializer(many=True)
-    tags = serializers.PrimaryKeyRelatedField(
-        queryset=Tag.objects.all(),
-        many=True
-    )
+    tags = serializers.ListField(child=serializers.IntegerField())
     image = Base64ImageField()
 
     class Meta:
@@ -147,7 +183,16 @@ class CreateRecipeSerializer(serializers.ModelSerializer):
         ingredient_id = [ingredient['id'] for ingredient in ingredients]
         if len(ingredient_id) != len(set(ingredient_id)):
             raise serializers.ValidationError(INGRIDIENTS_UNIQUE)
-        return ingredients
+        found = reference_data.get_ingredients()
+        missing = [pk for pk in ingredient_id if pk not in found]
+        if missing:
+            raise serializers.ValidationError(INGREDIENTS_NOT_FOUND.format(
+                ', '.join(map(str, missing))
+            ))
+        return [
+            {**ingredient, 'id': found[ingredient['id']]}
+            for ingredient in ingredients
+        ]
 
     def validate_tags(self, tags):
         """Проверка корректности заполенния поля тэг."""
@@ -155,7 +200,13 @@ class CreateRecipeSerializer(serializers.ModelSerializer):
             raise ValidationError(TAG_FIELD)
         if len(tags) > len(set(tags)):
             raise ValidationError(TAG_UNIQUE)
-        return tags
+        found = [reference_data.get_tag(pk) for pk in tags]
+        missing = [pk for pk, tag in zip(tags, found) if tag is None]
+        if missing:
+            raise ValidationError(TAGS_NOT_FOUND.format(
+                ', '.join(map(str, missing))
+            ))
+        return found
 
     def create_ingredients(self, ingredients, recipe):
         """Создает новый ингридиет."""
@@ -182,26 +233,116 @@ class CreateRecipeSerializer(serializers.ModelSerializer):
         self.create_ingredients(ingredients, recipe)
         return recipe
 
+    def save(self, **kwargs):
+        """
+        Сохраняет рецепт и закрывает загруженное фото. Хранилище
+        перемещает временный файл большого фото, и без закрытия
+        удалить его пытался бы сборщик мусора.
+        """
+        try:
+            return super().save(**kwargs)
+        finally:
+            image = self.validated_data.get('image')
+            if image is not None:
+                image.close()
+
+    def update_ingredients(self, ingredients, recipe):
+        """
+        Приводит ингредиенты рецепта к переданным: меняет количество
+        изменившихся, удаляет лишние и создает только новые.
+        Рецепт и строки списков покупок блокируются до чтения
+        ингредиентов, чтобы параллельные изменения корзин дождались
+        конца транзакции и не сбили итоги.
+        """
+        UserShoppingList.objects.lock([recipe.pk])
+        amounts = {
+            ingredient['id'].pk: ingredient['amount']
+            for ingredient in ingredients
+        }
+        current = {
+            recipe_ingredient.ingredient_id: recipe_ingredient
+            for recipe_ingredient in recipe.recipeingredient.all()
+        }
+        changed = [
+            recipe_ingredient
+            for ingredient_id, recipe_ingredient in current.items()
+            if ingredient_id in amounts
+            and recipe_ingredient.amount != amounts[ingredient_id]
+        ]
+        removed = [
+            ingredient_id for ingredient_id in current
+            if ingredient_id not in amounts
+        ]
+        added = [
+            ingredient for ingredient in ingredients
+            if ingredient['id'].pk not in current
+        ]
+        touched = [
+            *removed,
+            *(item.ingredient_id for item in changed),
+            *(ingredient['id'].pk for ingredient in added),
+        ]
+        if not touched:
+            return
+        UserShoppingList.objects.remove_recipe_from_carts(recipe, touched)
+        for recipe_ingredient in changed:
+            recipe_ingredient.amount = amounts[recipe_ingredient.ingredient_id]
+        RecipeIngredient.objects.bulk_update(changed, ['amount'])
+        if removed:
+            recipe.recipeingredient.filter(
+                ingredient_id__in=removed
+            ).delete()
+        self.create_ingredients(added, recipe)
+        UserShoppingList.objects.add_recipe_to_carts(recipe, touched)
+
     @transaction.atomic
     def update(self, instance, validated_data):
-        """Обновляет существующий рецепт."""
-        if 'ingredients' not in validated_data or 'tags' not in validated_data:
-            raise serializers.ValidationError('Поле не может быть пустым.')
-        ingredient = validated_data.pop('ingredients')
-        instance.ingredients.clear()
-        self.create_ingredients(ingredient, instance)
-        tags = validated_data.pop('tags')
-        instance.tags.set(tags)
+        """
+        Обновляет существующий рецепт.
+        При частичном обновлении отсутствующие поля не меняются.
+        """
+        if 'ingredients' in validated_data:
+            self.update_ingredients(
+                validated_data.pop('ingredients'), instance
+            )
+        if 'tags' in validated_data:
+            instance.tags.set(validated_data.pop('tags'))
         return super().update(instance, validated_data)
 
     def to_representation(self, instance):
-        """Возвращает сериализованный экземпляр рецепта."""
+        """
+        Возвращает сериализованный экземпляр рецепта.
+        Рецепт перечитывается со связанными объектами, чтобы число
+        запросов не зависело от количества ингредиентов.
+        """
+        instance = Recipe.objects.with_related().get(pk=instance.pk)
         return ReadRecipeSerializer(
             instance,
             context=self.context
         ).data
 
 
+class ReadRecipeListSerializer(serializers.ListSerializer):
+    """Сериализатор списка рецептов с кэшированием фрагментов."""
+
+    def to_representation(self, data):
+        recipes = list(
+            data.all() if isinstance(data, models.Manager) else data
+        )
+        fragments = get_recipe_fragments(
+            recipes, self.child.render_fragment,
+            self.context.get('versions_read_at')
+        )
+        state = get_user_state(self.context)
+        if state:
+            state.load_recipes(recipe.pk for recipe in recipes)
+            state.load_authors(recipe.author_id for recipe in recipes)
+        return [
+            self.child.add_user_data(fragments[recipe.pk], recipe)
+            for recipe in recipes
+        ]
+
+
 class ReadRecipeSerializer(serializers.ModelSerializer):
     """Сериализатор для получения рецепта."""
     tags = TagSerializer(many=True, read_only=True)
@@ -209,6 +350,7 @@ class ReadRecipeSerializer(serializers.ModelSerializer):
     ingredients = RecipeIngredientSerializer(many=True,
                                              source='recipeingredient')
     image = Base64ImageField()
+    image_variants = ImageVariantsField()
     is_favorited = serializers.SerializerMethodField(read_only=True)
     is_in_shopping_cart = serializers.SerializerMethodField(read_only=True)
 
@@ -223,48 +365,81 @@ class ReadRecipeSerializer(serializers.ModelSerializer):
             'is_in_shopping_cart',
             'name',
             'image',
+            'image_variants',
             'text',
             'cooking_time',
         )
+        list_serializer_class = ReadRecipeListSerializer
+
+    def to_representation(self, instance):
+        if self.context.get('fragment'):
+            return super().to_representation(instance)
+        fragment = get_recipe_fragments(
+            [instance], self.render_fragment,
+            self.context.get('versions_read_at')
+        )[instance.pk]
+        return self.add_user_data(fragment, instance)
+
+    def render_fragment(self, instance):
+        """Возвращает представление рецепта, общее для всех пользователей."""
+        fragment = dict(
+            ReadRecipeSerializer(instance, context={'fragment': True}).data
+        )
+        fragment['author'] = {**fragment['author'], 'is_subscribed': None}
+        fragment['is_favorited'] = fragment['is_in_shopping_cart'] = None
+        return fragment
+
+    def add_user_data(self, fragment, instance):
+        """Дополняет фрагмент рецепта данными текущего пользователя."""
+        data = dict(fragment)
+        data['author'] = {
+            **fragment['author'],
+            'is_subscribed': self.fields['author'].get_is_subscribed(
+                instance.author
+            ),
+        }
+        data['is_favorited'] = self.get_is_favorited(instance)
+        data['is_in_shopping_cart'] = self.get_is_in_shopping_cart(instance)
+        request = self.context.get('request')
+        if request and data['image']:
+            data['image'] = request.build_absolute_uri(data['image'])
+            data['image_variants'] = {
+                variant: request.build_absolute_uri(url)
+                for variant, url in data['image_variants'].items()
+            }
+        return data
 
     def get_ingredients(self, obj):
         ingredients = RecipeIngredient.objects.filter(recipe=obj)
         return RecipeIngredientSerializer(ingredients, many=True).data
 
     def get_is_favorited(self, obj):
-        request = self.context.get('request')
-        return (request
-                and request.user.is_authenticated
-                and UserFavorites.objects.filter(
-                    user=request.user,
-                    recipe=obj
-                ).exists()
-                )
+        state = get_user_state(self.context)
+        return bool(state) and state.is_favorited(obj.pk)
 
     def get_is_in_shopping_cart(self, obj):
-        request = self.context.get('request')
-        return (request
-                and request.user.is_authenticated
-                and UserShoppingCart.objects.filter(
-                    user=request.user,
-                    recipe=obj
-                ).exists()
-                )
+        state = get_user_state(self.context)
+        return bool(state) and state.is_in_shopping_cart(obj.pk)
 
 
-class UserShoppingCartSerializer(serializers.ModelSerializer):
+class UserShoppingCartSerializer(UniqueCreateMixin,
+                                 serializers.ModelSerializer):
     """Cериализатор для списка покупок."""
+    unique_error = RECIPE_EXISTS
+
     class Meta:
         model = UserShoppingCart
         fields = ('user', 'recipe')
+        read_only_fields = fields
 
-    def validate(self, data):
-        if UserShoppingCart.objects.filter(
-            user=data['user'],
-            recipe=data['recipe']
-        ).exists():
-            raise serializers.ValidationError(RECIPE_EXISTS)
-        return data
+    @transaction.atomic
+    def create(self, validated_data):
+        """Добавляет рецепт в корзину и его ингредиенты в список покупок."""
+        shopping_cart = super().create(validated_data)
+        UserShoppingList.objects.add_recipes(
+            shopping_cart.user, [shopping_cart.recipe_id]
+        )
+        return shopping_cart
 
     def to_representation(self, instance):
         request = self.context.get('request')
@@ -273,19 +448,27 @@ class UserShoppingCartSerializer(serializers.ModelSerializer):
             context={'request': request}).data
 
 
-class UserFavoritesSerializer(serializers.ModelSerializer):
+class BulkRecipesSerializer(serializers.Serializer):
+    """Сериализатор списка рецептов для массового добавления и удаления."""
+    recipes = serializers.ListField(
+        child=serializers.IntegerField(),
+        allow_empty=False,
+        max_length=BULK_RECIPES_LIMIT
+    )
+
+    def validate_recipes(self, recipes):
+        return list(dict.fromkeys(recipes))
+
+
+class UserFavoritesSerializer(UniqueCreateMixin,
+                              serializers.ModelSerializer):
     """Cериализатор для избранного."""
+    unique_error = RECIPE_EXISTS
+
     class Meta:
         model = UserFavorites
         fields = ('user', 'recipe')
-
-    def validate(self, data):
-        if UserFavorites.objects.filter(
-            user=data['user'],
-            recipe=data['recipe']
-        ).exists():
-            raise serializers.ValidationError(RECIPE_EXISTS)
-        return data
+        read_only_fields = fields
 
     def to_representation(self, instance):
         request = self.context.get('request')
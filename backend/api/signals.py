@@ -0,0 +1,90 @@
+from django.contrib.auth import get_user_model
+from django.db import transaction
+from django.db.models.signals import m2m_changed, post_delete, post_save
+from django.dispatch import receiver
+
+from api.cache import (INGREDIENTS_VERSION, TAGS_VERSION, bump_versions,
+                       invalidate_all_recipes, invalidate_recipes,
+                       invalidate_user, invalidate_user_state)
+from recipes.models import (Ingredient, Recipe, RecipeIngredient, Tag,
+                            UserFavorites, UserShoppingCart)
+from users.models import Subscribe
+
+User = get_user_model()
+
+USER_PROFILE_FIELDS = {'email', 'username', 'first_name', 'last_name'}
+
+
+@receiver(post_save, sender=Recipe)
+@receiver(post_delete, sender=Recipe)
+def recipe_changed(sender, instance, **kwargs):
+    """Сбрасывает кэш рецепта после его изменения или удаления."""
+    recipe_ids = [instance.pk]
+    transaction.on_commit(lambda: invalidate_recipes(recipe_ids))
+
+
+@receiver(post_save, sender=RecipeIngredient)
+@receiver(post_delete, sender=RecipeIngredient)
+def recipe_ingredient_changed(sender, instance, **kwargs):
+    """Сбрасывает кэш рецепта после изменения его ингредиентов."""
+    recipe_ids = [instance.recipe_id]
+    transaction.on_commit(lambda: invalidate_recipes(recipe_ids))
+
+
+@receiver(m2m_changed, sender=Recipe.tags.through)
+def recipe_tags_changed(sender, instance, action, reverse, pk_set, **kwargs):
+    """Сбрасывает кэш рецептов после изменения их тегов."""
+    if not action.startswith('post_'):
+        return
+    if not reverse:
+        recipe_ids = [instance.pk]
+        transaction.on_commit(lambda: invalidate_recipes(recipe_ids))
+    elif pk_set:
+        recipe_ids = set(pk_set)
+        transaction.on_commit(lambda: invalidate_recipes(recipe_ids))
+    else:
+        transaction.on_commit(invalidate_all_recipes)
+
+
+@receiver(post_save, sender=Tag)
+@receiver(post_delete, sender=Tag)
+@receiver(post_save, sender=Ingredient)
+@receiver(post_delete, sender=Ingredient)
+def reference_data_changed(sender, **kwargs):
+    """Сбрасывает кэш всех рецептов после изменения тегов и ингредиентов."""
+    transaction.on_commit(invalidate_all_recipes)
+
+
+@receiver(post_save, sender=Ingredient)
+@receiver(post_delete, sender=Ingredient)
+def ingredient_changed(sender, **kwargs):
+    """Сбрасывает индекс ингредиентов после их изменения."""
+    transaction.on_commit(lambda: bump_versions([INGREDIENTS_VERSION]))
+
+
+@receiver(post_save, sender=Tag)
+@receiver(post_delete, sender=Tag)
+def tag_changed(sender, **kwargs):
+    """Сбрасывает версию списка тегов после их изменения."""
+    transaction.on_commit(lambda: bump_versions([TAGS_VERSION]))
+
+
+@receiver(post_save, sender=UserFavorites)
+@receiver(post_delete, sender=UserFavorites)
+@receiver(post_save, sender=UserShoppingCart)
+@receiver(post_delete, sender=UserShoppingCart)
+@receiver(post_save, sender=Subscribe)
+@receiver(post_delete, sender=Subscribe)
+def user_state_changed(sender, instance, **kwargs):
+    """Сбрасывает версию избранного, корзины и подписок пользователя."""
+    user_id = instance.user_id
+    transaction.on_commit(lambda: invalidate_user_state(user_id))
+
+
+@receiver(post_save, sender=User)
+def user_changed(sender, instance, update_fields, **kwargs):
+    """Сбрасывает кэш рецептов автора после изменения его профиля."""
+    if update_fields and not USER_PROFILE_FIELDS & set(update_fields):
+        return
+    user_id = instance.pk
+    transaction.on_commit(lambda: invalidate_user(user_id))
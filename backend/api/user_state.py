@@ -0,0 +1,67 @@
+from recipes.models import UserFavorites, UserShoppingCart
+from users.models import Subscribe
+
+
+class UserState:
+    """
+    Избранное, корзина и подписки текущего пользователя в рамках запроса.
+    Данные загружаются по одному запросу на вид связи и только для
+    переданных объектов, повторные проверки берутся из множеств.
+    """
+
+    def __init__(self, user):
+        self.user = user
+        self.favorited = set()
+        self.in_shopping_cart = set()
+        self.followed = set()
+        self.loaded_recipes = set()
+        self.loaded_authors = set()
+
+    def load_recipes(self, recipe_ids):
+        """Загружает признаки избранного и корзины для рецептов."""
+        recipe_ids = set(recipe_ids) - self.loaded_recipes
+        if not recipe_ids or not self.user.is_authenticated:
+            return
+        self.favorited.update(UserFavorites.objects.filter(
+            user=self.user, recipe_id__in=recipe_ids
+        ).order_by().values_list('recipe_id', flat=True))
+        self.in_shopping_cart.update(UserShoppingCart.objects.filter(
+            user=self.user, recipe_id__in=recipe_ids
+        ).order_by().values_list('recipe_id', flat=True))
+        self.loaded_recipes |= recipe_ids
+
+    def load_authors(self, author_ids):
+        """Загружает признаки подписки на авторов."""
+        author_ids = set(author_ids) - self.loaded_authors
+        if not author_ids or not self.user.is_authenticated:
+            return
+        self.followed.update(Subscribe.objects.filter(
+            user=self.user, author_id__in=author_ids
+        ).order_by().values_list('author_id', flat=True))
+        self.loaded_authors |= author_ids
+
+    def is_favorited(self, recipe_id):
+        self.load_recipes([recipe_id])
+        return recipe_id in self.favorited
+
+    def is_in_shopping_cart(self, recipe_id):
+        self.load_recipes([recipe_id])
+        return recipe_id in self.in_shopping_cart
+
+    def is_subscribed(self, author_id):
+        self.load_authors([author_id])
+        return author_id in self.followed
+
+
+def get_user_state(context):
+    """
+    Возвращает состояние пользователя, общее для всех сериализаторов
+    запроса из context. Без запроса возвращает None.
+    """
+    request = context.get('request')
+    if request is None:
+        return None
+    state = getattr(request, 'user_state', None)
+    if state is None:
+        state = request.user_state = UserState(request.user)
+    return state
@@ -1,14 +1,180 @@
 import base64
+import binascii
+import csv
+import json
+from io import BytesIO
 
-from django.core.files.base import ContentFile
+from django.conf import settings
+from django.core.files.storage import default_storage
+from django.core.files.uploadedfile import (InMemoryUploadedFile,
+                                            TemporaryUploadedFile)
+from django.http import Http404
+from PIL import Image
 from rest_framework import serializers
 
+from api.constants import (BASE64_CHUNK_SIZE, BASE64_SEPARATOR,
+                           IMAGE_HEADER_MAX_SIZE, IMAGE_TOO_LARGE)
+
 
 class Base64ImageField(serializers.ImageField):
-    """Сериализатор для кодирования и декодирования изображения."""
+    """
+    Сериализатор для кодирования и декодирования изображения.
+    Строка base64 декодируется по частям, как загрузка файла: небольшое
+    изображение в память, большое во временный файл на диске, который
+    Pillow и хранилище читают по пути без копирования. Размер
+    проверяется до декодирования, а заголовок и размеры изображения -
+    по первым декодированным байтам. Переносы строк и пробелы
+    в base64 допускаются.
+    """
     def to_internal_value(self, data):
         if isinstance(data, str) and data.startswith('data:image'):
-            format, imgstr = data.split(';base64,')
-            ext = format.split('/')[-1]
-            data = ContentFile(base64.b64decode(imgstr), name='temp.' + ext)
+            data = self.decode(data)
         return super().to_internal_value(data)
+
+    def decode(self, data):
+        start = data.find(BASE64_SEPARATOR)
+        if start == -1:
+            self.fail('invalid_image')
+        ext = data[:start].split('/')[-1]
+        start += len(BASE64_SEPARATOR)
+        encoded_size = len(data) - start
+        size = encoded_size * 3 // 4 - data.count('=', len(data) - 2)
+        if (
+            encoded_size > settings.IMAGE_MAX_ENCODED_SIZE
+            or size > settings.IMAGE_MAX_DECODED_SIZE
+        ):
+            raise serializers.ValidationError(IMAGE_TOO_LARGE)
+        name, content_type = 'temp.' + ext, 'image/' + ext
+        if size > settings.FILE_UPLOAD_MAX_MEMORY_SIZE:
+            file = TemporaryUploadedFile(name, content_type, 0, None)
+        else:
+            file = InMemoryUploadedFile(
+                BytesIO(), None, name, content_type, 0, None
+            )
+        header = b''
+        # Декодируются только группы по 4 символа, остаток без пробелов
+        # переносится в следующую часть.
+        rest = ''
+        try:
+            for position in range(start, len(data), BASE64_CHUNK_SIZE):
+                encoded = rest + ''.join(
+                    data[position:position + BASE64_CHUNK_SIZE].split()
+                )
+                end = len(encoded) - len(encoded) % 4
+                rest = encoded[end:]
+                chunk = base64.b64decode(encoded[:end], validate=True)
+                if header is not None:
+                    header += chunk
+                    if self.check_header(header):
+                        header = None
+                file.write(chunk)
+            if rest:
+                self.fail('invalid_image')
+        except binascii.Error:
+            self.fail('invalid_image')
+        if header is not None:
+            self.fail('invalid_image')
+        file.size = file.tell()
+        file.seek(0)
+        return file
+
+    def check_header(self, header):
+        """
+        Проверяет заголовок изображения по началу файла.
+        Возвращает False, если для проверки нужно больше данных.
+        """
+        try:
+            width, height = Image.open(BytesIO(header)).size
+        except Image.DecompressionBombError:
+            raise serializers.ValidationError(IMAGE_TOO_LARGE)
+        except Exception:
+            if len(header) < IMAGE_HEADER_MAX_SIZE:
+                return False
+            self.fail('invalid_image')
+        if width * height > settings.IMAGE_MAX_PIXELS:
+            raise serializers.ValidationError(IMAGE_TOO_LARGE)
+        return True
+
+
+class ImageVariantsField(serializers.Field):
+    """
+    Ссылки на уменьшенные копии фото рецепта.
+    Пока копии не готовы, вместо них отдается исходное фото.
+    """
+    def __init__(self, **kwargs):
+        kwargs['source'] = '*'
+        kwargs['read_only'] = True
+        super().__init__(**kwargs)
+
+    def to_representation(self, recipe):
+        if not recipe.image:
+            return None
+        variants = recipe.image_variants
+        if variants.get('source') != recipe.image.name:
+            variants = {}
+        request = self.context.get('request')
+        urls = {}
+        for variant in settings.IMAGE_VARIANTS:
+            url = (
+                default_storage.url(variants[variant])
+                if variant in variants else recipe.image.url
+            )
+            urls[variant] = request.build_absolute_uri(url) if request else url
+        return urls
+
+
+def parse_pk(value):
+    """Возвращает id из адреса запроса, для нечислового значения - 404."""
+    try:
+        return int(value)
+    except (TypeError, ValueError):
+        raise Http404
+
+
+class Echo:
+    """Буфер, который сразу возвращает записанное значение."""
+    def write(self, value):
+        return value
+
+
+def shopping_cart_txt(ingredients):
+    """Построчно формирует список покупок в текстовом формате."""
+    for ingredient in ingredients:
+        yield (
+            f'{ingredient["ingredient__name"]}'
+            f'({ingredient["ingredient__measurement_unit"]})'
+            f'- {ingredient["amount"]}\n'
+        )
+
+
+def shopping_cart_csv(ingredients):
+    """Построчно формирует список покупок в формате csv."""
+    writer = csv.writer(Echo())
+    yield writer.writerow(('name', 'measurement_unit', 'amount'))
+    for ingredient in ingredients:
+        yield writer.writerow((
+            ingredient['ingredient__name'],
+            ingredient['ingredient__measurement_unit'],
+            ingredient['amount'],
+        ))
+
+
+def shopping_cart_json(ingredients):
+    """Построчно формирует список покупок в формате json."""
+    separator = ''
+    yield '['
+    for ingredient in ingredients:
+        yield separator + json.dumps({
+            'name': ingredient['ingredient__name'],
+            'measurement_unit': ingredient['ingredient__measurement_unit'],
+            'amount': ingredient['amount'],
+        }, ensure_ascii=False)
+        separator = ','
+    yield ']'
+
+
+SHOPPING_CART_FORMATS = {
+    'txt': ('text/plain', shopping_cart_txt),
+    'csv': ('text/csv', shopping_cart_csv),
+    'json': ('application/json', shopping_cart_json),
+}
@@ -1,5 +1,8 @@
-from django.db.models import Sum
-from django.http import HttpResponse
+from django.db import transaction
+from django.db.models import Prefetch, Value, prefetch_related_objects
+from django.http import (Http404, HttpResponse, HttpResponseForbidden,
+                         StreamingHttpResponse)
+from django.conf import settings
 from django.contrib.auth import get_user_model
 from django.shortcuts import get_object_or_404
 from django_filters.rest_framework import DjangoFilterBackend
@@ -9,17 +12,30 @@ from rest_framework.decorators import action
 from rest_framework.permissions import AllowAny, IsAuthenticated
 from rest_framework.response import Response
 
-from api.constants import SUBSCRIBE_NO_EXISTS
+from api.cache import (INGREDIENTS_VERSION, RECIPE_FRAGMENTS_VERSION,
+                       RECIPE_VERSION, RECIPES_VERSION, TAGS_VERSION,
+                       USER_STATE_VERSION, USERS_VERSION,
+                       invalidate_user_state, new_version)
+from api.conditional import conditional
+from api.constants import (BULK_ADDED, BULK_EXISTS, BULK_NOT_FOUND,
+                           BULK_REMOVED, SHOPPING_CART_FORMAT_ERROR,
+                           SHOPPING_CART_FORMAT_PARAM, SUBSCRIBE_NO_EXISTS)
 from api.filters import IngredientFilter, RecipeFilter
-from api.pagination import LimitPageNumberPagination
+from api.idempotency import idempotent
+from api.ingredient_index import ingredient_index
+from api.metrics import export, metrics_allowed
+from api.pagination import LimitPageNumberPagination, RecipePagination
 from api.permissions import IsAuthorOrReadOnly
-from api.serializers import (CreateRecipeSerializer, IngredientsSerializer,
+from api.reference import reference_data
+from api.serializers import (BulkRecipesSerializer, CreateRecipeSerializer,
+                             IngredientsSerializer,
                              ReadRecipeSerializer, SubscribesListSerializer,
                              TagSerializer, UserFavoritesSerializer,
                              UserProfileSerializer, UserShoppingCartSerializer,
                              AddRemoveSubcribeSerializer)
-from recipes.models import (Ingredient, Recipe, RecipeIngredient, Tag,
-                            UserFavorites, UserShoppingCart)
+from api.utils import SHOPPING_CART_FORMATS, parse_pk
+from recipes.models import (Ingredient, Recipe, Tag, UserFavorites,
+                            UserShoppingCart, UserShoppingList)
 from users.models import Subscribe
 
 User = get_user_model()
@@ -38,6 +54,21 @@ class UserSubscribeViewSet(UserViewSet):
             return (IsAuthenticated(),)
         return super().get_permissions()
 
+    def get_subscriptions(self, authors):
+        """Аннотирует авторов из подписок признаком подписки."""
+        return authors.annotate(is_subscribed=Value(True))
+
+    def prefetch_recipes(self, authors):
+        """Подгружает рецепты авторов с учетом параметра recipes_limit."""
+        limit = self.request.query_params.get('recipes_limit')
+        recipes = Recipe.objects.filter(author__in=authors)
+        if limit and limit.isdigit():
+            recipes = recipes.limit_per_author(int(limit))
+        prefetch_related_objects(
+            authors,
+            Prefetch('recipe_set', queryset=recipes, to_attr='limited_recipes')
+        )
+
     @action(
         detail=False,
         methods=['GET'],
@@ -45,8 +76,11 @@ class UserSubscribeViewSet(UserViewSet):
     )
     def subscriptions(self, request):
         user = request.user
-        subscriptions = User.objects.filter(publisher__user=user)
+        subscriptions = self.get_subscriptions(
+            User.objects.filter(publisher__user=user)
+        )
         paginate_page = self.paginate_queryset(subscriptions)
+        self.prefetch_recipes(paginate_page)
         serializer = SubscribesListSerializer(
             paginate_page,
             many=True,
@@ -59,20 +93,21 @@ class UserSubscribeViewSet(UserViewSet):
         detail=True,
         permission_classes=(IsAuthenticated,)
     )
+    @idempotent
     def subscribe(self, request, id):
         user = self.request.user
         author = get_object_or_404(User, id=id)
         subscribe = Subscribe.objects.filter(user=user, author=author)
         if request.method == 'POST':
-            data = {
-                'user': user.id,
-                'author': id
-            }
             serializer = AddRemoveSubcribeSerializer(
-                data=data, context={'request': request}
+                data={}, context={'request': request}
             )
             serializer.is_valid(raise_exception=True)
-            serializer.save()
+            serializer.save(user=user, author=author)
+            author = self.get_subscriptions(
+                User.objects.filter(id=author.id)
+            ).get()
+            self.prefetch_recipes([author])
             response = SubscribesListSerializer(
                 author, context={'request': request}
             )
@@ -92,12 +127,56 @@ class IngredientViewSet(viewsets.ReadOnlyModelViewSet):
     serializer_class = IngredientsSerializer
     filter_backends = (IngredientFilter,)
     search_fields = ('^name',)
+    cache_control = {
+        'public': True, 'max_age': settings.REFERENCE_DATA_MAX_AGE
+    }
+
+    def get_etag_keys(self):
+        return [INGREDIENTS_VERSION]
+
+    @conditional
+    def retrieve(self, request, *args, **kwargs):
+        """Отдает ингредиент из справочника в памяти."""
+        ingredient = reference_data.get_ingredient(
+            parse_pk(kwargs[self.lookup_field])
+        )
+        if ingredient is None:
+            raise Http404
+        return Response(self.get_serializer(ingredient).data)
+
+    @conditional
+    def list(self, request, *args, **kwargs):
+        """Отдает ингредиенты из префиксного индекса в памяти."""
+        name = request.query_params.get(IngredientFilter.search_param)
+        limit = settings.INGREDIENT_SEARCH_LIMIT if name else None
+        return Response(ingredient_index.search(name, limit))
 
 
 class TagViewSet(viewsets.ReadOnlyModelViewSet):
     """Вьюсет для просмотра тегов."""
     queryset = Tag.objects.all()
     serializer_class = TagSerializer
+    cache_control = {
+        'public': True, 'max_age': settings.REFERENCE_DATA_MAX_AGE
+    }
+
+    def get_etag_keys(self):
+        return [TAGS_VERSION]
+
+    @conditional
+    def list(self, request, *args, **kwargs):
+        """Отдает теги из справочника в памяти."""
+        return Response(
+            self.get_serializer(reference_data.get_tags(), many=True).data
+        )
+
+    @conditional
+    def retrieve(self, request, *args, **kwargs):
+        """Отдает тег из справочника в памяти."""
+        tag = reference_data.get_tag(parse_pk(kwargs[self.lookup_field]))
+        if tag is None:
+            raise Http404
+        return Response(self.get_serializer(tag).data)
 
 
 class RecipeViewSet(viewsets.ModelViewSet):
@@ -110,7 +189,47 @@ class RecipeViewSet(viewsets.ModelViewSet):
     permission_classes = (IsAuthorOrReadOnly,)
     filter_backends = (DjangoFilterBackend,)
     filterset_class = RecipeFilter
-    pagination_class = LimitPageNumberPagination
+    pagination_class = RecipePagination
+    cache_control = {'private': True, 'no_cache': True}
+
+    def initial(self, request, *args, **kwargs):
+        # Метка берется до чтения рецептов: фрагменты рецептов,
+        # измененных позже, не попадут в кэш.
+        self.versions_read_at = new_version()
+        super().initial(request, *args, **kwargs)
+
+    def get_queryset(self):
+        if self.action in ['list', 'retrieve']:
+            return Recipe.objects.with_related()
+        return super().get_queryset()
+
+    def get_serializer_context(self):
+        return {
+            **super().get_serializer_context(),
+            'versions_read_at': self.versions_read_at,
+        }
+
+    def get_etag_keys(self):
+        """
+        Версии, от которых зависит ответ: рецепты, авторы
+        и избранное, корзина и подписки текущего пользователя.
+        """
+        keys = [RECIPE_FRAGMENTS_VERSION, USERS_VERSION]
+        if self.action == 'retrieve':
+            keys.append(RECIPE_VERSION.format(self.kwargs['pk']))
+        else:
+            keys.append(RECIPES_VERSION)
+        if self.request.user.is_authenticated:
+            keys.append(USER_STATE_VERSION.format(self.request.user.pk))
+        return keys
+
+    @conditional
+    def list(self, request, *args, **kwargs):
+        return super().list(request, *args, **kwargs)
+
+    @conditional
+    def retrieve(self, request, *args, **kwargs):
+        return super().retrieve(request, *args, **kwargs)
 
     def get_serializer_class(self):
         if self.action in ['create', 'update', 'partial_update']:
@@ -120,13 +239,9 @@ class RecipeViewSet(viewsets.ModelViewSet):
     def add_recipe(self, request, pk, serializer):
         context = {'request': request}
         recipe = get_object_or_404(Recipe, id=pk)
-        data = {
-            'user': request.user.id,
-            'recipe': recipe.id
-        }
-        serializer = serializer(data=data, context=context)
+        serializer = serializer(data={}, context=context)
         serializer.is_valid(raise_exception=True)
-        serializer.save()
+        serializer.save(user=request.user, recipe=recipe)
         return Response(serializer.data, status=status.HTTP_201_CREATED)
 
     def remove_recipe(self, request, pk, model):
@@ -143,6 +258,7 @@ class RecipeViewSet(viewsets.ModelViewSet):
         methods=['POST', 'DELETE'],
         permission_classes=(IsAuthenticated,)
     )
+    @idempotent
     def favorite(self, request, pk):
         if request.method == 'POST':
             return self.add_recipe(request, pk,
@@ -154,11 +270,94 @@ class RecipeViewSet(viewsets.ModelViewSet):
         methods=['POST', 'DELETE'],
         permission_classes=(IsAuthenticated,)
     )
+    @idempotent
     def shopping_cart(self, request, pk):
         if request.method == 'POST':
             return self.add_recipe(request, pk,
                                    UserShoppingCartSerializer)
-        return self.remove_recipe(request, pk, UserShoppingCart)
+        with transaction.atomic():
+            response = self.remove_recipe(request, pk, UserShoppingCart)
+            if response.status_code == status.HTTP_204_NO_CONTENT:
+                UserShoppingList.objects.remove_recipes(request.user, [pk])
+        return response
+
+    def add_recipes(self, request, model):
+        """Добавляет список рецептов и возвращает результат по каждому."""
+        serializer = BulkRecipesSerializer(data=request.data)
+        serializer.is_valid(raise_exception=True)
+        recipe_ids = serializer.validated_data['recipes']
+        added = model.objects.add_recipes(request.user, recipe_ids)
+        existing = set(Recipe.objects.filter(
+            pk__in=[pk for pk in recipe_ids if pk not in added]
+        ).values_list('pk', flat=True))
+        results = [
+            {
+                'id': pk,
+                'status': (
+                    BULK_ADDED if pk in added
+                    else BULK_EXISTS if pk in existing
+                    else BULK_NOT_FOUND
+                ),
+            }
+            for pk in recipe_ids
+        ]
+        return added, Response({'recipes': results})
+
+    def remove_recipes(self, request, model):
+        """
+        Удаляет список рецептов и возвращает результат по каждому.
+        Без списка удаляются все рецепты пользователя.
+        """
+        recipe_ids = None
+        if 'recipes' in request.data:
+            serializer = BulkRecipesSerializer(data=request.data)
+            serializer.is_valid(raise_exception=True)
+            recipe_ids = serializer.validated_data['recipes']
+        removed = model.objects.remove_recipes(request.user, recipe_ids)
+        results = [
+            {
+                'id': pk,
+                'status': BULK_REMOVED if pk in removed else BULK_NOT_FOUND,
+            }
+            for pk in (sorted(removed) if recipe_ids is None else recipe_ids)
+        ]
+        return removed, Response({'recipes': results})
+
+    @action(
+        detail=False,
+        methods=['POST', 'DELETE'],
+        url_path='favorite',
+        url_name='favorite-bulk',
+        permission_classes=(IsAuthenticated,)
+    )
+    @idempotent
+    @transaction.atomic
+    def favorite_bulk(self, request):
+        user_id = request.user.pk
+        transaction.on_commit(lambda: invalidate_user_state(user_id))
+        if request.method == 'POST':
+            return self.add_recipes(request, UserFavorites)[1]
+        return self.remove_recipes(request, UserFavorites)[1]
+
+    @action(
+        detail=False,
+        methods=['POST', 'DELETE'],
+        url_path='shopping_cart',
+        url_name='shopping-cart-bulk',
+        permission_classes=(IsAuthenticated,)
+    )
+    @idempotent
+    @transaction.atomic
+    def shopping_cart_bulk(self, request):
+        user_id = request.user.pk
+        transaction.on_commit(lambda: invalidate_user_state(user_id))
+        if request.method == 'POST':
+            added, response = self.add_recipes(request, UserShoppingCart)
+            UserShoppingList.objects.add_recipes(request.user, added)
+            return response
+        removed, response = self.remove_recipes(request, UserShoppingCart)
+        UserShoppingList.objects.remove_recipes(request.user, removed)
+        return response
 
     @action(
         detail=False,
@@ -166,22 +365,33 @@ class RecipeViewSet(viewsets.ModelViewSet):
         permission_classes=(IsAuthenticated,)
     )
     def download_shopping_cart(self, request):
+        file_format = request.query_params.get(
+            SHOPPING_CART_FORMAT_PARAM, 'txt'
+        )
+        if file_format not in SHOPPING_CART_FORMATS:
+            return Response(SHOPPING_CART_FORMAT_ERROR,
+                            status=status.HTTP_400_BAD_REQUEST)
+        content_type, render = SHOPPING_CART_FORMATS[file_format]
         ingredients = (
-            RecipeIngredient.objects.filter(
-                recipe__shoppingcart__user=request.user
-            )
+            UserShoppingList.objects.filter(user=request.user)
             .order_by('ingredient__name')
-            .values('ingredient__name', 'ingredient__measurement_unit')
-            .annotate(amount=Sum('amount'))
+            .values('ingredient__name', 'ingredient__measurement_unit',
+                    'amount')
+        )
+        filename = f'shopping_cart.{file_format}'
+        response = StreamingHttpResponse(
+            render(ingredients.iterator()), content_type=content_type
         )
-        shopping_cart = []
-        for ingredient in ingredients:
-            shopping_cart.append(
-                f'{ingredient["ingredient__name"]}'
-                f'({ingredient["ingredient__measurement_unit"]})'
-                f'- {ingredient["amount"]}\n'
-            )
-        filename = "shopping_cart.txt"
-        response = HttpResponse(shopping_cart, content_type='text/plain')
         response['Content-Disposition'] = f'attachment; filename={filename}'
         return response
+
+
+def metrics(request):
+    """
+    Метрики Prometheus всех воркеров. Доступны с адресов
+    METRICS_ALLOWED_IPS или по токену METRICS_TOKEN.
+    """
+    if not metrics_allowed(request):
+        return HttpResponseForbidden()
+    content, content_type = export()
+    return HttpResponse(content, content_type=content_type)
@@ -1,4 +1,5 @@
 import os
+import tempfile
 from pathlib import Path
 
 from dotenv import load_dotenv
@@ -31,6 +32,8 @@ INSTALLED_APPS = [
 ]
 
 MIDDLEWARE = [
+    'api.middleware.ServerTimingMiddleware',
+    'api.middleware.QueryPatternMiddleware',
     'django.middleware.security.SecurityMiddleware',
     'django.contrib.sessions.middleware.SessionMiddleware',
     'django.middleware.common.CommonMiddleware',
@@ -69,7 +72,7 @@ WSGI_APPLICATION = 'foodgram.wsgi.application'
 
 DATABASES = {
     'default': {
-        'ENGINE': 'django.db.backends.postgresql',
+        'ENGINE': os.getenv('DB_ENGINE', 'django.db.backends.postgresql'),
         'NAME': os.getenv('POSTGRES_DB', 'foodgram'),
         'USER': os.getenv('POSTGRES_USER', 'foodgram_user'),
         'PASSWORD': os.getenv('POSTGRES_PASSWORD', ''),
@@ -78,6 +81,70 @@ DATABASES = {
     }
 }
 
+CACHES = {
+    'default': {
+        'BACKEND': os.getenv(
+            'CACHE_BACKEND',
+            'django.core.cache.backends.filebased.FileBasedCache'
+        ),
+        'LOCATION': os.getenv(
+            'CACHE_LOCATION',
+            os.path.join(tempfile.gettempdir(), 'foodgram_cache')
+        ),
+        'OPTIONS': {'MAX_ENTRIES': 100000},
+    },
+    'recipes': {
+        'BACKEND': os.getenv(
+            'RECIPE_CACHE_BACKEND',
+            'django.core.cache.backends.locmem.LocMemCache'
+        ),
+        'LOCATION': os.getenv('RECIPE_CACHE_LOCATION', 'recipes'),
+        'TIMEOUT': int(os.getenv('RECIPE_CACHE_TIMEOUT', 60 * 60)),
+        'OPTIONS': {'MAX_ENTRIES': 10000},
+    },
+    # Версии кэшей читаются и меняются в каждом запросе, поэтому
+    # хранятся в бэкенде, который при записи не перебирает все ключи:
+    # в базе (таблица создается командой createcachetable), Redis
+    # или memcached. Версий по одной на рецепт и пользователя, поэтому
+    # MAX_ENTRIES больше, чем 300 по умолчанию: вытесненная версия
+    # создается заново и сбрасывает кэш рецепта.
+    'versions': {
+        'BACKEND': os.getenv(
+            'VERSIONS_CACHE_BACKEND',
+            'django.core.cache.backends.db.DatabaseCache'
+        ),
+        'LOCATION': os.getenv('VERSIONS_CACHE_LOCATION', 'cache_versions'),
+        'TIMEOUT': None,
+        'OPTIONS': {'MAX_ENTRIES': 1000000},
+    },
+    # Блокировки и ответы Idempotency-Key. Блокировка ставится через
+    # add, который должен быть атомарным для всех воркеров: в таблице
+    # базы повторная вставка ключа отклоняется первичным ключом.
+    'idempotency': {
+        'BACKEND': os.getenv(
+            'IDEMPOTENCY_CACHE_BACKEND',
+            'django.core.cache.backends.db.DatabaseCache'
+        ),
+        'LOCATION': os.getenv(
+            'IDEMPOTENCY_CACHE_LOCATION', 'cache_idempotency'
+        ),
+        'OPTIONS': {'MAX_ENTRIES': 100000},
+    },
+}
+
+RECIPE_FRAGMENTS_CACHE = 'recipes'
+
+REFERENCE_DATA_TTL = int(os.getenv('REFERENCE_DATA_TTL', 5 * 60))
+INGREDIENT_SEARCH_LIMIT = int(os.getenv('INGREDIENT_SEARCH_LIMIT', 50))
+SEARCH_CONFIG = os.getenv('SEARCH_CONFIG', 'russian')
+REFERENCE_DATA_MAX_AGE = int(
+    os.getenv('REFERENCE_DATA_MAX_AGE', 24 * 60 * 60)
+)
+
+IDEMPOTENCY_KEY_TIMEOUT = int(
+    os.getenv('IDEMPOTENCY_KEY_TIMEOUT', 24 * 60 * 60)
+)
+IDEMPOTENCY_LOCK_TIMEOUT = 30
 
 # Password validation
 # https://docs.djangoproject.com/en/3.2/ref/settings/#auth-password-validators
@@ -113,6 +180,50 @@ STATIC_ROOT = BASE_DIR / 'collected_static'
 MEDIA_URL = '/media/'
 MEDIA_ROOT = BASE_DIR / 'media'
 
+IMAGE_MAX_DECODED_SIZE = int(
+    os.getenv('IMAGE_MAX_DECODED_SIZE', 5 * 1024 * 1024)
+)
+IMAGE_MAX_ENCODED_SIZE = int(
+    os.getenv('IMAGE_MAX_ENCODED_SIZE', IMAGE_MAX_DECODED_SIZE * 4 // 3 + 4)
+)
+IMAGE_MAX_PIXELS = int(os.getenv('IMAGE_MAX_PIXELS', 25_000_000))
+
+IMAGE_VARIANTS = {
+    'small': (300, 300),
+    'medium': (800, 800),
+}
+IMAGE_VARIANT_QUALITY = 80
+IMAGE_VARIANTS_WORKERS = int(os.getenv('IMAGE_VARIANTS_WORKERS', 1))
+
+SERVER_TIMING = os.getenv('SERVER_TIMING', 'False').lower() == 'true'
+SERVER_TIMING_SAMPLE_RATE = float(
+    os.getenv('SERVER_TIMING_SAMPLE_RATE', 0.01)
+)
+SERVER_TIMING_PROFILE_DIR = os.getenv('SERVER_TIMING_PROFILE_DIR', '')
+
+# /metrics доступен с адресов и подсетей METRICS_ALLOWED_IPS
+# или с заголовком Authorization: Bearer METRICS_TOKEN.
+METRICS_ALLOWED_IPS = os.getenv(
+    'METRICS_ALLOWED_IPS', '127.0.0.1,::1'
+).split(',')
+METRICS_TOKEN = os.getenv('METRICS_TOKEN', '')
+
+N_PLUS_ONE_MODE = os.getenv('N_PLUS_ONE_MODE', 'log')
+N_PLUS_ONE_THRESHOLD = int(os.getenv('N_PLUS_ONE_THRESHOLD', 5))
+N_PLUS_ONE_SAMPLE_RATE = float(os.getenv('N_PLUS_ONE_SAMPLE_RATE', 0.01))
+N_PLUS_ONE_STACK_DEPTH = 5
+
+LOGGING = {
+    'version': 1,
+    'disable_existing_loggers': False,
+    'handlers': {
+        'console': {'class': 'logging.StreamHandler'},
+    },
+    'loggers': {
+        'api': {'handlers': ['console'], 'level': 'INFO'},
+    },
+}
+
 DEFAULT_AUTO_FIELD = 'django.db.models.BigAutoField'
 
 REST_FRAMEWORK = {
@@ -140,4 +251,8 @@ DJOSER = {
     },
     'LOGIN_FIELD': 'email',
     'HIDE_USERS': False,
+    # Ссылки из писем сброса пароля и почты: без них djoser падает
+    # с ошибкой 500 на /users/reset_password/ и /users/reset_email/.
+    'PASSWORD_RESET_CONFIRM_URL': 'reset_password/{uid}/{token}',
+    'USERNAME_RESET_CONFIRM_URL': 'reset_email/{uid}/{token}',
 }
@@ -0,0 +1,21 @@
+import glob
+import os
+
+from prometheus_client import multiprocess
+
+workers = int(os.getenv('GUNICORN_WORKERS', 1))
+
+
+def on_starting(server):
+    """Удаляет файлы метрик воркеров прошлого запуска."""
+    directory = os.getenv('PROMETHEUS_MULTIPROC_DIR')
+    if directory:
+        os.makedirs(directory, exist_ok=True)
+        for path in glob.glob(os.path.join(directory, '*.db')):
+            os.remove(path)
+
+
+def child_exit(server, worker):
+    """Убирает из метрик показатели завершившегося воркера."""
+    if os.getenv('PROMETHEUS_MULTIPROC_DIR'):
+        multiprocess.mark_process_dead(worker.pid)
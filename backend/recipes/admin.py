@@ -1,7 +1,8 @@
 from django.contrib import admin
+from django.db import transaction
 
 from recipes.models import (Ingredient, Recipe, RecipeIngredient, Tag,
-                            UserFavorites, UserShoppingCart)
+                            UserFavorites, UserShoppingCart, UserShoppingList)
 
 admin.site.empty_value_display = 'Не задано'
 
@@ -32,14 +33,23 @@ class RecipeAdmin(admin.ModelAdmin):
     """Отображает рецепты в панели администратора."""
     list_display = (
         'author', 'name', 'text',
-        'cooking_time', 'pub_date',)
+        'cooking_time', 'pub_date',
+        'favorites_count', 'shopping_cart_count',)
     search_fields = ('author', 'name', 'tags')
     list_filter = ('pub_date', 'tags',)
     inlines = (RecipeIngredientInline,)
 
-    def add_favourite_count(self, obj):
-        return UserFavorites.objects.filter(recipe=obj).count()
-    add_favourite_count.short_description = 'Добавлений в избранное'
+    def save_related(self, request, form, formsets, change):
+        """
+        Сохраняет ингредиенты рецепта и пересчитывает его вклад
+        в списки покупок корзин, где он лежит.
+        """
+        recipe = form.instance
+        if change:
+            UserShoppingList.objects.remove_recipe_from_carts(recipe)
+        super().save_related(request, form, formsets, change)
+        if change:
+            UserShoppingList.objects.add_recipe_to_carts(recipe)
 
 
 @admin.register(UserFavorites)
@@ -52,7 +62,55 @@ class UserFavoritesAdmin(admin.ModelAdmin):
 
 @admin.register(UserShoppingCart)
 class UserShoppingCartAdmin(admin.ModelAdmin):
-    """Отображает корзину в панели администратора."""
+    """
+    Отображает корзину в панели администратора.
+    Изменения корзины сразу учитываются в списках покупок.
+    """
     list_display = ('recipe',)
     search_fields = ('user',)
     list_filter = ('user',)
+
+    def save_model(self, request, obj, form, change):
+        if change:
+            old = UserShoppingCart.objects.select_related('user').get(
+                pk=obj.pk
+            )
+            UserShoppingList.objects.remove_recipes(
+                old.user, [old.recipe_id]
+            )
+        super().save_model(request, obj, form, change)
+        UserShoppingList.objects.add_recipes(obj.user, [obj.recipe_id])
+
+    def delete_model(self, request, obj):
+        UserShoppingList.objects.remove_recipes(obj.user, [obj.recipe_id])
+        super().delete_model(request, obj)
+
+    @transaction.atomic
+    def delete_queryset(self, request, queryset):
+        recipes = {}
+        for cart in queryset.select_related('user'):
+            recipes.setdefault(cart.user, []).append(cart.recipe_id)
+        for user, recipe_ids in recipes.items():
+            UserShoppingList.objects.remove_recipes(user, recipe_ids)
+        super().delete_queryset(request, queryset)
+
+
+@admin.register(UserShoppingList)
+class UserShoppingListAdmin(admin.ModelAdmin):
+    """
+    Отображает итоговые списки покупок в панели администратора.
+    Итоги считаются по корзинам, поэтому править их можно только
+    через корзину.
+    """
+    list_display = ('user', 'ingredient', 'amount')
+    search_fields = ('user__username', 'ingredient__name')
+    list_filter = ('user',)
+
+    def has_add_permission(self, request):
+        return False
+
+    def has_change_permission(self, request, obj=None):
+        return False
+
+    def has_delete_permission(self, request, obj=None):
+        return False
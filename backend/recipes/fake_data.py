@@ -0,0 +1,263 @@
+import bisect
+import csv
+import io
+import itertools
+import random
+from datetime import timedelta
+
+from django.contrib.auth import get_user_model
+from django.core.files.base import ContentFile
+from django.core.files.storage import default_storage
+from django.db import connection, transaction
+from django.utils import timezone
+from PIL import Image, ImageDraw
+
+from recipes.models import (Recipe, RecipeIngredient, UserFavorites,
+                            UserShoppingCart)
+from users.models import Subscribe
+
+User = get_user_model()
+
+FAKE_IMAGE = 'recipes/images/fake_{}.jpg'
+FAKE_IMAGE_SIZE = (480, 360)
+DISHES = (
+    'Суп', 'Салат', 'Рагу', 'Пирог', 'Запеканка', 'Каша', 'Омлет',
+    'Паста', 'Плов', 'Котлеты', 'Блины', 'Соус', 'Гарнир', 'Десерт',
+)
+STYLES = (
+    'по-домашнему', 'с травами', 'на скорую руку', 'по-деревенски',
+    'с овощами', 'на гриле', 'в духовке', 'по-итальянски', 'с сыром',
+)
+SENTENCES = (
+    'Нарежьте {} небольшими кусочками.',
+    'Добавьте {} и перемешайте.',
+    'Обжарьте {} до золотистого цвета.',
+    'Тушите {} на среднем огне до мягкости.',
+    'Подавайте, украсив блюдо: {}.',
+)
+
+# Кумулятивные веса распределения Ципфа по размеру и показателю,
+# вычисляются один раз в каждом процессе.
+zipf_cache = {}
+
+
+def zipf_weights(size, exponent):
+    """Кумулятивные веса: вес элемента с рангом k равен 1 / k ** exponent."""
+    key = (size, exponent)
+    if key not in zipf_cache:
+        zipf_cache[key] = list(itertools.accumulate(
+            1 / rank ** exponent for rank in range(1, size + 1)
+        ))
+    return zipf_cache[key]
+
+
+def zipf_choice(rng, weights):
+    """Индекс элемента, выбранного с весами zipf_weights."""
+    return bisect.bisect(weights, rng.random() * weights[-1])
+
+
+def zipf_sample(rng, weights, count, exclude=None):
+    """Индексы count разных элементов, выбранных с весами zipf_weights."""
+    count = min(count, len(weights) - (exclude is not None))
+    chosen = set()
+    attempts = count * 10
+    while len(chosen) < count and attempts:
+        index = zipf_choice(rng, weights)
+        if index != exclude:
+            chosen.add(index)
+        attempts -= 1
+    return chosen
+
+
+def pareto_count(rng, mean, alpha, limit):
+    """
+    Количество с тяжелым хвостом и средним около mean: большинство
+    пользователей добавляют мало, немногие - очень много.
+    """
+    if mean <= 0:
+        return 0
+    scale = mean * (alpha - 1) / alpha
+    return min(int(scale * rng.paretovariate(alpha)), limit)
+
+
+def task_random(seed, phase, chunk):
+    """Генератор для части данных, не зависящий от числа процессов."""
+    return random.Random(f'{seed}:{phase}:{chunk}')
+
+
+def placeholder_images(count, seed):
+    """Сохраняет count однотонных фото-заглушек и возвращает их имена."""
+    rng = random.Random(f'{seed}:images')
+    names = []
+    for number in range(count):
+        name = FAKE_IMAGE.format(number)
+        if not default_storage.exists(name):
+            image = Image.new('RGB', FAKE_IMAGE_SIZE, tuple(
+                rng.randrange(64, 224) for _ in range(3)
+            ))
+            ImageDraw.Draw(image).text((20, 20), str(number), fill='white')
+            buffer = io.BytesIO()
+            image.save(buffer, 'JPEG', quality=70)
+            default_storage.save(name, ContentFile(buffer.getvalue()))
+        names.append(name)
+    return names
+
+
+def copy_value(field, value):
+    value = field.get_db_prep_save(value, connection)
+    return r'\N' if value is None else value
+
+
+def insert_rows(model, fields, rows, batch_size):
+    """
+    Вставляет строки rows со значениями полей fields.
+    В PostgreSQL строки передаются через COPY, остальные поля
+    заполняются значениями по умолчанию. В других СУБД - bulk_create
+    пачками по batch_size, поля auto_now_add при этом получают
+    текущее время.
+    """
+    if connection.vendor != 'postgresql':
+        total = 0
+        while True:
+            batch = [
+                model(**dict(zip(fields, row)))
+                for row in itertools.islice(rows, batch_size)
+            ]
+            if not batch:
+                return total
+            model.objects.bulk_create(batch, batch_size=batch_size)
+            total += len(batch)
+    defaults = [
+        field for field in model._meta.concrete_fields
+        if field.name not in fields and field.attname not in fields
+        and not field.primary_key
+    ]
+    columns = [model._meta.get_field(name) for name in fields] + defaults
+    default_values = [field.get_default() for field in defaults]
+    buffer = io.StringIO()
+    writer = csv.writer(buffer)
+    total = 0
+    for row in rows:
+        writer.writerow([
+            copy_value(field, value)
+            for field, value in zip(columns, (*row, *default_values))
+        ])
+        total += 1
+    buffer.seek(0)
+    with connection.cursor() as cursor:
+        cursor.copy_expert(
+            f'COPY {model._meta.db_table} '
+            f'({", ".join(field.column for field in columns)}) '
+            "FROM STDIN WITH (FORMAT csv, NULL '\\N')",
+            buffer
+        )
+    return total
+
+
+def generate_users(task):
+    """Пользователи с id из диапазона задачи."""
+    first_id, count = task['first_id'], task['count']
+    return insert_rows(User, (
+        'id', 'email', 'username', 'first_name', 'last_name', 'password'
+    ), (
+        (pk, f'user{pk}@example.com', f'user{pk}', 'Имя', 'Фамилия',
+         task['password'])
+        for pk in range(first_id, first_id + count)
+    ), task['batch_size'])
+
+
+def generate_recipes(task):
+    """
+    Рецепты с id из диапазона задачи, их теги и ингредиенты.
+    Авторы выбираются по распределению Ципфа, популярные ингредиенты
+    встречаются чаще остальных.
+    """
+    rng = task_random(task['seed'], 'recipes', task['first_id'])
+    authors = zipf_weights(task['users'], task['author_skew'])
+    ingredients = zipf_weights(len(task['ingredients']), 1.0)
+    now = timezone.now()
+    recipes, tags, amounts = [], [], []
+    for pk in range(task['first_id'], task['first_id'] + task['count']):
+        recipe_ingredients = [
+            task['ingredients'][index] for index in zipf_sample(
+                rng, ingredients, rng.randint(3, 12)
+            )
+        ]
+        main = recipe_ingredients[0][1].lower()
+        recipes.append((
+            pk,
+            task['first_user'] + zipf_choice(rng, authors),
+            f'{rng.choice(DISHES)} {rng.choice(STYLES)}: {main}'[:200],
+            ' '.join(
+                rng.choice(SENTENCES).format(name.lower())
+                for _, name in recipe_ingredients
+            ),
+            rng.randint(1, 180),
+            rng.choice(task['images']),
+            now - timedelta(minutes=rng.randrange(task['days'] * 24 * 60)),
+        ))
+        tags.extend(
+            (pk, tag) for tag in rng.sample(
+                task['tags'], rng.randint(1, min(3, len(task['tags'])))
+            )
+        )
+        amounts.extend(
+            (pk, ingredient, rng.randint(1, 1000))
+            for ingredient, _ in recipe_ingredients
+        )
+    with transaction.atomic():
+        total = insert_rows(Recipe, (
+            'id', 'author_id', 'name', 'text', 'cooking_time', 'image',
+            'pub_date'
+        ), iter(recipes), task['batch_size'])
+        insert_rows(
+            Recipe.tags.through, ('recipe_id', 'tag_id'), iter(tags),
+            task['batch_size']
+        )
+        insert_rows(
+            RecipeIngredient, ('recipe_id', 'ingredient_id', 'amount'),
+            iter(amounts), task['batch_size']
+        )
+    return total
+
+
+def generate_user_lists(task):
+    """
+    Избранное, корзины и подписки пользователей из диапазона задачи.
+    Размеры списков распределены по Парето, рецепты и авторы
+    выбираются по распределению Ципфа.
+    """
+    rng = task_random(task['seed'], 'lists', task['first_id'])
+    recipes = zipf_weights(task['recipes'], task['recipe_skew'])
+    authors = zipf_weights(task['users'], task['author_skew'])
+    favorites, cart, subscriptions = [], [], []
+    for pk in range(task['first_id'], task['first_id'] + task['count']):
+        for rows, mean in (
+            (favorites, task['favorites']), (cart, task['cart'])
+        ):
+            rows.extend(
+                (pk, task['first_recipe'] + index)
+                for index in zipf_sample(rng, recipes, pareto_count(
+                    rng, mean, task['alpha'], task['limit']
+                ))
+            )
+        subscriptions.extend(
+            (pk, task['first_user'] + index)
+            for index in zipf_sample(
+                rng, authors,
+                pareto_count(
+                    rng, task['subscriptions'], task['alpha'], task['limit']
+                ),
+                exclude=pk - task['first_user']
+            )
+        )
+    with transaction.atomic():
+        for model, field, rows in (
+            (UserFavorites, 'recipe_id', favorites),
+            (UserShoppingCart, 'recipe_id', cart),
+            (Subscribe, 'author_id', subscriptions),
+        ):
+            insert_rows(
+                model, ('user_id', field), iter(rows), task['batch_size']
+            )
+    return len(favorites) + len(cart) + len(subscriptions)
@@ -0,0 +1,134 @@
+import hashlib
+import logging
+import multiprocessing
+import os
+import threading
+from concurrent.futures import ProcessPoolExecutor
+
+from django.apps import apps
+from django.conf import settings
+from django.core.files.storage import default_storage
+from django.db import connection
+from PIL import Image
+
+logger = logging.getLogger(__name__)
+
+VARIANT_NAME = 'recipes/images/variants/{}_{}_{}.jpg'
+
+executor = None
+executor_lock = threading.Lock()
+
+
+def make_variants(source, variants, quality):
+    """
+    Сохраняет уменьшенные копии изображения source.
+    variants - словарь {путь: (ширина, высота)}. Функция выполняется
+    в отдельном процессе и не обращается к Django.
+    """
+    with Image.open(source) as image:
+        image.load()
+        for path, size in variants.items():
+            variant = image.copy()
+            variant.thumbnail(size)
+            if variant.mode not in ('RGB', 'L'):
+                variant = variant.convert('RGB')
+            os.makedirs(os.path.dirname(path), exist_ok=True)
+            variant.save(
+                path, 'JPEG', quality=quality, optimize=True, progressive=True
+            )
+
+
+def variant_names(pk, image_name):
+    """
+    Возвращает имена файлов уменьшенных копий фото рецепта pk.
+    Base64ImageField называет все загрузки temp, а имя удаленного файла
+    хранилище может выдать снова, поэтому имя копии строится из id
+    рецепта и хэша полного имени исходного файла.
+    """
+    digest = hashlib.sha1(image_name.encode()).hexdigest()[:16]
+    return {
+        variant: VARIANT_NAME.format(pk, digest, variant)
+        for variant in settings.IMAGE_VARIANTS
+    }
+
+
+def delete_variants(variants, keep=()):
+    """
+    Удаляет файлы уменьшенных копий из словаря image_variants,
+    кроме имен из keep.
+    """
+    for variant, name in variants.items():
+        if variant != 'source' and name not in keep:
+            default_storage.delete(name)
+
+
+def variant_task(source, names):
+    """Возвращает аргументы make_variants для изображения source."""
+    return (
+        default_storage.path(source),
+        {
+            default_storage.path(names[variant]): size
+            for variant, size in settings.IMAGE_VARIANTS.items()
+        },
+        settings.IMAGE_VARIANT_QUALITY,
+    )
+
+
+def generate_variants(recipe):
+    """Создает уменьшенные копии фото рецепта в текущем процессе."""
+    names = variant_names(recipe.pk, recipe.image.name)
+    make_variants(*variant_task(recipe.image.name, names))
+    save_variants(recipe.pk, recipe.image.name, names)
+
+
+def save_variants(pk, source, names):
+    """
+    Сохраняет у рецепта имена готовых уменьшенных копий фото
+    и удаляет прежние копии. Если рецепт удален или его фото
+    сменилось, удаляются сами готовые копии.
+    """
+    Recipe = apps.get_model('recipes', 'Recipe')
+    recipe = Recipe.objects.filter(pk=pk, image=source).first()
+    if recipe is None:
+        delete_variants(names)
+        return
+    previous = recipe.image_variants
+    recipe.image_variants = {'source': source, **names}
+    recipe.save(update_fields=['image_variants'])
+    delete_variants(previous, keep=set(names.values()))
+
+
+def get_executor():
+    global executor
+    with executor_lock:
+        if executor is None:
+            executor = ProcessPoolExecutor(
+                max_workers=settings.IMAGE_VARIANTS_WORKERS,
+                mp_context=multiprocessing.get_context('spawn')
+            )
+    return executor
+
+
+def schedule_variants(pk, source):
+    """Ставит создание уменьшенных копий фото рецепта в пул процессов."""
+    names = variant_names(pk, source)
+    try:
+        future = get_executor().submit(
+            make_variants, *variant_task(source, names)
+        )
+    except Exception:
+        logger.exception('Не удалось запустить создание копий фото %s', pk)
+        return
+    scheduled_in = threading.get_ident()
+
+    def done(future):
+        try:
+            future.result()
+            save_variants(pk, source, names)
+        except Exception:
+            logger.exception('Не удалось создать копии фото рецепта %s', pk)
+        finally:
+            if threading.get_ident() != scheduled_in:
+                connection.close()
+
+    future.add_done_callback(done)
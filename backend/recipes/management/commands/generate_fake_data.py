@@ -0,0 +1,162 @@
+import multiprocessing
+import os
+import time
+
+from django.contrib.auth import get_user_model
+from django.contrib.auth.hashers import make_password
+from django.core.management import call_command
+from django.core.management.base import BaseCommand, CommandError
+from django.core.management.color import no_style
+from django.db import connection, connections
+from django.db.models import Max
+
+from api.cache import (RECIPES_VERSION, USERS_VERSION, bump_versions,
+                       invalidate_all_recipes)
+from recipes.fake_data import (generate_recipes, generate_user_lists,
+                               generate_users, placeholder_images)
+from recipes.models import Ingredient, Recipe, Tag
+
+User = get_user_model()
+
+BATCH_SIZE = 5000
+CHUNK_SIZE = 10000
+FAKE_PASSWORD = 'fake-Pa55word'
+
+
+def next_id(model):
+    return (model.objects.aggregate(last=Max('pk'))['last'] or 0) + 1
+
+
+def chunks(first_id, count, size, **params):
+    """Задачи для диапазона id длиной count, по size id на задачу."""
+    last_id = first_id + count
+    return [
+        {**params, 'first_id': start, 'count': min(size, last_id - start)}
+        for start in range(first_id, last_id, size)
+    ]
+
+
+class Command(BaseCommand):
+    help = (
+        'Генерация пользователей, рецептов, избранного, корзин и подписок '
+        'для нагрузочного тестирования по существующим тегам и ингредиентам'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--users', type=int, default=10000)
+        parser.add_argument('--recipes', type=int, default=100000)
+        parser.add_argument(
+            '--favorites', type=float, default=20,
+            help='Среднее число рецептов в избранном у пользователя'
+        )
+        parser.add_argument(
+            '--cart', type=float, default=5,
+            help='Среднее число рецептов в корзине у пользователя'
+        )
+        parser.add_argument(
+            '--subscriptions', type=float, default=10,
+            help='Среднее число подписок у пользователя'
+        )
+        parser.add_argument(
+            '--author-skew', type=float, default=1.1,
+            help='Показатель распределения Ципфа для популярности авторов'
+        )
+        parser.add_argument(
+            '--recipe-skew', type=float, default=1.0,
+            help='Показатель распределения Ципфа для популярности рецептов'
+        )
+        parser.add_argument(
+            '--alpha', type=float, default=1.5,
+            help='Показатель распределения Парето для размеров списков'
+        )
+        parser.add_argument(
+            '--limit', type=int, default=1000,
+            help='Наибольший размер списка одного пользователя'
+        )
+        parser.add_argument(
+            '--days', type=int, default=365,
+            help='За сколько дней распределены даты публикации'
+        )
+        parser.add_argument('--images', type=int, default=20)
+        parser.add_argument('--seed', type=int, default=0)
+        parser.add_argument('--batch-size', type=int, default=BATCH_SIZE)
+        parser.add_argument(
+            '--workers', type=int, default=os.cpu_count(),
+            help='Количество процессов (только PostgreSQL)'
+        )
+        parser.add_argument('--password', default=FAKE_PASSWORD)
+
+    def run(self, function, tasks, workers):
+        """Выполняет задачи в пуле процессов и возвращает число строк."""
+        if workers == 1:
+            return sum(map(function, tasks))
+        # Дочерние процессы не должны унаследовать открытые соединения.
+        connections.close_all()
+        with multiprocessing.get_context('fork').Pool(workers) as pool:
+            return sum(pool.imap_unordered(function, tasks))
+
+    def handle(self, *args, **options):
+        tags = list(Tag.objects.values_list('pk', flat=True))
+        ingredients = list(Ingredient.objects.values_list('pk', 'name'))
+        if not tags or not ingredients:
+            raise CommandError('Сначала заполните теги и ингредиенты.')
+        if options['users'] < 2 or options['recipes'] < 1:
+            raise CommandError('Нужны хотя бы 2 пользователя и 1 рецепт.')
+        workers = max(options['workers'], 1)
+        if connection.vendor != 'postgresql':
+            # SQLite не допускает одновременной записи из нескольких
+            # процессов.
+            workers = 1
+        start = time.monotonic()
+        first_user, first_recipe = next_id(User), next_id(Recipe)
+        common = {
+            'seed': options['seed'],
+            'batch_size': options['batch_size'],
+            'first_user': first_user,
+            'users': options['users'],
+            'author_skew': options['author_skew'],
+        }
+        total = self.run(generate_users, chunks(
+            first_user, options['users'], CHUNK_SIZE,
+            password=make_password(options['password']), **common
+        ), workers)
+        self.stdout.write(f'Пользователей: {total}')
+        total = self.run(generate_recipes, chunks(
+            first_recipe, options['recipes'], CHUNK_SIZE,
+            tags=tags,
+            ingredients=ingredients,
+            images=placeholder_images(options['images'], options['seed']),
+            days=options['days'],
+            **common
+        ), workers)
+        self.stdout.write(f'Рецептов: {total}')
+        total = self.run(generate_user_lists, chunks(
+            first_user, options['users'], CHUNK_SIZE // 10,
+            first_recipe=first_recipe,
+            recipes=options['recipes'],
+            recipe_skew=options['recipe_skew'],
+            favorites=options['favorites'],
+            cart=options['cart'],
+            subscriptions=options['subscriptions'],
+            alpha=options['alpha'],
+            limit=options['limit'],
+            **common
+        ), workers)
+        self.stdout.write(
+            f'Записей в избранном, корзинах и подписках: {total}'
+        )
+        with connection.cursor() as cursor:
+            for sql in connection.ops.sequence_reset_sql(
+                no_style(), [User, Recipe]
+            ):
+                cursor.execute(sql)
+        for command in (
+            'reconcile_counters', 'rebuild_shopping_lists',
+            'rebuild_search_index'
+        ):
+            call_command(command, stdout=self.stdout)
+        bump_versions([RECIPES_VERSION, USERS_VERSION])
+        invalidate_all_recipes()
+        self.stdout.write(self.style.SUCCESS(
+            f'Данные сгенерированы за {time.monotonic() - start:.0f} с.'
+        ))
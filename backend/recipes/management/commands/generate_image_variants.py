@@ -0,0 +1,53 @@
+import time
+
+from django.core.management.base import BaseCommand
+
+from recipes.images import generate_variants
+from recipes.models import Recipe
+
+POLL_INTERVAL = 10
+
+
+class Command(BaseCommand):
+    help = 'Создание уменьшенных копий фото рецептов'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--all',
+            action='store_true',
+            help='Пересоздать копии фото всех рецептов'
+        )
+        parser.add_argument(
+            '--watch',
+            action='store_true',
+            help='Работать постоянно, проверяя новые рецепты'
+        )
+
+    def generate(self, regenerate):
+        """Создает недостающие копии фото, возвращает число рецептов."""
+        count = 0
+        recipes = Recipe.objects.exclude(image='').only(
+            'id', 'image', 'image_variants'
+        ).order_by('id')
+        for recipe in recipes.iterator():
+            if (
+                not regenerate
+                and recipe.image_variants.get('source') == recipe.image.name
+            ):
+                continue
+            try:
+                generate_variants(recipe)
+            except OSError as error:
+                self.stderr.write(f'Рецепт {recipe.pk}: {error}')
+                continue
+            count += 1
+        return count
+
+    def handle(self, *args, **options):
+        count = self.generate(options['all'])
+        self.stdout.write(f'Обработано рецептов: {count}')
+        while options['watch']:
+            time.sleep(POLL_INTERVAL)
+            count = self.generate(False)
+            if count:
+                self.stdout.write(f'Обработано рецептов: {count}')
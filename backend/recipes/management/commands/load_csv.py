@@ -1,29 +1,136 @@
 import csv
+import io
+import json
 import os
+import time
+from itertools import islice
 
 from django.conf import settings
-from django.core.management.base import BaseCommand
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection, transaction
 
+from api.cache import INGREDIENTS_VERSION, bump_versions
 from recipes.models import Ingredient
 
+BATCH_SIZE = 1000
+
 
 class Command(BaseCommand):
-    help = 'Загрузка csv файлов в базу данных'
-
-    def importingredient(self):
-        if Ingredient.objects.exists():
-            print('Данные для Ingredient уже загружены.')
-        else:
-            csv_file_path = os.path.join(
-                settings.BASE_DIR, 'data', 'ingredients.csv')
-            with open(csv_file_path, 'r', encoding='utf8') as file:
-                reader = csv.DictReader(file)
-                for row in reader:
-                    Ingredient.objects.create(
-                        name=row['name'],
-                        measurement_unit=row['measurement_unit']
-                    )
-                print('Данные для Ingredient успешно загружены!')
-
-    def handle(self, *args, **kwargs):
-        self.importingredient()
+    help = 'Загрузка ингредиентов из csv или json файла в базу данных'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            'path',
+            nargs='?',
+            default=os.path.join(settings.BASE_DIR, 'data', 'ingredients.csv'),
+            help='Путь к файлу с ингредиентами'
+        )
+        parser.add_argument(
+            '--format',
+            choices=('csv', 'json'),
+            help='Формат файла, по умолчанию определяется по расширению'
+        )
+        parser.add_argument(
+            '--merge',
+            action='store_true',
+            help='Добавить только новые ингредиенты в заполненный каталог'
+        )
+        parser.add_argument(
+            '--batch-size',
+            type=int,
+            default=BATCH_SIZE,
+            help='Количество строк в одном INSERT'
+        )
+        parser.add_argument(
+            '--copy',
+            action='store_true',
+            help='Загрузка через COPY (только PostgreSQL)'
+        )
+
+    def read_rows(self, path, file_format):
+        """Возвращает пары (название, единица измерения) из файла."""
+        with open(path, 'r', encoding='utf8') as file:
+            if file_format == 'json':
+                rows = json.load(file)
+            else:
+                rows = csv.DictReader(file)
+            for row in rows:
+                yield row['name'], row['measurement_unit']
+
+    def bulk_load(self, rows, batch_size):
+        """Загружает строки пачками, пропуская уже существующие."""
+        total = 0
+        while True:
+            batch = [
+                Ingredient(name=name, measurement_unit=measurement_unit)
+                for name, measurement_unit in islice(rows, batch_size)
+            ]
+            if not batch:
+                return total
+            Ingredient.objects.bulk_create(batch, ignore_conflicts=True)
+            total += len(batch)
+
+    def copy_load(self, rows):
+        """Загружает строки через COPY во временную таблицу."""
+        buffer = io.StringIO()
+        writer = csv.writer(buffer)
+        total = 0
+        for row in rows:
+            writer.writerow(row)
+            total += 1
+        buffer.seek(0)
+        with connection.cursor() as cursor:
+            cursor.execute(
+                'CREATE TEMP TABLE ingredient_import '
+                '(name varchar(200), measurement_unit varchar(200)) '
+                'ON COMMIT DROP'
+            )
+            cursor.copy_expert(
+                'COPY ingredient_import (name, measurement_unit) '
+                'FROM STDIN WITH (FORMAT csv)',
+                buffer
+            )
+            cursor.execute(
+                f'INSERT INTO {Ingredient._meta.db_table} '
+                '(name, measurement_unit) '
+                'SELECT DISTINCT name, measurement_unit '
+                'FROM ingredient_import '
+                'ON CONFLICT ON CONSTRAINT unique_name_measurement_unit '
+                'DO NOTHING'
+            )
+        return total
+
+    def handle(self, *args, **options):
+        path = options['path']
+        file_format = (
+            options['format'] or os.path.splitext(path)[1].lstrip('.').lower()
+        )
+        if file_format not in ('csv', 'json'):
+            raise CommandError(f'Неизвестный формат файла: {path}')
+        if options['copy'] and connection.vendor != 'postgresql':
+            raise CommandError(
+                'Загрузка через COPY доступна только в PostgreSQL.'
+            )
+        if not options['merge'] and Ingredient.objects.exists():
+            self.stdout.write(
+                'Данные для Ingredient уже загружены. '
+                'Для добавления новых ингредиентов используйте --merge.'
+            )
+            return
+        start = time.monotonic()
+        rows = self.read_rows(path, file_format)
+        with transaction.atomic():
+            count_before = Ingredient.objects.count()
+            if options['copy']:
+                total = self.copy_load(rows)
+            else:
+                total = self.bulk_load(rows, options['batch_size'])
+            inserted = Ingredient.objects.count() - count_before
+        elapsed = time.monotonic() - start
+        if inserted:
+            bump_versions([INGREDIENTS_VERSION])
+        self.stdout.write(self.style.SUCCESS(
+            f'Данные для Ingredient успешно загружены! '
+            f'Добавлено: {inserted}, пропущено: {total - inserted}, '
+            f'{total / elapsed if elapsed else total:.0f} строк/с.'
+        ))
@@ -0,0 +1,15 @@
+from django.core.management.base import BaseCommand
+from django.db import transaction
+
+from recipes import search
+
+
+class Command(BaseCommand):
+    help = 'Пересборка поискового индекса рецептов'
+
+    def handle(self, *args, **options):
+        with transaction.atomic():
+            search.rebuild()
+        self.stdout.write(self.style.SUCCESS(
+            'Поисковый индекс рецептов пересобран.'
+        ))
@@ -0,0 +1,63 @@
+from django.core.management.base import BaseCommand, CommandError
+from django.db import transaction
+from django.db.models import Sum
+
+from recipes.models import RecipeIngredient, UserShoppingList
+
+
+class Command(BaseCommand):
+    help = 'Пересчет или проверка итоговых списков покупок'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--verify',
+            action='store_true',
+            help='Только сравнить списки покупок с корзинами'
+        )
+
+    def verify(self):
+        expected = {
+            (row['recipe__shoppingcart__user'], row['ingredient']):
+                row['total']
+            for row in RecipeIngredient.objects.filter(
+                recipe__shoppingcart__isnull=False
+            ).order_by().values(
+                'recipe__shoppingcart__user', 'ingredient'
+            ).annotate(total=Sum('amount'))
+        }
+        actual = {
+            (user, ingredient): amount
+            for user, ingredient, amount in (
+                UserShoppingList.objects.values_list(
+                    'user', 'ingredient', 'amount'
+                )
+            )
+        }
+        mismatches = [
+            (key, expected.get(key), actual.get(key))
+            for key in expected.keys() | actual.keys()
+            if expected.get(key) != actual.get(key)
+        ]
+        for (user, ingredient), expected_amount, amount in sorted(
+            mismatches, key=lambda mismatch: mismatch[0]
+        ):
+            self.stdout.write(
+                f'Пользователь {user}, ингредиент {ingredient}: '
+                f'ожидалось {expected_amount}, записано {amount}'
+            )
+        if mismatches:
+            raise CommandError(
+                f'Расхождений в списках покупок: {len(mismatches)}'
+            )
+        self.stdout.write('Списки покупок совпадают с корзинами.')
+
+    def handle(self, *args, **options):
+        if options['verify']:
+            self.verify()
+            return
+        with transaction.atomic():
+            UserShoppingList.objects.rebuild()
+        self.stdout.write(
+            f'Списки покупок пересчитаны: '
+            f'{UserShoppingList.objects.count()} записей.'
+        )
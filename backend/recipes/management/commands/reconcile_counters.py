@@ -0,0 +1,59 @@
+from django.contrib.auth import get_user_model
+from django.core.management.base import BaseCommand, CommandError
+from django.db import transaction
+from django.db.models import Count, F, OuterRef, Q, Subquery
+from django.db.models.functions import Coalesce
+
+from recipes.models import Recipe, UserFavorites, UserShoppingCart
+from users.models import Subscribe
+
+User = get_user_model()
+
+COUNTERS = (
+    (Recipe, 'favorites_count', UserFavorites, 'recipe'),
+    (Recipe, 'shopping_cart_count', UserShoppingCart, 'recipe'),
+    (User, 'recipes_count', Recipe, 'author'),
+    (User, 'followers_count', Subscribe, 'author'),
+)
+
+
+def actual_count(model, field):
+    """Возвращает подзапрос с фактическим числом строк model на объект."""
+    return Coalesce(Subquery(
+        model.objects.filter(**{field: OuterRef('pk')}).order_by().values(
+            field
+        ).annotate(total=Count('pk')).values('total')
+    ), 0)
+
+
+class Command(BaseCommand):
+    help = 'Проверка и исправление счетчиков избранного, корзин и подписок'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--verify',
+            action='store_true',
+            help='Только найти расхождения, не исправляя их'
+        )
+
+    def handle(self, *args, **options):
+        total = 0
+        with transaction.atomic():
+            for model, counter, source, field in COUNTERS:
+                drifted = model.objects.annotate(
+                    actual=actual_count(source, field)
+                ).filter(~Q(**{counter: F('actual')}))
+                if options['verify']:
+                    found = drifted.count()
+                else:
+                    found = model.objects.filter(
+                        pk__in=drifted.values('pk')
+                    ).update(**{counter: actual_count(source, field)})
+                total += found
+                self.stdout.write(
+                    f'{model._meta.verbose_name_plural}, {counter}: '
+                    f'расхождений {found}'
+                )
+        if options['verify'] and total:
+            raise CommandError(f'Расхождений в счетчиках: {total}')
+        self.stdout.write(self.style.SUCCESS('Счетчики проверены.'))
@@ -0,0 +1,52 @@
+# Generated by Django 3.2.3 on 2026-10-18 02:12
+
+from django.conf import settings
+from django.db import migrations, models
+import django.db.models.deletion
+
+
+def fill_shopping_lists(apps, schema_editor):
+    UserShoppingList = apps.get_model('recipes', 'UserShoppingList')
+    UserShoppingCart = apps.get_model('recipes', 'UserShoppingCart')
+    RecipeIngredient = apps.get_model('recipes', 'RecipeIngredient')
+    schema_editor.execute(
+        f'INSERT INTO {UserShoppingList._meta.db_table} '
+        '(user_id, ingredient_id, amount) '
+        'SELECT cart.user_id, recipe_ingredient.ingredient_id, '
+        'SUM(recipe_ingredient.amount) '
+        f'FROM {UserShoppingCart._meta.db_table} AS cart '
+        f'JOIN {RecipeIngredient._meta.db_table} AS recipe_ingredient '
+        'ON recipe_ingredient.recipe_id = cart.recipe_id '
+        'GROUP BY cart.user_id, recipe_ingredient.ingredient_id'
+    )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+        ('recipes', '0004_recipe_pub_date_id_idx'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='UserShoppingList',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('amount', models.PositiveIntegerField(verbose_name='Количество')),
+                ('ingredient', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='shoppinglist', to='recipes.ingredient', verbose_name='Ингредиент')),
+                ('user', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='shoppinglist', to=settings.AUTH_USER_MODEL, verbose_name='Пользователь')),
+            ],
+            options={
+                'verbose_name': 'Ингредиент списка покупок',
+                'verbose_name_plural': 'Списки покупок',
+                'ordering': ('user', 'ingredient'),
+                'default_related_name': 'shoppinglist',
+            },
+        ),
+        migrations.AddConstraint(
+            model_name='usershoppinglist',
+            constraint=models.UniqueConstraint(fields=('user', 'ingredient'), name='user_ingredient_shoppinglist_unique'),
+        ),
+        migrations.RunPython(fill_shopping_lists, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,77 @@
+from django.conf import settings
+from django.db import migrations
+
+# SQL поискового индекса на момент миграции. В PostgreSQL документ
+# хранится в столбце tsvector с индексом GIN, в SQLite - в виртуальной
+# таблице FTS5, где rowid равен id рецепта. Остальные СУБД ищут
+# через icontains, и таблица им не нужна.
+CREATE_SQL = {
+    'postgresql': [
+        'CREATE TABLE recipes_recipe_search ('
+        'recipe_id bigint PRIMARY KEY '
+        'REFERENCES recipes_recipe (id) '
+        'ON DELETE CASCADE DEFERRABLE INITIALLY DEFERRED, '
+        'document tsvector NOT NULL)',
+        'CREATE INDEX recipes_recipe_search_document_idx '
+        'ON recipes_recipe_search USING GIN (document)',
+    ],
+    'sqlite': [
+        'CREATE VIRTUAL TABLE recipes_recipe_search USING fts5('
+        'name, ingredients, text, '
+        "tokenize = 'unicode61 remove_diacritics 2')",
+    ],
+}
+
+SOURCE_SQL = (
+    'FROM recipes_recipe AS recipe '
+    'LEFT JOIN recipes_recipeingredient AS recipe_ingredient '
+    'ON recipe_ingredient.recipe_id = recipe.id '
+    'LEFT JOIN recipes_ingredient AS ingredient '
+    'ON ingredient.id = recipe_ingredient.ingredient_id '
+    'GROUP BY recipe.id'
+)
+
+BACKFILL_SQL = {
+    'postgresql': (
+        'INSERT INTO recipes_recipe_search (recipe_id, document) '
+        'SELECT recipe.id, '
+        "setweight(to_tsvector(%s, recipe.name), 'A') || "
+        'setweight(to_tsvector(%s, '
+        "coalesce(string_agg(ingredient.name, ' '), '')), 'B') || "
+        "setweight(to_tsvector(%s, recipe.text), 'C') "
+        f'{SOURCE_SQL}'
+    ),
+    'sqlite': (
+        'INSERT INTO recipes_recipe_search '
+        '(rowid, name, ingredients, text) '
+        'SELECT recipe.id, recipe.name, '
+        "coalesce(group_concat(ingredient.name, ' '), ''), "
+        f'recipe.text {SOURCE_SQL}'
+    ),
+}
+
+
+def create_search(apps, schema_editor):
+    vendor = schema_editor.connection.vendor
+    if vendor not in CREATE_SQL:
+        return
+    for sql in CREATE_SQL[vendor]:
+        schema_editor.execute(sql)
+    params = [settings.SEARCH_CONFIG] * 3 if vendor == 'postgresql' else []
+    schema_editor.execute(BACKFILL_SQL[vendor], params)
+
+
+def drop_search(apps, schema_editor):
+    if schema_editor.connection.vendor in CREATE_SQL:
+        schema_editor.execute('DROP TABLE IF EXISTS recipes_recipe_search')
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('recipes', '0007_recipe_counters'),
+    ]
+
+    operations = [
+        migrations.RunPython(create_search, drop_search),
+    ]
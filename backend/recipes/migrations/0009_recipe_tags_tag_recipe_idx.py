@@ -0,0 +1,21 @@
+from django.db import migrations
+
+
+class Migration(migrations.Migration):
+    """
+    Индекс (tag_id, recipe_id) таблицы связи рецептов с тегами
+    для подзапросов EXISTS фильтра по тегам. Таблица создается
+    автоматически для Recipe.tags, поэтому индекс задается через SQL.
+    """
+
+    dependencies = [
+        ('recipes', '0008_recipe_search'),
+    ]
+
+    operations = [
+        migrations.RunSQL(
+            'CREATE INDEX recipe_tags_tag_recipe_idx '
+            'ON recipes_recipe_tags (tag_id, recipe_id)',
+            'DROP INDEX recipe_tags_tag_recipe_idx',
+        ),
+    ]
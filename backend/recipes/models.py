@@ -1,12 +1,16 @@
 from colorfield.fields import ColorField
 from django.contrib.auth import get_user_model
 from django.core.validators import MaxValueValidator, MinValueValidator
-from django.db import models
+from django.db import connections, models
+from django.db.models.expressions import RawSQL, Window
+from django.db.models.functions import Greatest, RowNumber
 
+from recipes import search
 from recipes.constants import (MAX_AMOUNT, MAX_LEAGHT_COLOR,
                                MAX_LEAGHT_MEASUREMENT_UNIT, MAX_LEAGHT_NAME,
                                MAX_LEAGHT_SLAG, MAX_LEAGHT_TEXT,
                                MAX_TIME_COOKING, MIN_AMOUNT, MIN_TIME_COOKING)
+from users.models import CountersModel
 
 User = get_user_model()
 
@@ -66,8 +70,57 @@ class Tag(models.Model):
         return f'{self.name} - {self.slug}'
 
 
-class Recipe(models.Model):
+def change_counter(queryset, field, delta):
+    """
+    Атомарно меняет счетчик field у объектов queryset на delta
+    одним UPDATE, не опуская его ниже нуля.
+    """
+    return queryset.update(
+        **{field: Greatest(models.F(field) + delta, 0)}
+    )
+
+
+class RecipeQuerySet(models.QuerySet):
+    """Набор запросов рецептов."""
+
+    def with_related(self):
+        """Подгружает автора, теги и ингредиенты рецептов."""
+        return self.select_related('author').prefetch_related(
+            'tags',
+            models.Prefetch(
+                'recipeingredient',
+                queryset=RecipeIngredient.objects.select_related('ingredient')
+            ),
+        )
+
+    def search(self, query):
+        """
+        Полнотекстовый поиск по названию, описанию и ингредиентам.
+        Рецепты аннотируются релевантностью search_rank.
+        """
+        return search.search(self, query)
+
+    def limit_per_author(self, limit):
+        """
+        Оставляет не более limit последних рецептов каждого автора.
+        Отбор выполняется одним запросом с оконной функцией ROW_NUMBER.
+        """
+        ranked = self.annotate(recipe_rank=Window(
+            RowNumber(),
+            partition_by=models.F('author_id'),
+            order_by=(models.F('pub_date').desc(), models.F('pk').desc()),
+        )).order_by().values('pk', 'recipe_rank')
+        sql, params = ranked.query.sql_with_params()
+        return self.model.objects.filter(pk__in=RawSQL(
+            f'SELECT ranked.id FROM ({sql}) AS ranked '
+            'WHERE ranked.recipe_rank <= %s',
+            (*params, limit)
+        ))
+
+
+class Recipe(CountersModel):
     """Модель рецептов."""
+    counter_fields = ('favorites_count', 'shopping_cart_count')
 
     author = models.ForeignKey(
         User,
@@ -82,6 +135,12 @@ class Recipe(models.Model):
         'Фото рецепта',
         upload_to='recipes/images/',
     )
+    image_variants = models.JSONField(
+        'Уменьшенные копии фото',
+        default=dict,
+        blank=True,
+        editable=False,
+    )
     text = models.TextField(
         'Описание рецепта',
     )
@@ -115,11 +174,29 @@ class Recipe(models.Model):
         'Дата публикации',
         auto_now_add=True
     )
+    favorites_count = models.PositiveIntegerField(
+        'В избранном',
+        default=0,
+        editable=False
+    )
+    shopping_cart_count = models.PositiveIntegerField(
+        'В корзинах',
+        default=0,
+        editable=False
+    )
+
+    objects = RecipeQuerySet.as_manager()
 
     class Meta:
         verbose_name = 'Рецепт'
         verbose_name_plural = 'Рецепты'
-        ordering = ('-pub_date',)
+        ordering = ('-pub_date', '-id')
+        indexes = [
+            models.Index(
+                fields=('-pub_date', '-id'),
+                name='recipe_pub_date_id_idx'
+            )
+        ]
 
     def __str__(self):
         return f'{self.name} - {self.text[:MAX_LEAGHT_TEXT]}'
@@ -168,6 +245,64 @@ class RecipeIngredient(models.Model):
         return f'{self.recipe} - {self.ingredient} - {self.amount}'
 
 
+class UserRecipeListQuerySet(models.QuerySet):
+    """Набор запросов для массового изменения избранного и корзины."""
+
+    def add_recipes(self, user, recipe_ids):
+        """
+        Добавляет существующие рецепты из recipe_ids одним INSERT,
+        пропуская уже добавленные. Возвращает id добавленных рецептов.
+        """
+        recipe_ids = list(recipe_ids)
+        if not recipe_ids:
+            return set()
+        table = self.model._meta.db_table
+        with connections[self.db].cursor() as cursor:
+            cursor.execute(
+                f'INSERT INTO {table} (user_id, recipe_id) '
+                f'SELECT %s, recipe.id FROM {Recipe._meta.db_table} AS recipe '
+                'WHERE recipe.id IN ({}) '
+                'ON CONFLICT (user_id, recipe_id) DO NOTHING '
+                'RETURNING recipe_id'.format(
+                    ', '.join(['%s'] * len(recipe_ids))
+                ),
+                [user.pk, *recipe_ids]
+            )
+            added = {recipe_id for recipe_id, in cursor.fetchall()}
+        change_counter(
+            Recipe.objects.filter(pk__in=added), self.model.recipe_counter, 1
+        )
+        return added
+
+    def remove_recipes(self, user, recipe_ids=None):
+        """
+        Удаляет рецепты recipe_ids пользователя одним DELETE,
+        без recipe_ids - все рецепты. Возвращает id удаленных рецептов.
+        """
+        where, params = 'user_id = %s', [user.pk]
+        if recipe_ids is not None:
+            recipe_ids = list(recipe_ids)
+            if not recipe_ids:
+                return set()
+            where += ' AND recipe_id IN ({})'.format(
+                ', '.join(['%s'] * len(recipe_ids))
+            )
+            params += recipe_ids
+        with connections[self.db].cursor() as cursor:
+            cursor.execute(
+                f'DELETE FROM {self.model._meta.db_table} '
+                f'WHERE {where} RETURNING recipe_id',
+                params
+            )
+            removed = {recipe_id for recipe_id, in cursor.fetchall()}
+        change_counter(
+            Recipe.objects.filter(pk__in=removed),
+            self.model.recipe_counter,
+            -1
+        )
+        return removed
+
+
 class UserRecipeList(models.Model):
     """Абстрактная модель для отображения рецепта
     в избранном и корзине покупок."""
@@ -182,6 +317,8 @@ class UserRecipeList(models.Model):
         verbose_name='Рецепт'
     )
 
+    objects = UserRecipeListQuerySet.as_manager()
+
     class Meta:
         abstract = True
         ordering = ('user', 'recipe')
@@ -189,6 +326,7 @@ class UserRecipeList(models.Model):
 
 class UserFavorites(UserRecipeList):
     """Список избранного пользователя"""
+    recipe_counter = 'favorites_count'
 
     class Meta(UserRecipeList.Meta):
         verbose_name = 'Избранный рецепт'
@@ -207,6 +345,7 @@ class UserFavorites(UserRecipeList):
 
 class UserShoppingCart(UserRecipeList):
     """Список покупок пользавателя"""
+    recipe_counter = 'shopping_cart_count'
 
     class Meta(UserRecipeList.Meta):
         verbose_name = 'Ингредиент для покупки'
@@ -221,3 +360,166 @@ class UserShoppingCart(UserRecipeList):
 
     def __str__(self):
         return f'{self.user} {self.recipe}'
+
+
+class UserShoppingListQuerySet(models.QuerySet):
+    """
+    Набор запросов итогового списка покупок.
+    Итоги пересчитываются инкрементально при изменении корзины покупок.
+    """
+
+    def _add(self, where, params):
+        """Прибавляет ингредиенты рецептов из корзин, отобранных where."""
+        table = self.model._meta.db_table
+        with connections[self.db].cursor() as cursor:
+            cursor.execute(
+                f'INSERT INTO {table} (user_id, ingredient_id, amount) '
+                'SELECT cart.user_id, recipe_ingredient.ingredient_id, '
+                'SUM(recipe_ingredient.amount) '
+                f'FROM {UserShoppingCart._meta.db_table} AS cart '
+                f'JOIN {RecipeIngredient._meta.db_table} AS recipe_ingredient '
+                'ON recipe_ingredient.recipe_id = cart.recipe_id '
+                f'WHERE {where} '
+                'GROUP BY cart.user_id, recipe_ingredient.ingredient_id '
+                'ON CONFLICT (user_id, ingredient_id) '
+                f'DO UPDATE SET amount = {table}.amount + excluded.amount',
+                params
+            )
+
+    def _subtract(self, users, recipe_ids, ingredient_ids=None):
+        """Вычитает ингредиенты рецептов из списков покупок users."""
+        recipe_ingredients = RecipeIngredient.objects.filter(
+            recipe_id__in=recipe_ids
+        ).order_by()
+        if ingredient_ids is not None:
+            recipe_ingredients = recipe_ingredients.filter(
+                ingredient_id__in=ingredient_ids
+            )
+        amounts = recipe_ingredients.filter(
+            ingredient=models.OuterRef('ingredient')
+        ).values('ingredient').annotate(
+            total=models.Sum('amount')
+        ).values('total')
+        items = self.filter(
+            user__in=users,
+            ingredient__in=recipe_ingredients.values('ingredient')
+        )
+        items.update(amount=Greatest(
+            models.F('amount') - models.Subquery(amounts), 0
+        ))
+        items.filter(amount=0).delete()
+
+    def lock(self, recipe_ids, users=None):
+        """
+        Блокирует до конца транзакции рецепты и строки списков покупок
+        с их ингредиентами у пользователей users (по умолчанию у всех,
+        в чьих корзинах лежат рецепты). Вычитание и прибавление идут
+        отдельными запросами, и без блокировки параллельное изменение
+        корзины или ингредиентов рецепта между ними сбивает итоги.
+        Блокировки берутся по возрастанию id, чтобы не было взаимных.
+        """
+        recipe_ids = list(recipe_ids)
+        if (
+            not recipe_ids
+            or not connections[self.db].features.has_select_for_update
+        ):
+            return
+        list(Recipe.objects.using(self.db).select_for_update().filter(
+            pk__in=recipe_ids
+        ).order_by('pk').values_list('pk', flat=True))
+        if users is None:
+            users = UserShoppingCart.objects.filter(
+                recipe_id__in=recipe_ids
+            ).values('user')
+        list(self.select_for_update().filter(
+            user__in=users,
+            ingredient__in=RecipeIngredient.objects.filter(
+                recipe_id__in=recipe_ids
+            ).values('ingredient')
+        ).order_by('pk').values_list('pk', flat=True))
+
+    def add_recipes(self, user, recipe_ids):
+        """Добавляет в список покупок ингредиенты рецептов из корзины."""
+        recipe_ids = list(recipe_ids)
+        self.lock(recipe_ids, [user.pk])
+        if recipe_ids:
+            self._add(
+                'cart.user_id = %s AND cart.recipe_id IN ({})'.format(
+                    ', '.join(['%s'] * len(recipe_ids))
+                ),
+                [user.pk, *recipe_ids]
+            )
+
+    def remove_recipes(self, user, recipe_ids):
+        """Убирает из списка покупок ингредиенты рецептов."""
+        recipe_ids = list(recipe_ids)
+        self.lock(recipe_ids, [user.pk])
+        self._subtract([user.pk], recipe_ids)
+
+    def add_recipe_to_carts(self, recipe, ingredient_ids=None):
+        """
+        Добавляет ингредиенты рецепта в списки покупок всех его корзин.
+        Если передан ingredient_ids, учитываются только эти ингредиенты.
+        """
+        self.lock([recipe.pk])
+        if ingredient_ids is None:
+            self._add('cart.recipe_id = %s', [recipe.pk])
+            return
+        ingredient_ids = list(ingredient_ids)
+        if ingredient_ids:
+            self._add(
+                'cart.recipe_id = %s '
+                'AND recipe_ingredient.ingredient_id IN ({})'.format(
+                    ', '.join(['%s'] * len(ingredient_ids))
+                ),
+                [recipe.pk, *ingredient_ids]
+            )
+
+    def remove_recipe_from_carts(self, recipe, ingredient_ids=None):
+        """
+        Убирает ингредиенты рецепта из списков покупок всех его корзин.
+        Если передан ingredient_ids, учитываются только эти ингредиенты.
+        """
+        self.lock([recipe.pk])
+        self._subtract(
+            UserShoppingCart.objects.filter(recipe=recipe).values('user'),
+            [recipe.pk],
+            ingredient_ids
+        )
+
+    def rebuild(self):
+        """Пересчитывает списки покупок всех пользователей с нуля."""
+        self.all().delete()
+        self._add('1 = 1', [])
+
+
+class UserShoppingList(models.Model):
+    """Итоговое количество ингредиента в списке покупок пользователя."""
+    user = models.ForeignKey(
+        User,
+        on_delete=models.CASCADE,
+        verbose_name='Пользователь'
+    )
+    ingredient = models.ForeignKey(
+        Ingredient,
+        on_delete=models.CASCADE,
+        verbose_name='Ингредиент'
+    )
+    amount = models.PositiveIntegerField('Количество')
+
+    objects = UserShoppingListQuerySet.as_manager()
+
+    class Meta:
+        verbose_name = 'Ингредиент списка покупок'
+        verbose_name_plural = 'Списки покупок'
+        default_related_name = 'shoppinglist'
+        ordering = ('user', 'ingredient')
+        constraints = [
+            models.UniqueConstraint(
+                fields=('user', 'ingredient'),
+                name='user_ingredient_shoppinglist_unique'
+            )
+        ]
+
+    def __str__(self):
+        return f'{self.user} {self.ingredient} - {self.amount}'
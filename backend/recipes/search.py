@@ -0,0 +1,173 @@
+import re
+
+from django.apps import apps
+from django.conf import settings
+from django.db import connections
+from django.db.models import Q
+from django.db.models.expressions import RawSQL
+
+SEARCH_TABLE = 'recipes_recipe_search'
+SEARCH_MAX_TERMS = 10
+
+# Ключ документа, условие совпадения и релевантность для каждой СУБД.
+# В PostgreSQL документ хранится в столбце tsvector с индексом GIN,
+# в SQLite - в виртуальной таблице FTS5, где rowid равен id рецепта.
+SEARCH_SQL = {
+    'postgresql': {
+        'key': 'recipe_id',
+        'match': 'document @@ to_tsquery(%s, %s)',
+        'rank': 'ts_rank(document, to_tsquery(%s, %s))',
+    },
+    'sqlite': {
+        'key': 'rowid',
+        'match': f'{SEARCH_TABLE} MATCH %s',
+        'rank': f'-bm25({SEARCH_TABLE}, 10.0, 5.0, 1.0)',
+    },
+}
+
+
+def update_documents(connection, where, params):
+    """
+    Пересобирает поисковые документы рецептов, отобранных условием where
+    по таблице recipe: название, названия ингредиентов и описание.
+    """
+    if connection.vendor not in SEARCH_SQL:
+        return
+    Recipe = apps.get_model('recipes', 'Recipe')
+    RecipeIngredient = apps.get_model('recipes', 'RecipeIngredient')
+    Ingredient = apps.get_model('recipes', 'Ingredient')
+    source = (
+        f'FROM {Recipe._meta.db_table} AS recipe '
+        f'LEFT JOIN {RecipeIngredient._meta.db_table} AS recipe_ingredient '
+        'ON recipe_ingredient.recipe_id = recipe.id '
+        f'LEFT JOIN {Ingredient._meta.db_table} AS ingredient '
+        'ON ingredient.id = recipe_ingredient.ingredient_id '
+        f'WHERE {where} GROUP BY recipe.id'
+    )
+    with connection.cursor() as cursor:
+        if connection.vendor == 'postgresql':
+            config = settings.SEARCH_CONFIG
+            cursor.execute(
+                f'INSERT INTO {SEARCH_TABLE} (recipe_id, document) '
+                'SELECT recipe.id, '
+                "setweight(to_tsvector(%s, recipe.name), 'A') || "
+                'setweight(to_tsvector(%s, '
+                "coalesce(string_agg(ingredient.name, ' '), '')), 'B') || "
+                "setweight(to_tsvector(%s, recipe.text), 'C') "
+                f'{source} '
+                'ON CONFLICT (recipe_id) '
+                'DO UPDATE SET document = excluded.document',
+                [config, config, config, *params]
+            )
+        else:
+            cursor.execute(
+                f'DELETE FROM {SEARCH_TABLE} WHERE rowid IN '
+                f'(SELECT recipe.id {source})',
+                params
+            )
+            cursor.execute(
+                f'INSERT INTO {SEARCH_TABLE} '
+                '(rowid, name, ingredients, text) '
+                'SELECT recipe.id, recipe.name, '
+                "coalesce(group_concat(ingredient.name, ' '), ''), "
+                f'recipe.text {source}',
+                params
+            )
+
+
+def placeholders(values):
+    return ', '.join(['%s'] * len(values))
+
+
+def refresh_recipes(recipe_ids, using='default'):
+    """Обновляет поисковые документы рецептов."""
+    recipe_ids = list(recipe_ids)
+    if recipe_ids:
+        update_documents(
+            connections[using],
+            f'recipe.id IN ({placeholders(recipe_ids)})',
+            recipe_ids
+        )
+
+
+def refresh_ingredients(ingredient_ids, using='default'):
+    """Обновляет поисковые документы рецептов с этими ингредиентами."""
+    ingredient_ids = list(ingredient_ids)
+    if not ingredient_ids:
+        return
+    RecipeIngredient = apps.get_model('recipes', 'RecipeIngredient')
+    update_documents(
+        connections[using],
+        'recipe.id IN (SELECT recipe_id FROM '
+        f'{RecipeIngredient._meta.db_table} WHERE ingredient_id IN '
+        f'({placeholders(ingredient_ids)}))',
+        ingredient_ids
+    )
+
+
+def rebuild(using='default'):
+    """Пересобирает поисковые документы всех рецептов."""
+    update_documents(connections[using], '1 = 1', [])
+
+
+def delete_recipes(recipe_ids, using='default'):
+    """Удаляет поисковые документы рецептов."""
+    connection = connections[using]
+    recipe_ids = list(recipe_ids)
+    if not recipe_ids or connection.vendor not in SEARCH_SQL:
+        return
+    with connection.cursor() as cursor:
+        cursor.execute(
+            f'DELETE FROM {SEARCH_TABLE} '
+            f'WHERE {SEARCH_SQL[connection.vendor]["key"]} '
+            f'IN ({placeholders(recipe_ids)})',
+            recipe_ids
+        )
+
+
+def search_terms(query):
+    """Возвращает слова поискового запроса без служебных символов."""
+    return re.findall(r'\w+', query.lower())[:SEARCH_MAX_TERMS]
+
+
+def search(queryset, query):
+    """
+    Оставляет рецепты, подходящие под запрос query, и аннотирует их
+    релевантностью search_rank (чем больше, тем выше в выдаче).
+    Каждое слово запроса ищется как префикс, все слова обязательны.
+    """
+    terms = search_terms(query)
+    if not terms:
+        return queryset.annotate(search_rank=RawSQL('0', [])).none()
+    vendor = connections[queryset.db].vendor
+    if vendor not in SEARCH_SQL:
+        condition = Q()
+        for term in terms:
+            condition &= (
+                Q(name__icontains=term) | Q(text__icontains=term)
+                | Q(ingredients__name__icontains=term)
+            )
+        return queryset.filter(pk__in=queryset.model.objects.filter(
+            condition
+        ).values('pk')).annotate(
+            search_rank=RawSQL('0', [])
+        )
+    sql = SEARCH_SQL[vendor]
+    if vendor == 'postgresql':
+        params = [
+            settings.SEARCH_CONFIG,
+            ' & '.join(f'{term}:*' for term in terms),
+        ]
+        rank_params = params * 2
+    else:
+        params = [' '.join(f'"{term}"*' for term in terms)]
+        rank_params = params
+    table = queryset.model._meta.db_table
+    return queryset.filter(pk__in=RawSQL(
+        f'SELECT {sql["key"]} FROM {SEARCH_TABLE} WHERE {sql["match"]}',
+        params
+    )).annotate(search_rank=RawSQL(
+        f'SELECT {sql["rank"]} FROM {SEARCH_TABLE} '
+        f'WHERE {sql["match"]} AND {sql["key"]} = {table}.id',
+        rank_params
+    ))
@@ -0,0 +1,132 @@
+from django.conf import settings
+from django.contrib.auth import get_user_model
+from django.db import transaction
+from django.db.models.signals import post_delete, post_save, pre_delete
+from django.dispatch import receiver
+
+from recipes import search
+from recipes.images import delete_variants, schedule_variants
+from recipes.models import (Ingredient, Recipe, RecipeIngredient,
+                            UserFavorites, UserShoppingCart,
+                            UserShoppingList, change_counter)
+
+User = get_user_model()
+
+SEARCH_FIELDS = {'name', 'text'}
+
+
+@receiver(pre_delete, sender=Recipe)
+def recipe_deleted(sender, instance, **kwargs):
+    """Убирает удаляемый рецепт из списков покупок."""
+    UserShoppingList.objects.remove_recipe_from_carts(instance)
+
+
+@receiver(post_save, sender=Recipe)
+def recipe_saved(sender, instance, **kwargs):
+    """
+    Удаляет уменьшенные копии прежнего фото рецепта и запускает
+    создание копий нового.
+    """
+    variants = instance.image_variants
+    if instance.image and variants.get('source') == instance.image.name:
+        return
+    pk, source = instance.pk, instance.image.name
+    if len(variants) > 1:
+        transaction.on_commit(lambda: forget_variants(pk, variants))
+    if settings.IMAGE_VARIANTS_WORKERS and source:
+        transaction.on_commit(lambda: schedule_variants(pk, source))
+
+
+def forget_variants(pk, variants):
+    """Удаляет копии прежнего фото и убирает их имена у рецепта."""
+    Recipe.objects.filter(
+        pk=pk, image_variants__source=variants['source']
+    ).update(image_variants={})
+    delete_variants(variants)
+
+
+@receiver(post_delete, sender=Recipe)
+def recipe_image_deleted(sender, instance, **kwargs):
+    """Удаляет уменьшенные копии фото удаленного рецепта."""
+    variants = instance.image_variants
+    if len(variants) > 1:
+        transaction.on_commit(lambda: delete_variants(variants))
+
+
+@receiver(post_save, sender=Recipe)
+def recipe_created(sender, instance, created, **kwargs):
+    """Увеличивает счетчик рецептов автора."""
+    if created:
+        change_counter(
+            User.objects.filter(pk=instance.author_id), 'recipes_count', 1
+        )
+
+
+@receiver(post_delete, sender=Recipe)
+def recipe_removed(sender, instance, **kwargs):
+    """Уменьшает счетчик рецептов автора."""
+    change_counter(
+        User.objects.filter(pk=instance.author_id), 'recipes_count', -1
+    )
+
+
+@receiver(post_save, sender=UserFavorites)
+@receiver(post_save, sender=UserShoppingCart)
+def recipe_list_added(sender, instance, created, **kwargs):
+    """Увеличивает счетчик добавлений рецепта в избранное или корзину."""
+    if created:
+        change_counter(
+            Recipe.objects.filter(pk=instance.recipe_id),
+            sender.recipe_counter,
+            1
+        )
+
+
+@receiver(post_delete, sender=UserFavorites)
+@receiver(post_delete, sender=UserShoppingCart)
+def recipe_list_removed(sender, instance, **kwargs):
+    """Уменьшает счетчик добавлений рецепта в избранное или корзину."""
+    change_counter(
+        Recipe.objects.filter(pk=instance.recipe_id),
+        sender.recipe_counter,
+        -1
+    )
+
+
+@receiver(post_save, sender=Recipe)
+def recipe_search_changed(sender, instance, update_fields, **kwargs):
+    """Обновляет поисковый документ рецепта после сохранения."""
+    if update_fields and not SEARCH_FIELDS & set(update_fields):
+        return
+    recipe_ids, using = [instance.pk], kwargs['using']
+    transaction.on_commit(
+        lambda: search.refresh_recipes(recipe_ids, using), using=using
+    )
+
+
+@receiver(post_save, sender=RecipeIngredient)
+@receiver(post_delete, sender=RecipeIngredient)
+def recipe_ingredient_search_changed(sender, instance, **kwargs):
+    """Обновляет поисковый документ после изменения ингредиентов."""
+    recipe_ids, using = [instance.recipe_id], kwargs['using']
+    transaction.on_commit(
+        lambda: search.refresh_recipes(recipe_ids, using), using=using
+    )
+
+
+@receiver(post_save, sender=Ingredient)
+def ingredient_search_changed(sender, instance, created, **kwargs):
+    """Обновляет документы рецептов с переименованным ингредиентом."""
+    if created:
+        return
+    ingredient_ids, using = [instance.pk], kwargs['using']
+    transaction.on_commit(
+        lambda: search.refresh_ingredients(ingredient_ids, using),
+        using=using
+    )
+
+
+@receiver(post_delete, sender=Recipe)
+def recipe_search_deleted(sender, instance, **kwargs):
+    """Удаляет поисковый документ рецепта."""
+    search.delete_recipes([instance.pk], kwargs['using'])
@@ -0,0 +1,106 @@
+import pytest
+from django.contrib.auth import get_user_model
+from django.core.cache import caches
+from rest_framework.authtoken.models import Token
+from rest_framework.test import APIClient
+
+from recipes.models import Ingredient, Recipe, RecipeIngredient, Tag
+
+User = get_user_model()
+
+
+@pytest.fixture(autouse=True)
+def test_settings(settings, tmp_path):
+    """
+    Все тесты работают в режиме N_PLUS_ONE_MODE=raise и проверяют
+    каждый запрос: повтор запроса на каждую строку сразу роняет тест.
+    Кэш idempotency остается таблицей тестовой базы, как в работе.
+    """
+    settings.N_PLUS_ONE_MODE = 'raise'
+    settings.N_PLUS_ONE_SAMPLE_RATE = 1
+    settings.SERVER_TIMING_SAMPLE_RATE = 0
+    settings.IMAGE_VARIANTS_WORKERS = 0
+    settings.MEDIA_ROOT = str(tmp_path)
+    local = ('default', 'recipes', 'versions')
+    settings.CACHES = {
+        **settings.CACHES,
+        **{
+            alias: {
+                'BACKEND': 'django.core.cache.backends.locmem.LocMemCache',
+                'LOCATION': f'test-{alias}',
+            }
+            for alias in local
+        },
+    }
+    yield
+    for alias in local:
+        caches[alias].clear()
+
+
+def make_client(user=None):
+    client = APIClient()
+    if user is not None:
+        token, _ = Token.objects.get_or_create(user=user)
+        client.credentials(HTTP_AUTHORIZATION=f'Token {token.key}')
+    return client
+
+
+@pytest.fixture
+def user(db):
+    return User.objects.create_user(
+        email='cook@example.com', username='cook', first_name='Имя',
+        last_name='Фамилия', password='cook-Pa55word'
+    )
+
+
+@pytest.fixture
+def client(user):
+    return make_client(user)
+
+
+@pytest.fixture
+def author(db):
+    return User.objects.create_user(
+        email='author@example.com', username='author', first_name='Имя',
+        last_name='Автор', password='author-Pa55word'
+    )
+
+
+@pytest.fixture
+def author_client(author):
+    return make_client(author)
+
+
+@pytest.fixture
+def tags(db):
+    return [
+        Tag.objects.create(name=slug, slug=slug, color=f'#00000{number}')
+        for number, slug in enumerate(('breakfast', 'lunch', 'dinner'))
+    ]
+
+
+@pytest.fixture
+def ingredients(db):
+    return [
+        Ingredient.objects.create(
+            name=name, measurement_unit='г'
+        )
+        for name in ('мука', 'сахар', 'соль', 'масло')
+    ]
+
+
+@pytest.fixture
+def make_recipe(author, tags):
+    """Создает рецепт автора с количествами {ингредиент: количество}."""
+    def make_recipe(amounts, name='Рецепт', text='Описание', **fields):
+        recipe = Recipe.objects.create(
+            author=fields.pop('author', author), name=name, text=text,
+            cooking_time=10, image='recipes/images/test.jpg', **fields
+        )
+        recipe.tags.set(tags[:1])
+        for ingredient, amount in amounts.items():
+            RecipeIngredient.objects.create(
+                recipe=recipe, ingredient=ingredient, amount=amount
+            )
+        return recipe
+    return make_recipe
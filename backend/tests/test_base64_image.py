@@ -0,0 +1,135 @@
+import base64
+import io
+import os
+
+import pytest
+from django.core.exceptions import ValidationError as DjangoValidationError
+from django.core.files.uploadedfile import (InMemoryUploadedFile,
+                                            TemporaryUploadedFile)
+from PIL import Image
+from rest_framework.exceptions import ValidationError
+
+from api.constants import IMAGE_TOO_LARGE
+from api.utils import Base64ImageField
+from recipes.models import Recipe
+from tests.utils import image_data_uri
+
+
+def decode(data):
+    field = Base64ImageField()
+    return field, field.run_validation(data)
+
+
+def errors(data):
+    """
+    Ошибки проверки data. Испорченное после заголовка изображение
+    отклоняет ImageField Django, и его ошибку сериализатор
+    превращает в ответ 400 так же, как ошибку DRF.
+    """
+    with pytest.raises((ValidationError, DjangoValidationError)) as error:
+        decode(data)
+    if isinstance(error.value, DjangoValidationError):
+        return error.value.messages
+    return error.value.detail
+
+
+def invalid_image():
+    return [Base64ImageField().error_messages['invalid_image']]
+
+
+def test_valid_upload_in_memory():
+    data = image_data_uri((16, 16))
+    source = base64.b64decode(data.split(',', 1)[1])
+
+    field, file = decode(data)
+
+    assert isinstance(file, InMemoryUploadedFile)
+    assert file.name == 'temp.png'
+    assert file.size == len(source)
+    assert file.read() == source
+
+
+def test_whitespace_in_base64_is_allowed():
+    data = image_data_uri((16, 16))
+    prefix, encoded = data.split(',', 1)
+    wrapped = '\n'.join(
+        encoded[position:position + 76]
+        for position in range(0, len(encoded), 76)
+    )
+
+    field, file = decode(f'{prefix},{wrapped}\n')
+
+    assert file.read() == base64.b64decode(encoded)
+
+
+def test_large_upload_spills_to_temporary_file(settings):
+    settings.FILE_UPLOAD_MAX_MEMORY_SIZE = 64
+    data = image_data_uri((64, 64))
+
+    field, file = decode(data)
+
+    try:
+        assert isinstance(file, TemporaryUploadedFile)
+        assert os.path.exists(file.temporary_file_path())
+        assert file.read() == base64.b64decode(data.split(',', 1)[1])
+    finally:
+        file.close()
+
+
+@pytest.mark.parametrize('limit', (
+    'IMAGE_MAX_DECODED_SIZE', 'IMAGE_MAX_ENCODED_SIZE'
+))
+def test_size_limit(settings, limit):
+    setattr(settings, limit, 100)
+
+    assert errors(image_data_uri((64, 64))) == [IMAGE_TOO_LARGE]
+
+
+def test_pixel_limit(settings):
+    settings.IMAGE_MAX_PIXELS = 32 * 32
+
+    assert errors(image_data_uri((32, 33))) == [IMAGE_TOO_LARGE]
+    assert decode(image_data_uri((32, 32)))[1].size
+
+
+@pytest.mark.parametrize('payload', (
+    base64.b64encode(b'not an image at all' * 10).decode(),
+    base64.b64encode(b'').decode(),
+    'not-base64!',
+    image_data_uri().split(',', 1)[1][:-3],
+))
+def test_non_image_payload(payload):
+    assert errors(f'data:image/png;base64,{payload}') == invalid_image()
+
+
+def test_missing_separator():
+    assert errors('data:image/png,abcd') == invalid_image()
+
+
+def test_truncated_image_is_rejected():
+    buffer = io.BytesIO()
+    Image.new('RGB', (64, 64), (1, 2, 3)).save(buffer, 'PNG')
+    payload = base64.b64encode(buffer.getvalue()[:60]).decode()
+
+    assert errors(f'data:image/png;base64,{payload}') == invalid_image()
+
+
+def test_recipe_upload_from_temporary_file(
+    author_client, settings, tags, ingredients
+):
+    settings.FILE_UPLOAD_MAX_MEMORY_SIZE = 64
+
+    response = author_client.post('/api/recipes/', {
+        'ingredients': [{'id': ingredients[0].pk, 'amount': 10}],
+        'tags': [tags[0].pk],
+        'image': image_data_uri((64, 64), 'JPEG'),
+        'name': 'Пирог',
+        'text': 'Описание',
+        'cooking_time': 30,
+    }, format='json')
+
+    assert response.status_code == 201
+    image = Recipe.objects.get(pk=response.data['id']).image
+    assert image.name.endswith('.jpeg')
+    with Image.open(image.path) as stored:
+        assert stored.size == (64, 64)
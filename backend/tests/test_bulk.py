@@ -0,0 +1,141 @@
+import pytest
+from rest_framework.test import APIClient
+
+from api.constants import (BULK_ADDED, BULK_EXISTS, BULK_NOT_FOUND,
+                           BULK_RECIPES_LIMIT, BULK_REMOVED)
+from recipes.models import (Recipe, UserFavorites, UserShoppingCart,
+                            UserShoppingList)
+
+LISTS = (
+    ('favorite', UserFavorites, 'favorites_count'),
+    ('shopping_cart', UserShoppingCart, 'shopping_cart_count'),
+)
+
+
+@pytest.fixture
+def recipes(ingredients, make_recipe):
+    flour, sugar, salt, butter = ingredients
+    return [
+        make_recipe({flour: 100, sugar: 50}, name='Пирог'),
+        make_recipe({flour: 20}, name='Блины'),
+        make_recipe({salt: 5}, name='Суп'),
+    ]
+
+
+def statuses(response):
+    return [(item['id'], item['status']) for item in response.data['recipes']]
+
+
+def counters(field):
+    return dict(Recipe.objects.values_list('name', field))
+
+
+@pytest.mark.parametrize('action, model, field', LISTS)
+def test_bulk_add_statuses_and_counters(
+    client, user, recipes, action, model, field
+):
+    pie, pancakes, soup = recipes
+    client.post(f'/api/recipes/{pancakes.pk}/{action}/')
+    missing = soup.pk + 1000
+
+    response = client.post(
+        f'/api/recipes/{action}/',
+        {'recipes': [pie.pk, pancakes.pk, missing, pie.pk]},
+        format='json'
+    )
+
+    assert response.status_code == 200
+    assert statuses(response) == [
+        (pie.pk, BULK_ADDED),
+        (pancakes.pk, BULK_EXISTS),
+        (missing, BULK_NOT_FOUND),
+    ]
+    assert set(
+        model.objects.filter(user=user).values_list('recipe', flat=True)
+    ) == {pie.pk, pancakes.pk}
+    assert counters(field) == {'Пирог': 1, 'Блины': 1, 'Суп': 0}
+
+
+@pytest.mark.parametrize('action, model, field', LISTS)
+def test_bulk_remove_statuses_and_counters(
+    client, author_client, user, recipes, action, model, field
+):
+    pie, pancakes, soup = recipes
+    for recipe in recipes:
+        client.post(f'/api/recipes/{recipe.pk}/{action}/')
+    author_client.post(f'/api/recipes/{pie.pk}/{action}/')
+    missing = soup.pk + 1000
+
+    response = client.delete(
+        f'/api/recipes/{action}/', {'recipes': [pie.pk, missing]},
+        format='json'
+    )
+
+    assert response.status_code == 200
+    assert statuses(response) == [
+        (pie.pk, BULK_REMOVED), (missing, BULK_NOT_FOUND)
+    ]
+    assert counters(field) == {'Пирог': 1, 'Блины': 1, 'Суп': 1}
+
+    response = client.delete(f'/api/recipes/{action}/')
+
+    assert response.status_code == 200
+    assert statuses(response) == sorted([
+        (pancakes.pk, BULK_REMOVED), (soup.pk, BULK_REMOVED)
+    ])
+    assert not model.objects.filter(user=user).exists()
+    assert counters(field) == {'Пирог': 1, 'Блины': 0, 'Суп': 0}
+
+
+def test_bulk_shopping_cart_updates_shopping_list(client, user, recipes):
+    pie, pancakes, soup = recipes
+
+    client.post(
+        '/api/recipes/shopping_cart/',
+        {'recipes': [pie.pk, pancakes.pk, soup.pk]}, format='json'
+    )
+    client.delete(
+        '/api/recipes/shopping_cart/', {'recipes': [pie.pk]}, format='json'
+    )
+
+    assert dict(
+        UserShoppingList.objects.filter(user=user).values_list(
+            'ingredient__name', 'amount'
+        )
+    ) == {'мука': 20, 'соль': 5}
+
+
+@pytest.mark.parametrize('action', ('favorite', 'shopping_cart'))
+@pytest.mark.parametrize('method', ('post', 'delete'))
+def test_bulk_limit(client, recipes, action, method):
+    url = f'/api/recipes/{action}/'
+    ids = list(range(1, BULK_RECIPES_LIMIT + 2))
+
+    response = getattr(client, method)(url, {'recipes': ids}, format='json')
+
+    assert response.status_code == 400
+    assert 'recipes' in response.data
+    response = getattr(client, method)(
+        url, {'recipes': ids[:BULK_RECIPES_LIMIT]}, format='json'
+    )
+    assert response.status_code == 200
+    assert len(response.data['recipes']) == BULK_RECIPES_LIMIT
+
+
+@pytest.mark.parametrize('action', ('favorite', 'shopping_cart'))
+def test_bulk_requires_recipes(client, action):
+    response = client.post(
+        f'/api/recipes/{action}/', {'recipes': []}, format='json'
+    )
+
+    assert response.status_code == 400
+    assert 'recipes' in response.data
+
+
+def test_bulk_requires_authentication(recipes):
+    response = APIClient().post(
+        '/api/recipes/favorite/', {'recipes': [recipes[0].pk]},
+        format='json'
+    )
+
+    assert response.status_code == 401
@@ -0,0 +1,124 @@
+import pytest
+from django.core.cache import caches
+
+from api.cache import (RECIPES_VERSION, bump_versions, finish_request,
+                       get_versions, start_request)
+from api.checks import check_cache_tables
+
+
+@pytest.fixture
+def recipe(ingredients, make_recipe):
+    return make_recipe({ingredients[0]: 100})
+
+
+def recipe_data(response):
+    data = response.json()
+    return data['results'][0] if 'results' in data else data
+
+
+def get(client, url, etag=None):
+    if etag is None:
+        return client.get(url)
+    return client.get(url, HTTP_IF_NONE_MATCH=etag)
+
+
+def favorite(client, author_client, recipe, tags):
+    client.post(f'/api/recipes/{recipe.pk}/favorite/')
+    return 'is_favorited', True
+
+
+def edit_recipe(client, author_client, recipe, tags):
+    author_client.patch(
+        f'/api/recipes/{recipe.pk}/', {'name': 'Новое название'},
+        format='json'
+    )
+    return 'name', 'Новое название'
+
+
+def edit_author(client, author_client, recipe, tags):
+    author_client.patch(
+        '/api/users/me/', {'first_name': 'Новое'}, format='json'
+    )
+    return 'author', 'Новое'
+
+
+def edit_tag(client, author_client, recipe, tags):
+    tags[0].name = 'Завтрак'
+    tags[0].save()
+    return 'tags', 'Завтрак'
+
+
+def field(data, name):
+    if name == 'author':
+        return data['author']['first_name']
+    if name == 'tags':
+        return data['tags'][0]['name']
+    return data[name]
+
+
+@pytest.mark.parametrize('url', ['/api/recipes/{}/', '/api/recipes/'])
+@pytest.mark.parametrize(
+    'change', [favorite, edit_recipe, edit_author, edit_tag]
+)
+def test_etag_changes_after_change(
+    client, author_client, recipe, tags, url, change,
+    django_capture_on_commit_callbacks
+):
+    url = url.format(recipe.pk)
+    response = get(client, url)
+    assert response.status_code == 200
+    etag = response['ETag']
+    assert get(client, url, etag).status_code == 304
+
+    with django_capture_on_commit_callbacks(execute=True):
+        name, value = change(client, author_client, recipe, tags)
+
+    response = get(client, url, etag)
+    assert response.status_code == 200
+    assert response['ETag'] != etag
+    assert field(recipe_data(response), name) == value
+    assert get(client, url, response['ETag']).status_code == 304
+
+
+def test_versions_read_once_per_request(client, recipe, monkeypatch):
+    cache = caches['versions']
+    get_many = cache.get_many
+    fetched = []
+
+    def counting_get_many(keys, *args, **kwargs):
+        fetched.extend(keys)
+        return get_many(keys, *args, **kwargs)
+
+    monkeypatch.setattr(cache, 'get_many', counting_get_many)
+    for url in (f'/api/recipes/{recipe.pk}/', '/api/recipes/'):
+        fetched.clear()
+        assert client.get(url).status_code == 200
+        assert fetched
+        assert len(fetched) == len(set(fetched))
+
+
+def test_bumped_versions_seen_in_same_request(db):
+    start_request()
+    try:
+        version = get_versions([RECIPES_VERSION])[RECIPES_VERSION]
+        bump_versions([RECIPES_VERSION])
+        bumped = get_versions([RECIPES_VERSION])[RECIPES_VERSION]
+        assert bumped != version
+        assert bumped == caches['versions'].get(RECIPES_VERSION)
+    finally:
+        finish_request()
+
+
+def test_cache_tables_check(db, settings):
+    assert check_cache_tables(None, databases=['default']) == []
+    settings.CACHES = {
+        **settings.CACHES,
+        'missing': {
+            'BACKEND': 'django.core.cache.backends.db.DatabaseCache',
+            'LOCATION': 'cache_missing',
+        },
+    }
+    assert check_cache_tables(None) == []
+    errors = check_cache_tables(None, databases=['default'])
+    assert [error.id for error in errors] == ['api.E001']
+    assert 'cache_missing' in errors[0].msg
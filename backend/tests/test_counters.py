@@ -0,0 +1,116 @@
+from io import StringIO
+
+import pytest
+from django.contrib.auth import get_user_model
+from django.core.management import CommandError, call_command
+
+from recipes.models import Recipe
+from tests.utils import image_data_uri
+
+User = get_user_model()
+
+
+def verify():
+    stdout = StringIO()
+    call_command('reconcile_counters', '--verify', stdout=stdout)
+    return stdout.getvalue()
+
+
+def recipe_counters(recipe):
+    return Recipe.objects.values_list(
+        'favorites_count', 'shopping_cart_count'
+    ).get(pk=recipe.pk)
+
+
+def user_counters(user):
+    return User.objects.values_list(
+        'recipes_count', 'followers_count'
+    ).get(pk=user.pk)
+
+
+@pytest.fixture
+def recipe(ingredients, make_recipe):
+    return make_recipe({ingredients[0]: 100})
+
+
+def test_recipe_counters_single_and_bulk(
+    client, author_client, recipe
+):
+    for action in ('favorite', 'shopping_cart'):
+        client.post(f'/api/recipes/{recipe.pk}/{action}/')
+        author_client.post(
+            f'/api/recipes/{action}/', {'recipes': [recipe.pk]},
+            format='json'
+        )
+    assert recipe_counters(recipe) == (2, 2)
+
+    client.delete(f'/api/recipes/{recipe.pk}/favorite/')
+    author_client.delete(
+        '/api/recipes/shopping_cart/', {'recipes': [recipe.pk]},
+        format='json'
+    )
+    assert recipe_counters(recipe) == (1, 1)
+    assert 'Счетчики проверены' in verify()
+
+
+def test_user_counters(client, author_client, author, tags, ingredients):
+    response = author_client.post('/api/recipes/', {
+        'ingredients': [{'id': ingredients[0].pk, 'amount': 10}],
+        'tags': [tags[0].pk],
+        'image': image_data_uri(),
+        'name': 'Пирог',
+        'text': 'Описание',
+        'cooking_time': 30,
+    }, format='json')
+    assert response.status_code == 201
+    client.post(f'/api/users/{author.pk}/subscribe/')
+    assert user_counters(author) == (1, 1)
+
+    author_client.delete(f'/api/recipes/{response.data["id"]}/')
+    client.delete(f'/api/users/{author.pk}/subscribe/')
+    assert user_counters(author) == (0, 0)
+    assert 'Счетчики проверены' in verify()
+
+
+def test_deleting_user_updates_counters(client, user, author, recipe):
+    client.post(f'/api/recipes/{recipe.pk}/favorite/')
+    client.post(f'/api/recipes/{recipe.pk}/shopping_cart/')
+    client.post(f'/api/users/{author.pk}/subscribe/')
+
+    user.delete()
+
+    assert recipe_counters(recipe) == (0, 0)
+    assert user_counters(author) == (1, 0)
+    assert 'Счетчики проверены' in verify()
+
+
+def test_full_save_keeps_counters(client, author, recipe):
+    stale_recipe = Recipe.objects.get(pk=recipe.pk)
+    stale_author = User.objects.get(pk=author.pk)
+    deferred = Recipe.objects.only('name').get(pk=recipe.pk)
+    client.post(f'/api/recipes/{recipe.pk}/favorite/')
+    client.post(f'/api/users/{author.pk}/subscribe/')
+
+    stale_recipe.name = 'Новое имя'
+    stale_recipe.save()
+    stale_author.first_name = 'Новое'
+    stale_author.save()
+    deferred.name = 'Еще одно имя'
+    deferred.save()
+
+    assert recipe_counters(recipe) == (1, 0)
+    assert user_counters(author) == (1, 1)
+    recipe.refresh_from_db()
+    assert recipe.name == 'Еще одно имя'
+    assert 'Счетчики проверены' in verify()
+
+
+def test_reconcile_fixes_drift(client, recipe):
+    client.post(f'/api/recipes/{recipe.pk}/favorite/')
+    Recipe.objects.filter(pk=recipe.pk).update(favorites_count=5)
+
+    with pytest.raises(CommandError, match='Расхождений в счетчиках: 1'):
+        verify()
+    call_command('reconcile_counters', stdout=StringIO())
+    assert recipe_counters(recipe) == (1, 0)
+    assert 'Счетчики проверены' in verify()
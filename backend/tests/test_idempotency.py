@@ -0,0 +1,91 @@
+import pytest
+from django.core.cache import caches
+from django.db import IntegrityError
+from rest_framework import serializers
+
+from api.constants import (IDEMPOTENCY_IN_PROGRESS, RECIPE_EXISTS,
+                           SUBSCRIBE_EXISTS)
+from api.idempotency import IDEMPOTENCY_LOCK, idempotency_key
+from api.serializers import UserFavoritesSerializer
+from recipes.models import UserFavorites, UserShoppingCart
+
+KEY = 'a3c1a0d6-5b7e-4f0e-9a55-6c0f6c1f4b1e'
+
+
+@pytest.fixture
+def recipe(ingredients, make_recipe):
+    return make_recipe({ingredients[0]: 100})
+
+
+@pytest.mark.parametrize('action', ('favorite', 'shopping_cart'))
+def test_duplicate_recipe_returns_400(client, recipe, action):
+    url = f'/api/recipes/{recipe.pk}/{action}/'
+
+    assert client.post(url).status_code == 201
+    response = client.post(url)
+
+    assert response.status_code == 400
+    assert response.data == RECIPE_EXISTS
+
+
+def test_duplicate_subscribe_returns_400(client, author):
+    url = f'/api/users/{author.pk}/subscribe/'
+
+    assert client.post(url).status_code == 201
+    response = client.post(url)
+
+    assert response.status_code == 400
+    assert response.data == SUBSCRIBE_EXISTS
+
+
+def test_other_integrity_errors_are_raised(user, recipe, monkeypatch):
+    def create(self, validated_data):
+        raise IntegrityError('FOREIGN KEY constraint failed')
+
+    monkeypatch.setattr(serializers.ModelSerializer, 'create', create)
+    serializer = UserFavoritesSerializer(data={})
+    serializer.is_valid(raise_exception=True)
+
+    with pytest.raises(IntegrityError):
+        serializer.save(user=user, recipe=recipe)
+    assert not UserFavorites.objects.exists()
+
+
+def test_replay_returns_stored_response(client, user, recipe):
+    url = f'/api/recipes/{recipe.pk}/shopping_cart/'
+
+    first = client.post(url, HTTP_IDEMPOTENCY_KEY=KEY)
+    replay = client.post(url, HTTP_IDEMPOTENCY_KEY=KEY)
+
+    assert first.status_code == replay.status_code == 201
+    assert replay.data == first.data
+    assert replay['Idempotent-Replayed'] == 'true'
+    assert 'Idempotent-Replayed' not in first
+    assert UserShoppingCart.objects.filter(user=user).count() == 1
+
+
+def test_replay_keys_are_per_user(client, author_client, recipe):
+    url = f'/api/recipes/{recipe.pk}/favorite/'
+
+    client.post(url, HTTP_IDEMPOTENCY_KEY=KEY)
+    response = author_client.post(url, HTTP_IDEMPOTENCY_KEY=KEY)
+
+    assert response.status_code == 201
+    assert 'Idempotent-Replayed' not in response
+    assert UserFavorites.objects.count() == 2
+
+
+def test_request_in_progress_returns_409(client, user, recipe, rf):
+    url = f'/api/recipes/{recipe.pk}/favorite/'
+    request = rf.post(url)
+    request.user = user
+    key = idempotency_key(request, KEY)
+    cache = caches['idempotency']
+    assert cache.add(IDEMPOTENCY_LOCK.format(key), True)
+    assert not cache.add(IDEMPOTENCY_LOCK.format(key), True)
+
+    response = client.post(url, HTTP_IDEMPOTENCY_KEY=KEY)
+
+    assert response.status_code == 409
+    assert response.data == IDEMPOTENCY_IN_PROGRESS
+    assert not UserFavorites.objects.exists()
@@ -0,0 +1,50 @@
+import pytest
+
+from api.metrics import metrics_allowed
+
+TOKEN = 'metrics-secret'
+
+
+@pytest.fixture(autouse=True)
+def metrics_settings(settings):
+    settings.METRICS_ALLOWED_IPS = ['127.0.0.1', '10.0.0.0/8']
+    settings.METRICS_TOKEN = TOKEN
+
+
+@pytest.mark.parametrize('meta', (
+    {'REMOTE_ADDR': '192.168.1.10'},
+    {'REMOTE_ADDR': '192.168.1.10', 'HTTP_AUTHORIZATION': 'Bearer wrong'},
+    {'REMOTE_ADDR': '192.168.1.10', 'HTTP_AUTHORIZATION': TOKEN},
+    {'REMOTE_ADDR': 'not-an-address'},
+))
+def test_metrics_rejects_other_clients(rf, meta):
+    assert not metrics_allowed(rf.get('/metrics', **meta))
+
+
+@pytest.mark.parametrize('meta', (
+    {'REMOTE_ADDR': '127.0.0.1'},
+    {'REMOTE_ADDR': '10.1.2.3'},
+    {'REMOTE_ADDR': '192.168.1.10',
+     'HTTP_AUTHORIZATION': f'Bearer {TOKEN}'},
+))
+def test_metrics_allows_listed_clients(rf, meta):
+    assert metrics_allowed(rf.get('/metrics', **meta))
+
+
+def test_metrics_without_token_ignores_empty_bearer(rf, settings):
+    settings.METRICS_TOKEN = ''
+
+    assert not metrics_allowed(rf.get(
+        '/metrics', REMOTE_ADDR='192.168.1.10', HTTP_AUTHORIZATION='Bearer '
+    ))
+
+
+def test_metrics_view(client, settings, db):
+    client.credentials()
+
+    assert client.get(
+        '/metrics', REMOTE_ADDR='192.168.1.10'
+    ).status_code == 403
+    response = client.get('/metrics', REMOTE_ADDR='127.0.0.1')
+    assert response.status_code == 200
+    assert b'foodgram_request_duration_seconds' in response.content
@@ -0,0 +1,77 @@
+import pytest
+
+from api import views
+from api.middleware import NPlusOneError
+from recipes.models import (Ingredient, Recipe, RecipeIngredient,
+                            RecipeQuerySet, Tag, UserShoppingCart,
+                            UserShoppingList)
+
+RECIPES = 8
+
+
+@pytest.fixture
+def recipes(user):
+    tags = [
+        Tag.objects.create(name=slug, slug=slug, color=f'#00000{number}')
+        for number, slug in enumerate(('breakfast', 'lunch'))
+    ]
+    ingredients = [
+        Ingredient.objects.create(
+            name=f'Ингредиент {number}', measurement_unit='г'
+        )
+        for number in range(RECIPES)
+    ]
+    recipes = []
+    for number in range(RECIPES):
+        recipe = Recipe.objects.create(
+            author=user, name=f'Рецепт {number}', text='Описание',
+            cooking_time=10, image='recipes/images/test.jpg'
+        )
+        recipe.tags.set(tags)
+        RecipeIngredient.objects.create(
+            recipe=recipe, ingredient=ingredients[number], amount=number + 1
+        )
+        recipes.append(recipe)
+    return recipes
+
+
+def test_recipe_list_has_no_n_plus_one(client, recipes):
+    response = client.get('/api/recipes/')
+
+    assert response.status_code == 200
+    assert response.data['count'] == RECIPES
+
+
+def test_recipe_list_query_per_recipe_raises(client, recipes, monkeypatch):
+    monkeypatch.setattr(
+        RecipeQuerySet, 'with_related', lambda queryset: queryset.all()
+    )
+
+    with pytest.raises(NPlusOneError) as error:
+        client.get('/api/recipes/')
+
+    message = str(error.value)
+    assert 'повторяется' in message
+    assert 'api/serializers.py' in message
+
+
+def test_streamed_shopping_cart_query_per_row_raises(
+    client, user, recipes, monkeypatch
+):
+    UserShoppingCart.objects.add_recipes(user, [r.pk for r in recipes])
+    UserShoppingList.objects.add_recipes(user, [r.pk for r in recipes])
+
+    def render(ingredients):
+        for ingredient in ingredients:
+            yield Ingredient.objects.get(
+                name=ingredient['ingredient__name']
+            ).measurement_unit
+
+    monkeypatch.setitem(
+        views.SHOPPING_CART_FORMATS, 'txt', ('text/plain', render)
+    )
+    response = client.get('/api/recipes/download_shopping_cart/')
+
+    with pytest.raises(NPlusOneError) as error:
+        b''.join(response.streaming_content)
+    assert 'tests/test_n_plus_one.py' in str(error.value)
@@ -0,0 +1,73 @@
+from datetime import timedelta
+
+import pytest
+from django.utils import timezone
+
+from api.constants import CURSOR_WITH_SEARCH, INVALID_CURSOR
+from recipes.models import Recipe
+
+RECIPES = 13
+
+
+@pytest.fixture
+def recipes(ingredients, make_recipe):
+    """Рецепты, часть которых опубликована в одно и то же время."""
+    now = timezone.now()
+    recipes = []
+    for number in range(RECIPES):
+        recipe = make_recipe(
+            {ingredients[0]: number + 1}, name=f'Рецепт {number}'
+        )
+        Recipe.objects.filter(pk=recipe.pk).update(
+            pub_date=now - timedelta(minutes=number // 3)
+        )
+        recipes.append(recipe)
+    return recipes
+
+
+def walk(client, url):
+    """Проходит страницы по ссылкам next и возвращает id рецептов."""
+    ids = []
+    pages = 0
+    while url:
+        response = client.get(url)
+        assert response.status_code == 200
+        ids.extend(recipe['id'] for recipe in response.data['results'])
+        url = response.data['next']
+        pages += 1
+    return ids, pages
+
+
+def test_cursor_pages_have_no_duplicates_or_gaps(client, recipes):
+    expected = list(Recipe.objects.values_list('pk', flat=True))
+
+    ids, pages = walk(client, '/api/recipes/?cursor=&limit=4')
+
+    assert 'count' not in client.get('/api/recipes/?cursor=').data
+    assert ids == expected
+    assert len(set(ids)) == RECIPES
+    assert pages == 4
+
+
+def test_cursor_matches_page_numbers(client, recipes, tags):
+    Recipe.objects.get(name='Рецепт 5').tags.set(tags[1:2])
+
+    ids, _ = walk(client, '/api/recipes/?cursor=&limit=5&tags=breakfast')
+    numbered, _ = walk(client, '/api/recipes/?limit=5&tags=breakfast')
+
+    assert ids == numbered
+    assert len(ids) == RECIPES - 1
+
+
+def test_cursor_with_search_is_rejected(client, recipes):
+    response = client.get('/api/recipes/?cursor=&search=рецепт')
+
+    assert response.status_code == 400
+    assert response.data == CURSOR_WITH_SEARCH
+
+
+def test_invalid_cursor(client, recipes):
+    response = client.get('/api/recipes/?cursor=broken')
+
+    assert response.status_code == 404
+    assert response.data['detail'] == INVALID_CURSOR
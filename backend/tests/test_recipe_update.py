@@ -0,0 +1,91 @@
+from api.constants import INGREDIENTS_NOT_FOUND
+from recipes.models import RecipeIngredient, UserShoppingList
+from tests.utils import image_data_uri
+
+
+def recipe_ingredients(recipe):
+    return dict(
+        RecipeIngredient.objects.filter(recipe=recipe).values_list(
+            'ingredient__name', 'amount'
+        )
+    )
+
+
+def test_patch_name_keeps_ingredients_and_tags(
+    author_client, ingredients, tags, make_recipe
+):
+    flour, sugar, salt, butter = ingredients
+    recipe = make_recipe({flour: 100, sugar: 50})
+    recipe.tags.set(tags[:2])
+    rows = set(recipe.recipeingredient.values_list('pk', flat=True))
+
+    response = author_client.patch(
+        f'/api/recipes/{recipe.pk}/', {'name': 'Новое имя'}, format='json'
+    )
+
+    assert response.status_code == 200
+    recipe.refresh_from_db()
+    assert recipe.name == 'Новое имя'
+    assert recipe_ingredients(recipe) == {'мука': 100, 'сахар': 50}
+    assert set(recipe.recipeingredient.values_list('pk', flat=True)) == rows
+    assert set(recipe.tags.all()) == set(tags[:2])
+
+
+def test_put_updates_ingredients_and_carts(
+    client, author_client, user, ingredients, tags, make_recipe
+):
+    flour, sugar, salt, butter = ingredients
+    recipe = make_recipe({flour: 100, sugar: 50, salt: 5})
+    kept = recipe.recipeingredient.get(ingredient=salt).pk
+    client.post(f'/api/recipes/{recipe.pk}/shopping_cart/')
+
+    response = author_client.put(
+        f'/api/recipes/{recipe.pk}/',
+        {
+            'ingredients': [
+                {'id': flour.pk, 'amount': 300},
+                {'id': salt.pk, 'amount': 5},
+                {'id': butter.pk, 'amount': 20},
+            ],
+            'tags': [tags[2].pk],
+            'image': image_data_uri(),
+            'name': 'Пирог',
+            'text': 'Новое описание',
+            'cooking_time': 30,
+        },
+        format='json'
+    )
+
+    assert response.status_code == 200
+    assert recipe_ingredients(recipe) == {
+        'мука': 300, 'соль': 5, 'масло': 20
+    }
+    assert recipe.recipeingredient.get(ingredient=salt).pk == kept
+    assert list(recipe.tags.all()) == [tags[2]]
+    assert dict(
+        UserShoppingList.objects.filter(user=user).values_list(
+            'ingredient__name', 'amount'
+        )
+    ) == {'мука': 300, 'соль': 5, 'масло': 20}
+
+
+def test_invalid_ingredients_are_reported_together(
+    author_client, ingredients, make_recipe
+):
+    recipe = make_recipe({ingredients[0]: 100})
+    missing = [ingredient.pk + 1000 for ingredient in ingredients[:3]]
+
+    response = author_client.patch(
+        f'/api/recipes/{recipe.pk}/',
+        {'ingredients': [
+            {'id': ingredients[0].pk, 'amount': 10},
+            *({'id': pk, 'amount': 10} for pk in missing),
+        ]},
+        format='json'
+    )
+
+    assert response.status_code == 400
+    assert response.data['ingredients'] == [INGREDIENTS_NOT_FOUND.format(
+        ', '.join(map(str, missing))
+    )]
+    assert recipe_ingredients(recipe) == {'мука': 100}
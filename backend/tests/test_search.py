@@ -0,0 +1,110 @@
+import pytest
+from django.db import connection
+
+from recipes.models import Ingredient
+from recipes.search import SEARCH_SQL, SEARCH_TABLE
+
+pytestmark = pytest.mark.skipif(
+    connection.vendor not in SEARCH_SQL,
+    reason='Полнотекстовый индекс есть только в PostgreSQL и SQLite'
+)
+
+
+@pytest.fixture
+def recipes(ingredients, make_recipe, django_capture_on_commit_callbacks):
+    flour = ingredients[0]
+    strawberry = Ingredient.objects.create(
+        name='клубника', measurement_unit='г'
+    )
+    with django_capture_on_commit_callbacks(execute=True):
+        return {
+            'name': make_recipe(
+                {flour: 100}, name='Клубника со сливками',
+                text='Десерт за пять минут'
+            ),
+            'ingredient': make_recipe(
+                {flour: 200, strawberry: 50}, name='Пирог',
+                text='Тесто и начинка'
+            ),
+            'text': make_recipe(
+                {flour: 300}, name='Торт',
+                text='Украсить клубникой и сливками'
+            ),
+            'other': make_recipe(
+                {flour: 50}, name='Блины', text='Жарить на сковороде'
+            ),
+        }
+
+
+def search(client, query):
+    response = client.get('/api/recipes/', {'search': query})
+    assert response.status_code == 200
+    return [recipe['id'] for recipe in response.data['results']]
+
+
+def indexed():
+    with connection.cursor() as cursor:
+        cursor.execute(f'SELECT COUNT(*) FROM {SEARCH_TABLE}')
+        return cursor.fetchone()[0]
+
+
+def test_search_ranks_name_over_ingredients_over_text(client, recipes):
+    assert search(client, 'клубник') == [
+        recipes['name'].pk, recipes['ingredient'].pk, recipes['text'].pk
+    ]
+
+
+def test_search_requires_every_word(client, recipes):
+    assert search(client, 'клубник сливк') == [
+        recipes['name'].pk, recipes['text'].pk
+    ]
+    assert search(client, 'клубник сковород') == []
+    assert search(client, '!!!') == []
+
+
+def test_edit_refreshes_index(
+    client, author_client, recipes, ingredients,
+    django_capture_on_commit_callbacks
+):
+    recipe = recipes['other']
+    with django_capture_on_commit_callbacks(execute=True):
+        response = author_client.patch(
+            f'/api/recipes/{recipe.pk}/',
+            {'name': 'Оладьи', 'ingredients': [
+                {'id': ingredients[1].pk, 'amount': 10}
+            ]},
+            format='json'
+        )
+    assert response.status_code == 200
+
+    assert search(client, 'блин') == []
+    assert search(client, 'оладь') == [recipe.pk]
+    assert search(client, 'сахар') == [recipe.pk]
+
+
+def test_ingredient_rename_refreshes_index(
+    client, recipes, django_capture_on_commit_callbacks
+):
+    strawberry = Ingredient.objects.get(name='клубника')
+    with django_capture_on_commit_callbacks(execute=True):
+        strawberry.name = 'малина'
+        strawberry.save()
+
+    assert search(client, 'малин') == [recipes['ingredient'].pk]
+    assert recipes['ingredient'].pk not in search(client, 'клубник')
+
+
+def test_delete_removes_from_index(
+    client, author_client, recipes, django_capture_on_commit_callbacks
+):
+    before = indexed()
+    with django_capture_on_commit_callbacks(execute=True):
+        response = author_client.delete(
+            f'/api/recipes/{recipes["name"].pk}/'
+        )
+    assert response.status_code == 204
+
+    assert indexed() == before - 1
+    assert search(client, 'клубник') == [
+        recipes['ingredient'].pk, recipes['text'].pk
+    ]
@@ -0,0 +1,155 @@
+from io import StringIO
+
+import pytest
+from django.contrib.auth import get_user_model
+from django.core.management import CommandError, call_command
+from django.test import Client
+
+from recipes.models import UserShoppingList
+
+User = get_user_model()
+
+
+def shopping_list(user):
+    return dict(
+        UserShoppingList.objects.filter(user=user).values_list(
+            'ingredient__name', 'amount'
+        )
+    )
+
+
+def verify():
+    stdout = StringIO()
+    call_command('rebuild_shopping_lists', '--verify', stdout=stdout)
+    return stdout.getvalue()
+
+
+@pytest.fixture
+def carts(ingredients, make_recipe):
+    flour, sugar, salt, butter = ingredients
+    return (
+        make_recipe({flour: 100, sugar: 50}, name='Пирог'),
+        make_recipe({flour: 20, butter: 10}, name='Блины'),
+    )
+
+
+def test_cart_add_and_remove(client, user, carts):
+    pie, pancakes = carts
+
+    assert client.post(f'/api/recipes/{pie.pk}/shopping_cart/').status_code \
+        == 201
+    assert client.post(
+        f'/api/recipes/{pancakes.pk}/shopping_cart/'
+    ).status_code == 201
+    assert shopping_list(user) == {'мука': 120, 'сахар': 50, 'масло': 10}
+
+    assert client.delete(
+        f'/api/recipes/{pie.pk}/shopping_cart/'
+    ).status_code == 204
+    assert shopping_list(user) == {'мука': 20, 'масло': 10}
+
+    assert client.delete(
+        f'/api/recipes/{pancakes.pk}/shopping_cart/'
+    ).status_code == 204
+    assert shopping_list(user) == {}
+    assert 'совпадают' in verify()
+
+
+def test_editing_amounts_updates_carts(
+    client, author_client, user, author, ingredients, carts
+):
+    flour, sugar, salt, butter = ingredients
+    pie, pancakes = carts
+    for recipe in carts:
+        client.post(f'/api/recipes/{recipe.pk}/shopping_cart/')
+    author_client.post(f'/api/recipes/{pie.pk}/shopping_cart/')
+
+    response = author_client.patch(
+        f'/api/recipes/{pie.pk}/',
+        {'ingredients': [
+            {'id': flour.pk, 'amount': 200},
+            {'id': salt.pk, 'amount': 5},
+        ]},
+        format='json'
+    )
+
+    assert response.status_code == 200
+    assert shopping_list(user) == {'мука': 220, 'соль': 5, 'масло': 10}
+    assert shopping_list(author) == {'мука': 200, 'соль': 5}
+    assert 'совпадают' in verify()
+
+
+def test_recipe_delete_updates_carts(client, author_client, user, carts):
+    pie, pancakes = carts
+    for recipe in carts:
+        client.post(f'/api/recipes/{recipe.pk}/shopping_cart/')
+
+    assert author_client.delete(f'/api/recipes/{pie.pk}/').status_code \
+        == 204
+    assert shopping_list(user) == {'мука': 20, 'масло': 10}
+    assert 'совпадают' in verify()
+
+
+def admin_form_data(response):
+    """Собирает данные формы изменения из контекста страницы админки."""
+    forms = [response.context['adminform'].form]
+    data = {}
+    for inline in response.context['inline_admin_formsets']:
+        formset = inline.formset
+        forms.extend(formset.forms)
+        for field in formset.management_form:
+            data[field.html_name] = field.value()
+    for form in forms:
+        for field in form:
+            value = field.value()
+            if value is None or field.name == 'image':
+                continue
+            data[field.html_name] = value
+    return data
+
+
+def test_admin_inline_edit_updates_carts(
+    client, user, ingredients, carts
+):
+    flour, sugar, salt, butter = ingredients
+    pie, pancakes = carts
+    for recipe in carts:
+        client.post(f'/api/recipes/{recipe.pk}/shopping_cart/')
+    admin = User.objects.create_superuser(
+        email='admin@example.com', username='admin', first_name='Админ',
+        last_name='Админ', password='admin-Pa55word'
+    )
+    browser = Client()
+    browser.force_login(admin)
+    url = f'/admin/recipes/recipe/{pie.pk}/change/'
+    data = admin_form_data(browser.get(url))
+    prefix = 'recipeingredient'
+    rows = {
+        int(data[f'{prefix}-{number}-ingredient']): number
+        for number in range(int(data[f'{prefix}-INITIAL_FORMS']))
+    }
+    data[f'{prefix}-{rows[flour.pk]}-amount'] = 300
+    data[f'{prefix}-{rows[sugar.pk]}-DELETE'] = 'on'
+    extra = int(data[f'{prefix}-INITIAL_FORMS'])
+    data[f'{prefix}-{extra}-ingredient'] = salt.pk
+    data[f'{prefix}-{extra}-amount'] = 7
+
+    response = browser.post(url, data)
+
+    assert response.status_code == 302
+    assert shopping_list(user) == {'мука': 320, 'соль': 7, 'масло': 10}
+    assert 'совпадают' in verify()
+
+
+def test_verify_reports_drift(client, user, carts):
+    pie, pancakes = carts
+    client.post(f'/api/recipes/{pie.pk}/shopping_cart/')
+    UserShoppingList.objects.filter(
+        user=user, ingredient__name='мука'
+    ).update(amount=1)
+
+    with pytest.raises(CommandError, match='Расхождений в списках покупок: 1'):
+        verify()
+    call_command('rebuild_shopping_lists', stdout=StringIO())
+    assert shopping_list(user) == {'мука': 100, 'сахар': 50}
+    assert 'совпадают' in verify()
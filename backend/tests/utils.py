@@ -0,0 +1,14 @@
+import base64
+import io
+
+from PIL import Image
+
+
+def image_data_uri(size=(8, 8), image_format='PNG'):
+    """Картинка в виде data URI, как ее присылает фронтенд."""
+    buffer = io.BytesIO()
+    Image.new('RGB', size, (60, 120, 200)).save(buffer, image_format)
+    return (
+        f'data:image/{image_format.lower()};base64,'
+        + base64.b64encode(buffer.getvalue()).decode()
+    )
@@ -12,7 +12,8 @@ User = get_user_model()
 @admin.register(User)
 class UserAdmin(Admin):
 
-    list_display = ('email', 'username', 'first_name', 'last_name', 'password')
+    list_display = ('email', 'username', 'first_name', 'last_name', 'password',
+                    'recipes_count', 'followers_count')
     list_filter = ('email', 'username')
 
 
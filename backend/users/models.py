@@ -7,8 +7,36 @@ from users.constants import MAX_LEAGHT_EMAIL, MAX_LEAGHT_USER_PARAMETRS
 from .validators import validate_username
 
 
-class User(AbstractUser):
+class CountersModel(models.Model):
+    """
+    Модель с денормализованными счетчиками counter_fields.
+    Счетчики меняются только атомарными UPDATE, поэтому полное
+    сохранение объекта, прочитанного раньше, их не перезаписывает.
+    """
+    counter_fields = ()
+
+    class Meta:
+        abstract = True
+
+    def save(self, *args, **kwargs):
+        if (
+            not self._state.adding
+            and not kwargs.get('force_insert')
+            and kwargs.get('update_fields') is None
+        ):
+            deferred = self.get_deferred_fields()
+            kwargs['update_fields'] = [
+                field.name for field in self._meta.concrete_fields
+                if not field.primary_key
+                and field.attname not in deferred
+                and field.name not in self.counter_fields
+            ]
+        super().save(*args, **kwargs)
+
+
+class User(CountersModel, AbstractUser):
     """Модель пользователя."""
+    counter_fields = ('recipes_count', 'followers_count')
     USERNAME_FIELD = 'email'
     REQUIRED_FIELDS = ('username', 'first_name', 'last_name', 'password')
 
@@ -35,6 +63,16 @@ class User(AbstractUser):
         'Пароль',
         max_length=MAX_LEAGHT_USER_PARAMETRS
     )
+    recipes_count = models.PositiveIntegerField(
+        'Количество рецептов',
+        default=0,
+        editable=False
+    )
+    followers_count = models.PositiveIntegerField(
+        'Количество подписчиков',
+        default=0,
+        editable=False
+    )
 
     class Meta:
         verbose_name = 'Пользователь'
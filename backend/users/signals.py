@@ -0,0 +1,22 @@
+from django.db.models.signals import post_delete, post_save
+from django.dispatch import receiver
+
+from recipes.models import change_counter
+from users.models import Subscribe, User
+
+
+@receiver(post_save, sender=Subscribe)
+def subscribe_created(sender, instance, created, **kwargs):
+    """Увеличивает счетчик подписчиков автора."""
+    if created:
+        change_counter(
+            User.objects.filter(pk=instance.author_id), 'followers_count', 1
+        )
+
+
+@receiver(post_delete, sender=Subscribe)
+def subscribe_deleted(sender, instance, **kwargs):
+    """Уменьшает счетчик подписчиков автора."""
+    change_counter(
+        User.objects.filter(pk=instance.author_id), 'followers_count', -1
+    )